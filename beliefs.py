@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from card import Card
+    from deck import Deck
+    from game import Game
+    from player import Player
+
+from collections import Counter
+
+KITTEN: str = "Exploding Kitten"
+
+
+class Beliefs:
+    '''What one player knows about the deck.
+
+    Known cards are keyed by their index counted from the bottom of the deck, which
+    drawing from the top never changes. Unseen counts the cards, kittens aside, that
+    the player can't place: those in the deck at unknown positions and in the other
+    hands. Kittens are never held, so the tracker counts them for everyone.'''
+    def __init__(self, unseen: Counter[str]) -> None:
+        self.known: dict[int, str] = {}
+        self.known_kittens: int = 0
+        self.unseen: Counter[str] = unseen
+        self.unseen_total: int = sum(unseen.values())
+
+    def see(self, name: str, amount: int = 1) -> None:
+        '''Takes a card out of the unseen ones, the player now knows where it is'''
+        if name != KITTEN:
+            self.unseen[name] -= amount
+            self.unseen_total -= amount
+
+    def learn(self, index: int, name: str) -> None:
+        if index in self.known:
+            return
+
+        self.known[index] = name
+        if name == KITTEN:
+            self.known_kittens += 1
+        else:
+            self.see(name, 1)
+
+    def forget(self, index: int) -> str | None:
+        '''Forgets a known position, returns the card that was known there'''
+        name: str | None = self.known.pop(index, None)
+        if name == KITTEN:
+            self.known_kittens -= 1
+        return name
+
+    def forget_all(self) -> None:
+        for name in self.known.values():
+            self.see(name, -1)
+        self.known.clear()
+        self.known_kittens = 0
+
+    def shift(self, index: int) -> None:
+        '''Moves the known cards at or above an index up by one, a card was inserted there'''
+        if any(known >= index for known in self.known):
+            self.known = {known + (known >= index): name for known, name in self.known.items()}
+
+
+class BeliefTracker:
+    '''Per-player knowledge of the deck, updated incrementally as the game goes.
+
+    Players learn the top of the deck from See The Future, where they put back a
+    defused kitten, which cards they draw, steal or lose to a steal, and every card
+    reaching the public discard pile. A shuffle makes everyone forget the positions
+    they knew, a kitten put back where others can't see does the same for them.
+    The tracker attaches itself as game.beliefs and is rebuilt once the cards are
+    dealt. It isn't journaled, so rebuild it after undoing moves.'''
+    def __init__(self, game: Game) -> None:
+        self._beliefs: dict[Player, Beliefs] = {}
+        self._game: Game = game
+        self._kittens: int = 0
+        self._size: int = 0
+
+        game.beliefs = self
+        self.reset()
+
+    def reset(self) -> None:
+        '''Rebuilds everyone's beliefs from the game, knowing only their hands and the discard pile'''
+        game: Game = self._game
+        cards: Counter[str] = Counter(card.name for card, _, _ in game.locations.values())
+        cards -= Counter(card.name for card in game.discard_pile._cards if card is not None)
+        del cards[KITTEN]
+
+        self._kittens = sum(card is not None and card.name == KITTEN for card in game.deck._cards)
+        self._size = game.deck.size()
+        self._beliefs = {player: Beliefs(cards - Counter(card.name for card in player._hand))
+                         for player in game.players}
+
+    def of(self, player: Player) -> Beliefs:
+        return self._beliefs[player]
+
+    def kitten_chance(self, player: Player) -> float:
+        '''Returns the probability, as the player sees it, that the top card is a kitten'''
+        if not self._size:
+            return 0.0
+
+        beliefs: Beliefs = self._beliefs[player]
+        top: str | None = beliefs.known.get(self._size - 1)
+        if top is not None:
+            return float(top == KITTEN)
+
+        unknown: int = self._size - len(beliefs.known)
+        return (self._kittens - beliefs.known_kittens) / unknown
+
+    def top_chance(self, player: Player, name: str) -> float:
+        '''Returns the probability, as the player sees it, that the top card is of the given kind'''
+        if name == KITTEN:
+            return self.kitten_chance(player)
+        if not self._size:
+            return 0.0
+
+        beliefs: Beliefs = self._beliefs[player]
+        top: str | None = beliefs.known.get(self._size - 1)
+        if top is not None:
+            return float(top == name)
+        if not beliefs.unseen_total:
+            return 0.0
+
+        # unknown cards that aren't kittens could be any of the unseen ones
+        return (1 - self.kitten_chance(player)) * beliefs.unseen[name] / beliefs.unseen_total
+
+    def known_cards(self, player: Player) -> dict[int, str]:
+        '''Returns the cards the player knows the position of, keyed by position from the top (0)'''
+        return {self._size - 1 - index: name for index, name in self._beliefs[player].known.items()}
+
+    def drew(self, player: Player, card: Card) -> None:
+        '''The player drew the top card, everybody sees a kitten but only the player sees other cards'''
+        self._size -= 1
+        if card.name == KITTEN:
+            self._kittens -= 1
+
+        for other, beliefs in self._beliefs.items():
+            known: str | None = beliefs.forget(self._size)
+            if other is player:
+                if known is None:
+                    beliefs.see(card.name)
+            elif known is not None:
+                # it left the deck for a hand, which is back where the others can't see it
+                beliefs.see(known, -1)
+
+    def placed(self, player: Player, position: int) -> None:
+        '''The player put a kitten back, position cards from the top'''
+        index: int = self._size - position
+        self._size += 1
+        self._kittens += 1
+
+        for other, beliefs in self._beliefs.items():
+            if other is player:
+                beliefs.shift(index)
+                beliefs.learn(index, KITTEN)
+            else:
+                beliefs.forget_all()
+
+    def saw(self, player: Player, cards: list[Card]) -> None:
+        '''The player saw the given cards on the top of the deck, top first'''
+        beliefs: Beliefs = self._beliefs[player]
+        for depth, card in enumerate(cards):
+            beliefs.learn(self._size - 1 - depth, card.name)
+
+    def shuffled(self) -> None:
+        for beliefs in self._beliefs.values():
+            beliefs.forget_all()
+
+    def stole(self, thief: Player, victim: Player, card: Card) -> None:
+        '''A card went from one hand to the other, both players see which'''
+        self._beliefs[thief].see(card.name)
+        self._beliefs[victim].see(card.name, -1)
+
+    def discarded(self, card: Card, holder: Player | Deck) -> None:
+        '''A card reached the discard pile from a hand, everyone but its holder sees it now'''
+        for other, beliefs in self._beliefs.items():
+            if other is not holder:
+                beliefs.see(card.name)
+
+    def check(self) -> None:
+        '''Raises an AssertionError unless every belief is true and matches the game'''
+        game: Game = self._game
+        deck: list[Card] = [card for card in game.deck._cards if card is not None]
+        if self._size != len(deck):
+            raise AssertionError(f"The beliefs have {self._size} cards in the deck, it has {len(deck)}")
+        kittens: int = sum(card.name == KITTEN for card in deck)
+        if self._kittens != kittens:
+            raise AssertionError(f"The beliefs have {self._kittens} kittens in the deck, it has {kittens}")
+
+        everything: Counter[str] = Counter(card.name for card, _, _ in game.locations.values())
+        everything -= Counter(card.name for card in game.discard_pile._cards if card is not None)
+        del everything[KITTEN]
+        for player, beliefs in self._beliefs.items():
+            for index, name in beliefs.known.items():
+                if index >= len(deck) or deck[index].name != name:
+                    raise AssertionError(f"{player.name} believes a {name} is at {index} from the bottom")
+
+            # the unseen cards, the hand and the known positions account for every card not discarded
+            known: Counter[str] = Counter(beliefs.known.values())
+            for name in everything.keys() | beliefs.unseen.keys():
+                if beliefs.unseen[name] + player._counts.get(name, 0) + known[name] != everything[name]:
+                    raise AssertionError(f"{player.name} believes {beliefs.unseen[name]} {name} unseen, "
+                                         f"{everything[name] - player._counts.get(name, 0) - known[name]} are")
+            if beliefs.unseen_total != sum(beliefs.unseen.values()):
+                raise AssertionError(f"{player.name} miscounts the unseen cards")
+            if beliefs.known_kittens != known[KITTEN]:
+                raise AssertionError(f"{player.name} miscounts the kittens it knows of")
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable
+if TYPE_CHECKING:
+    from player import Player
+
+from card import kind_bit
+
+import abc
+
+STRATEGIES: dict[str, type[Strategy]] = {}
+
+GIVE_AWAY_ORDER: list[str] = [
+    "Tacocat", "Watermeloncat", "Potatocat", "Beardcat",
+    "See The Future", "Shuffle", "Favor", "Skip", "Attack", "Nope", "Defuse"]
+
+
+def register_strategy(name: str) -> Callable[[type[Strategy]], type[Strategy]]:
+    '''Class decorator that makes a strategy available to headless runners under the given name'''
+    def register(strategy: type[Strategy]) -> type[Strategy]:
+        if name in STRATEGIES:
+            raise ValueError(f"{repr(name)} already registered as a strategy.")
+
+        strategy.name = name
+        STRATEGIES[name] = strategy
+        return strategy
+
+    return register
+
+
+class Strategy(metaclass=abc.ABCMeta):
+    '''Answers a player's questions in headless games.
+
+    The kind of question is one of "turn", "card", "give", "nope", "defuse",
+    "place", "target" or "pause". Labels describe each option, for card
+    choices they are the card names behind the numbered options. Strategies that
+    set beliefs have the game track what each player knows of the deck.'''
+    beliefs: bool = False
+    name: str = ""
+
+    @abc.abstractmethod
+    def answer(self, player: Player, kind: str, options: list[str], labels: list[str]) -> str:
+        pass
+
+    @staticmethod
+    def _pick(options: list[str], labels: list[str], preference: list[str]) -> str | None:
+        '''Returns the option whose label comes first in the preference list'''
+        for wanted in preference:
+            if wanted in labels:
+                return options[labels.index(wanted)]
+
+        return None
+
+    @staticmethod
+    def _richest(player: Player, options: list[str]) -> str:
+        game = player.owner()
+        return max(options, key=lambda name: game.get_player(name).hand_size())
+
+
+@register_strategy("passive")
+class PassiveStrategy(Strategy):
+    '''Never plays a card, always defuses and hides kittens at the bottom of the deck'''
+    def answer(self, player: Player, kind: str, options: list[str], labels: list[str]) -> str:
+        if kind == "turn":
+            return "d"
+
+        if kind in ["nope", "defuse"]:
+            return "y" if kind == "defuse" and "y" in options else "n"
+
+        if kind == "place":
+            return options[-1]
+
+        return options[0]
+
+
+@register_strategy("random")
+class RandomStrategy(Strategy):
+    '''Picks uniformly among the legal options, but always defuses'''
+    def answer(self, player: Player, kind: str, options: list[str], labels: list[str]) -> str:
+        rng = player.rng
+        if kind == "turn":
+            return rng.choice(options) if player.owner().legal_actions(player) else "d"
+
+        if kind == "defuse":
+            return "y" if "y" in options else "n"
+
+        if kind == "card" and len(options) > 1:
+            return rng.choice(options[:-1])
+
+        return rng.choice(options)
+
+
+@register_strategy("cautious")
+class CautiousStrategy(Strategy):
+    '''Draws unless the deck looks dangerous, then skips or attacks its way out'''
+    risk: float = 0.15
+
+    def answer(self, player: Player, kind: str, options: list[str], labels: list[str]) -> str:
+        game = player.owner()
+        if kind == "turn":
+            risk: float = self.kitten_chance(player)
+            escapes: int = game.legal_actions(player) & (kind_bit("Attack") | kind_bit("Skip"))
+            if risk > self.risk and escapes:
+                return "p"
+            return "d"
+
+        if kind == "card":
+            return self._pick(options, labels, ["Attack", "Skip"]) or options[-1]
+
+        if kind == "give":
+            return self._pick(options, labels, GIVE_AWAY_ORDER) or options[0]
+
+        if kind == "nope":
+            return "n"
+
+        if kind == "defuse":
+            return "y" if "y" in options else "n"
+
+        if kind == "place":
+            return options[-1]
+
+        if kind == "target":
+            return self._richest(player, options)
+
+        return options[0]
+
+    def kitten_chance(self, player: Player) -> float:
+        game = player.owner()
+        return (game.players_alive() - 1) / max(1, game.deck.size())
+
+
+@register_strategy("informed")
+class InformedStrategy(CautiousStrategy):
+    '''Plays like the cautious strategy, but judges the risk by what it knows of the deck'''
+    beliefs: bool = True
+
+    def kitten_chance(self, player: Player) -> float:
+        beliefs = player.owner().beliefs
+        assert beliefs is not None
+        return beliefs.kitten_chance(player)
+
+
+@register_strategy("aggressive")
+class AggressiveStrategy(Strategy):
+    '''Plays every card it can before drawing, nopes everything and puts kittens back on top'''
+    preference: list[str] = [
+        "Attack", "Favor", "Tacocat", "Watermeloncat", "Potatocat", "Beardcat",
+        "Skip", "Shuffle", "See The Future"]
+
+    def answer(self, player: Player, kind: str, options: list[str], labels: list[str]) -> str:
+        if kind == "turn":
+            return "p" if player.owner().legal_actions(player) else "d"
+
+        if kind == "card":
+            return self._pick(options, labels, self.preference) or options[0]
+
+        if kind == "give":
+            return self._pick(options, labels, GIVE_AWAY_ORDER) or options[0]
+
+        if kind in ["nope", "defuse"]:
+            return "y" if "y" in options else "n"
+
+        if kind == "place":
+            return options[0]
+
+        if kind == "target":
+            return self._richest(player, options)
+
+        return options[0]
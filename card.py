@@ -3,15 +3,37 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from game import Game
+    from journal import Journal
     from player import Player
 
 from deck import Deck
-from random import choice
 
 import abc
 
+KIND_BITS: dict[str, int] = {}
+
+
+def kind_bit(name: str) -> int:
+    '''Returns the bit standing for a card name in legal-action masks, assigned on first use'''
+    bit: int | None = KIND_BITS.get(name)
+    if bit is None:
+        bit = 1 << len(KIND_BITS)
+        KIND_BITS[name] = bit
+
+    return bit
+
+
+def kind_names(mask: int) -> list[str]:
+    '''Returns the card names whose bits are set in a legal-action mask'''
+    return [name for name, bit in KIND_BITS.items() if mask & bit]
+
 
 class Card(metaclass=abc.ABCMeta):
+    # copies needed in hand to play the card, 0 if it is never played from the hand
+    required: int = 1
+    # if playing the card needs another player holding cards
+    needs_target: bool = False
+
     def __init__(self, owner: Player | Deck) -> None:
         self._owner: Player | Deck = owner
         self.name: str
@@ -32,9 +54,12 @@ class Card(metaclass=abc.ABCMeta):
 
     def transfer_ownership(self, new_owner: Player | Deck) -> None:
         '''Transfers ownership to the player / deck specified'''
+        journal: Journal | None = new_owner.owner().journal
+        if journal is not None:
+            journal.record(setattr, self, "_owner", self._owner)
         self._owner = new_owner
 
-    def nope_check(self) -> tuple[bool, Player]:
+    async def nope_check(self) -> tuple[bool, Player]:
         '''Checks if a player wants to nope this card, returns a tuple containing if the card in noped, and the player noping'''
         options: list[Player] = []
         game: Game = self._owner.owner()
@@ -42,16 +67,10 @@ class Card(metaclass=abc.ABCMeta):
         if isinstance(self._owner, Deck):
             raise ValueError("Cards in deck can't be noped")
         
-        current_player: int = game.players.index(self._owner)
+        current_player: int = game.seat_of(self._owner)
         
-        for player_index, player in enumerate(game.players):
-            if player is self._owner:
-                continue
-
-            if not player.is_alive:
-                continue
-
-            game.swap_active(player_index)
+        for player in game.alive_after(self._owner):
+            await game.swap_active(player)
 
             question: str = f"{self._owner.name} just played a {self.name}. Would you like to use a nope? "
             chosen: str = ""
@@ -65,29 +84,31 @@ class Card(metaclass=abc.ABCMeta):
                 valid = ["n"]
 
             while chosen not in valid:
-                chosen = game.ask_question(question)
+                chosen = await game.ask_question(question, valid, kind="nope")
 
             if chosen == "y":
                 options.append(player)
         
-        game.swap_active(current_player)
+        await game.swap_active(current_player)
 
         if options == []:
             return (False, self._owner)
 
-        chosen_player: Player = choice(options)
+        chosen_player: Player = game.nope_rng.choice(options)
         nope: Card = chosen_player.get_card("Nope")
 
         noped: bool
         noper: Player
         
         chosen_player.remove_card(nope)
-        noped, noper = nope.nope_check()
+        chosen_player.count_play(nope.name)
+        noped, noper = await nope.nope_check()
+        await game.swap_active(current_player)
         game.discard_pile.add_card(nope)
         nope.transfer_ownership(game.discard_pile)
 
         if noped:
-            game.add_activity(f"{chosen_player.name} tried to nope {self._owner.name}'s card, but {noper.name} noped that!\n")
+            game.add_activity(("nope_noped", chosen_player.name, self._owner.name, noper.name))
             return (False, chosen_player)
         
         return (True, chosen_player)
@@ -111,16 +132,16 @@ class Card(metaclass=abc.ABCMeta):
         return self._owner.card_count(self) >= 1
 
     @abc.abstractmethod
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         '''Plays the card, and returns if it was succesful or not.'''
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards")
 
         self._owner.remove_card(self)
-        self._owner.owner().add_activity(f"{self._owner.name.capitalize()} played a {self.name}")
+        self._owner.owner().add_activity(("played", self._owner.name.capitalize(), None, self.name))
         return True
 
     @abc.abstractmethod
-    def on_draw(self) -> None:
+    async def on_draw(self) -> None:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards")
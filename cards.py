@@ -1,15 +1,34 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Callable
 
 if TYPE_CHECKING:
     from player import Player
     from game import Game
 
-from card import Card
+from card import Card, kind_bit
 from deck import Deck
 
+CARD_TYPES: dict[str, type[Card]] = {}
+
+
+def register_card(name: str) -> Callable[[type[Card]], type[Card]]:
+    '''Class decorator that makes a card type available to deck recipes under the given name'''
+    def register(card_type: type[Card]) -> type[Card]:
+        if name in CARD_TYPES:
+            raise ValueError(f"{repr(name)} already registered as a card type.")
+
+        CARD_TYPES[name] = card_type
+        return card_type
+
+    return register
+
+
+@register_card("Cat")
 class Cat(Card):
+    required: int = 2
+    needs_target: bool = True
+
     def __init__(self, owner: Player | Deck, name: str) -> None:
         super().__init__(owner)
         self.name: str = name
@@ -18,22 +37,12 @@ class Cat(Card):
         if isinstance(self._owner, Deck):
             return False
 
-        if self._owner.card_count(self) < 2:
-            return False
-        
-        for player in self._owner.owner().players:
-            if player == self._owner:
-                continue
+        return bool(self._owner.owner().legal_actions(self._owner) & kind_bit(self.name))
 
-            if player.hand_size() > 0:
-                return True
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-        return False
-
-    def on_draw(self) -> None:
-        return super().on_draw()
-
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
         
@@ -42,43 +51,45 @@ class Cat(Card):
 
         noped: bool
         noper: Player
-        noped, noper = self.nope_check()
+        noped, noper = await self.nope_check()
         if noped:
-            game.add_activity(f"{owner.name} played two {self.name}, but {noper.name} noped it!\n")
+            game.add_activity(("cats_noped", owner.name, noper.name, self.name))
             owner.discard_card(self.name)
             owner.discard_card(self.name)
             return False
         
         
-        target: str
-        target_player: Player
-        while True:
-            target = game.ask_question("Who would you like to steal from? > ")
-            if not game.is_player(target):
-                continue
-            
-            target_player = game.get_player(target)
-            if not target_player.is_alive:
-                continue
+        targets: list[str] = [player.name for player in game.alive_after(owner) if player.hand_size() > 0]
+        if not targets:
+            game.add_activity(("cats_no_target", owner.name, None, self.name))
+            owner.discard_card(self.name)
+            owner.discard_card(self.name)
+            return False
 
-            if target_player.hand_size() == 0:
-                continue
+        target: str = ""
+        while target not in targets:
+            target = await game.ask_question("Who would you like to steal from? > ", targets, kind="target")
 
-            break
+        target_player: Player = game.get_player(target)
 
         card_stolen: Card = target_player.take_random_card()
 
-        owner.receive_card(card_stolen, False)
+        owner.receive_card(card_stolen)
+        if game.beliefs is not None:
+            game.beliefs.stole(owner, target_player, card_stolen)
 
-        game.add_activity(f"{owner.name} played two {self.name}s, and stole from {target}.\n")
-        owner.add_activity(f"You stole a {card_stolen.name} from {target}.\n")
-        target_player.add_activity(f"{target} stole a {card_stolen.name} from you.\n")
+        game.add_activity(("cats", owner.name, target, self.name))
+        owner.add_activity(("stole", owner.name, target, card_stolen.name))
+        target_player.add_activity(("stolen", owner.name, target, card_stolen.name))
         owner.discard_card(self.name)
         owner.discard_card(self.name)
 
         return True
 
+@register_card("Favor")
 class Favor(Card):
+    needs_target: bool = True
+
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
         self.name = "Favor"
@@ -87,19 +98,12 @@ class Favor(Card):
         if isinstance(self._owner, Deck):
             return False
 
-        for player in self._owner.owner().players:
-            if player == self._owner:
-                continue
-
-            if player.hand_size() > 0:
-                return True
-
-        return False
+        return bool(self._owner.owner().legal_actions(self._owner) & kind_bit(self.name))
 
-    def on_draw(self) -> None:
-        return super().on_draw()
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
         
@@ -107,52 +111,54 @@ class Favor(Card):
 
         noped: bool
         noper: Player
-        noped, noper = self.nope_check()
+        noped, noper = await self.nope_check()
         if noped:
-            game.add_activity(f"{self._owner.name} played a {self.name}, but {noper.name} noped it!\n")
+            game.add_activity(("noped", self._owner.name, noper.name, self.name))
             self.discard()
             return False
         
         
-        target: str
-        target_player: Player
-        while True:
-            target = game.ask_question("Who would you like to steal from? > ")
-            if not game.is_player(target):
-                continue
-            
-            target_player = game.get_player(target)
-            if not target_player.is_alive:
-                continue
+        targets: list[str] = [player.name for player in game.alive_after(self._owner) if player.hand_size() > 0]
+        if not targets:
+            game.add_activity(("favor_no_target", self._owner.name, None, self.name))
+            self.discard()
+            return False
 
-            if target_player.hand_size() == 0:
-                continue
+        target: str = ""
+        while target not in targets:
+            target = await game.ask_question("Who would you like to steal from? > ", targets, kind="target")
 
-            break
+        target_player: Player = game.get_player(target)
         
         current_player: Player = self._owner
-        game.swap_active(target_player)
+        await game.swap_active(target_player)
 
-        card_stolen: Card | None = target_player.choose_card(
+        card_stolen: Card | None = await target_player.choose_card(
             prompt=f"{current_player.name} is asking you a favor, choose a card. > ",
             forced=True,
-            playable=False)
+            playable=False,
+            kind="give")
         if not card_stolen:
             raise ValueError("Oh crap!, favor's gone wrong :(")
         target_player.remove_card(card_stolen)
-        game.swap_active(current_player)
+        await game.swap_active(current_player)
 
         owner: Player = self._owner
-        owner.receive_card(card_stolen, False)
+        owner.receive_card(card_stolen)
+        if game.beliefs is not None:
+            game.beliefs.stole(owner, target_player, card_stolen)
 
-        game.add_activity(f"{self._owner.name} played a {self.name}, and stole from {target}.\n")
-        owner.add_activity(f"You stole a {card_stolen.name} from {target}.\n")
-        target_player.add_activity(f"{owner.name} stole a {card_stolen.name} from you.\n")
+        game.add_activity(("favor", owner.name, target, self.name))
+        owner.add_activity(("stole", owner.name, target, card_stolen.name))
+        target_player.add_activity(("stolen", owner.name, target, card_stolen.name))
         self.discard()
         return True
 
 
+@register_card("Nope")
 class Nope(Card):
+    required: int = 0
+
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
         self.name = "Nope"
@@ -160,12 +166,13 @@ class Nope(Card):
     def can_play(self) -> bool:
         return False
 
-    def on_draw(self) -> None:
-        return super().on_draw()
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-    def on_play(self) -> bool:
-        return super().on_play()
+    async def on_play(self) -> bool:
+        return await super().on_play()
 
+@register_card("Skip")
 class Skip(Card):
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
@@ -174,26 +181,27 @@ class Skip(Card):
     def can_play(self) -> bool:
         return True
 
-    def on_draw(self) -> None:
-        return super().on_draw()
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
 
         noped: bool
         noper: Player
-        noped, noper = self.nope_check()
+        noped, noper = await self.nope_check()
         if noped:
-            self._owner.owner().add_activity(f"{self._owner.name} played a {self.name}, but {noper.name} noped it!\n")
+            self._owner.owner().add_activity(("noped", self._owner.name, noper.name, self.name))
             self.discard()
             return False
         
-        self._owner.owner().add_activity(f"{self._owner.name} played a {self.name}, and skipped a turn.\n")
+        self._owner.owner().add_activity(("skip", self._owner.name, None, self.name))
         self._owner.turns_left -= 1
         self.discard()
         return True
 
+@register_card("Shuffle")
 class Shuffle(Card):
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
@@ -202,26 +210,29 @@ class Shuffle(Card):
     def can_play(self) -> bool:
         return True
 
-    def on_draw(self) -> None:
-        return super().on_draw()
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
 
         noped: bool
         noper: Player
-        noped, noper = self.nope_check()
+        noped, noper = await self.nope_check()
         if noped:
-            self._owner.owner().add_activity(f"{self._owner.name} played a {self.name}, but {noper.name} noped it!\n")
+            self._owner.owner().add_activity(("noped", self._owner.name, noper.name, self.name))
             self.discard()
             return False
         
-        self._owner.owner().add_activity(f"{self._owner.name} played a {self.name}, and shuffled the deck.\n")
+        self._owner.owner().add_activity(("shuffle", self._owner.name, None, self.name))
         self._owner.owner().deck.shuffle()
+        if self._owner.owner().beliefs is not None:
+            self._owner.owner().beliefs.shuffled()
         self.discard()
         return True
 
+@register_card("SeeTheFuture")
 class SeeTheFuture(Card):
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
@@ -230,33 +241,32 @@ class SeeTheFuture(Card):
     def can_play(self) -> bool:
         return True
 
-    def on_draw(self) -> None:
-        return super().on_draw()
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
 
         noped: bool
         noper: Player
-        noped, noper = self.nope_check()
+        noped, noper = await self.nope_check()
         if noped:
-            self._owner.owner().add_activity(f"{self._owner.name} played a {self.name}, but {noper.name} noped it!\n")
+            self._owner.owner().add_activity(("noped", self._owner.name, noper.name, self.name))
             self.discard()
             return False
         
-        self._owner.owner().add_activity(f"{self._owner.name} played a {self.name}.\n")
-        activity_log: str = f"You saw: (top) "
-        activity_log += ", ".join([
-            f"{order}: {card.name}" 
-            for order, card
-            in enumerate(self._owner.owner().deck.top_cards(), 1)])
-        activity_log += " (bottom)"
-        self._owner.add_activity(activity_log + "\n")
+        self._owner.owner().add_activity(("future", self._owner.name, None, self.name))
+        if self._owner.owner().beliefs is not None:
+            self._owner.owner().beliefs.saw(self._owner, self._owner.owner().deck.top_cards())
+        if not self._owner.owner().headless:
+            self._owner.add_activity(("saw", self._owner.name, None,
+                                      tuple(card.name for card in self._owner.owner().deck.top_cards())))
         
         self.discard()
         return True
 
+@register_card("Attack")
 class Attack(Card):
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
@@ -265,10 +275,10 @@ class Attack(Card):
     def can_play(self) -> bool:
         return True
 
-    def on_draw(self) -> None:
-        return super().on_draw()
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
         
@@ -277,21 +287,24 @@ class Attack(Card):
 
         noped: bool
         noper: Player
-        noped, noper = self.nope_check()
+        noped, noper = await self.nope_check()
         if noped:
-            game.add_activity(f"{owner.name} played a {self.name}, but {noper.name} noped it!\n")
+            game.add_activity(("noped", owner.name, noper.name, self.name))
             self.discard()
             return False
         
         if owner.turns_left == 1:
             owner.turns_left -= 1
-        game.add_activity(f"{owner.name} played a {self.name}, forcing {game.next_player().name} to take {self._owner.turns_left + 2} turns.\n")
+        game.add_activity(("attack", owner.name, game.next_player().name, self._owner.turns_left + 2))
         game.next_player().turns_left = self._owner.turns_left + 2
         owner.turns_left = 0
         self.discard()
         return True
 
+@register_card("Defuse")
 class Defuse(Card):
+    required: int = 0
+
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
         self.name = "Defuse"
@@ -299,16 +312,19 @@ class Defuse(Card):
     def can_play(self) -> bool:
         return False
 
-    def on_draw(self) -> None:
-        return super().on_draw()
+    async def on_draw(self) -> None:
+        return await super().on_draw()
 
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
 
         return False
 
+@register_card("Kitten")
 class Kitten(Card):
+    required: int = 0
+
     def __init__(self, owner: Player | Deck) -> None:
         super().__init__(owner)
         self.name = "Exploding Kitten"
@@ -316,7 +332,7 @@ class Kitten(Card):
     def can_play(self) -> bool:
         return False
 
-    def on_draw(self) -> None:
+    async def on_draw(self) -> None:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't draw cards.")
 
@@ -336,31 +352,35 @@ class Kitten(Card):
             valid = ["n"]
 
         while chosen not in valid:
-            chosen = game.ask_question(question)
+            chosen = await game.ask_question(question, valid, kind="defuse")
 
         if chosen == "n":
-            game.add_activity(f"{owner.name} drew a kitten and exploded.\n")
+            game.add_activity(("exploded", owner.name, None, self.name))
             owner.explode()
             return
         
         owner.discard_card("Defuse")
-        game.add_activity(f"{owner.name} drew a kitten, but defused it.\n")
+        owner.count_play("Defuse")
+        game.add_activity(("defused", owner.name, None, self.name))
         new_location: str = ""
         chosen_location: int
+        locations: list[str] = [str(location) for location in range(1, deck.size() + 2)]
         while True:
-            new_location = game.ask_question("Where would you like to place the Kitten? (1 for top, 2 for next etc.) > ")
+            new_location = await game.ask_question("Where would you like to place the Kitten? (1 for top, 2 for next etc.) > ", locations, kind="place")
             if not new_location.isnumeric():
                 continue
             
             chosen_location = int(new_location)
-            if chosen_location > deck.size() + 1:
+            if not 1 <= chosen_location <= deck.size() + 1:
                 continue
             
             owner.remove_card(self)
             deck.insert_card(self, chosen_location - 1)
+            if game.beliefs is not None:
+                game.beliefs.placed(owner, chosen_location - 1)
             break
 
-    def on_play(self) -> bool:
+    async def on_play(self) -> bool:
         if isinstance(self._owner, Deck):
             raise ValueError("Decks can't play cards!")
 
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from player import Player
+
+from bots import STRATEGIES
+from collections import deque
+from game import Game
+from recipes import DEFAULT_RECIPES, CardPool, DeckRecipe, load_recipes
+from results import game_record
+from spectator import encode
+
+import argparse
+import hashlib
+import json
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import time
+
+# cards of finished games, reused by the next games a worker plays
+_CARDS: CardPool = CardPool()
+
+
+def play_shard(recipe: DeckRecipe, lineup: list[str], start: int, stop: int) -> dict[str, Any]:
+    '''Plays the headless games of a range of seeds and returns their aggregate'''
+    players: int = len(lineup)
+    wins: list[int] = [0] * players
+    plays: dict[str, int] = {}
+    turns: int = 0
+    explosions: int = 0
+    longest: int = 0
+    winners: list[int] = []
+    for seed in range(start, stop):
+        game: Game = Game(recipe, headless=True, seed=seed, pool=_CARDS)
+        for seat, strategy in enumerate(lineup):
+            game.add_player(f"{strategy}-{seat}", STRATEGIES[strategy]())
+
+        winner: Player | None = game.play()
+        (_, _, _, winner_seat, game_turns, game_explosions, _), _, game_plays = game_record(game, winner)
+        winners.append(-1 if winner_seat is None else winner_seat)
+        if winner_seat is not None:
+            wins[winner_seat] += 1
+        turns += game_turns
+        explosions += game_explosions
+        longest = max(longest, game_turns)
+        for _, card, count in game_plays:
+            plays[card] = plays.get(card, 0) + count
+
+    return {"games": stop - start,
+            "wins": wins,
+            "turns": turns,
+            "explosions": explosions,
+            "longest": longest,
+            "plays": plays,
+            "digest": hashlib.sha256(bytes(winner + 1 for winner in winners)).hexdigest()}
+
+
+def merge(results: list[dict[str, Any]]) -> dict[str, Any]:
+    '''Merges shard aggregates in the order given, the digest chains the shards' winners in that order'''
+    total: dict[str, Any] = {"games": 0, "wins": [], "turns": 0, "explosions": 0, "longest": 0, "plays": {}}
+    digest = hashlib.sha256()
+    for result in results:
+        total["games"] += result["games"]
+        total["wins"] = [mine + theirs for mine, theirs in
+                         zip(total["wins"] or [0] * len(result["wins"]), result["wins"])]
+        total["turns"] += result["turns"]
+        total["explosions"] += result["explosions"]
+        total["longest"] = max(total["longest"], result["longest"])
+        for card, count in result["plays"].items():
+            total["plays"][card] = total["plays"].get(card, 0) + count
+        digest.update(result["digest"].encode())
+
+    total["plays"] = dict(sorted(total["plays"].items()))
+    total["digest"] = digest.hexdigest()
+    return total
+
+
+class _Worker:
+    '''A worker's connection as the coordinator sees it'''
+    def __init__(self, connection: socket.socket) -> None:
+        self.buffer: bytes = b""
+        self.connection: socket.socket = connection
+        self.shard: int | None = None
+
+
+class Coordinator:
+    '''Hands shards of seeds to workers connecting over TCP and merges what they send back.
+
+    Messages are lines of JSON. A worker says it's ready, gets one shard at a time (its
+    seeds, the recipe as data and the lineup) and answers with the shard's aggregate,
+    which also asks for the next one. Shards of workers that disconnect go back to
+    the front of the queue. Shards out for longer than the timeout are handed to the
+    next idle worker as well, and whichever result comes first is kept. Every shard
+    is played from its seeds, so duplicates are identical and merging the shards in
+    order gives the same aggregates whatever the number of workers.'''
+    def __init__(self,
+                 recipe: DeckRecipe,
+                 lineup: list[str],
+                 games: int,
+                 seed: int = 0,
+                 shard_size: int = 100,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 timeout: float = 60.0) -> None:
+        if not recipe.min_players <= len(lineup) <= recipe.max_players:
+            raise ValueError(f"Recipe {repr(recipe.name)} is for {recipe.min_players}-{recipe.max_players} players, not {len(lineup)}")
+        for strategy in lineup:
+            if strategy not in STRATEGIES:
+                raise ValueError(f"{repr(strategy)} is not a strategy, use one of {sorted(STRATEGIES)}")
+
+        self._deadlines: dict[int, float] = {}
+        self._idle: list[_Worker] = []
+        self._listener: socket.socket = socket.create_server((host, port))
+        self._pending: deque[int] = deque(range(-(-games // shard_size)))
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._shards: list[tuple[int, int]] = [(start, min(start + shard_size, seed + games))
+                                               for start in range(seed, seed + games, shard_size)]
+        self._workers: dict[socket.socket, _Worker] = {}
+
+        self.address: tuple[str, int] = self._listener.getsockname()[:2]
+        self.lineup: list[str] = lineup
+        self.reassigned: int = 0
+        self.recipe: DeckRecipe = recipe
+        self.results: dict[int, dict[str, Any]] = {}
+        self.timeout: float = timeout
+
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ)
+
+    def run(self) -> dict[str, Any]:
+        '''Serves workers until every shard has a result, returns the merged aggregates'''
+        try:
+            while len(self.results) < len(self._shards):
+                for key, _ in self._selector.select(self._wait()):
+                    if key.fileobj is self._listener:
+                        self._accept()
+                    else:
+                        self._receive(self._workers[key.fileobj])  # type: ignore[index]
+                self._expire()
+        finally:
+            self.close()
+
+        return merge([self.results[shard] for shard in range(len(self._shards))])
+
+    def _wait(self) -> float | None:
+        if not self._deadlines:
+            return None
+        return max(0.0, min(self._deadlines.values()) - time.monotonic())
+
+    def _accept(self) -> None:
+        connection: socket.socket
+        connection, _ = self._listener.accept()
+        connection.setblocking(False)
+        self._workers[connection] = _Worker(connection)
+        self._selector.register(connection, selectors.EVENT_READ)
+
+    def _receive(self, worker: _Worker) -> None:
+        try:
+            data: bytes = worker.connection.recv(1 << 16)
+        except ConnectionError:
+            data = b""
+        if not data:
+            self._drop(worker)
+            return
+
+        worker.buffer += data
+        while b"\n" in worker.buffer:
+            line: bytes
+            line, _, worker.buffer = worker.buffer.partition(b"\n")
+            message: dict[str, Any] = json.loads(line)
+            if message["type"] == "result" and message["shard"] == worker.shard:
+                self.results.setdefault(message["shard"], message["result"])
+                self._deadlines.pop(message["shard"], None)
+                worker.shard = None
+            self._assign(worker)
+
+    def _assign(self, worker: _Worker) -> None:
+        '''Sends the worker the next shard without a result, or keeps it idle until there is one'''
+        while self._pending and self._pending[0] in self.results:
+            self._pending.popleft()
+        if not self._pending:
+            if len(self.results) < len(self._shards) and worker not in self._idle:
+                self._idle.append(worker)
+            return
+
+        shard: int = self._pending.popleft()
+        start, stop = self._shards[shard]
+        worker.shard = shard
+        self._deadlines[shard] = time.monotonic() + self.timeout
+        self._send(worker, {"type": "shard", "shard": shard, "start": start, "stop": stop,
+                            "recipe": self.recipe.name, "data": self.recipe.to_dict(), "lineup": self.lineup})
+
+    def _send(self, worker: _Worker, message: dict[str, Any]) -> None:
+        try:
+            worker.connection.setblocking(True)
+            worker.connection.sendall(encode(message))
+            worker.connection.setblocking(False)
+        except OSError:
+            self._drop(worker)
+
+    def _requeue(self, shard: int) -> None:
+        if shard not in self.results and shard not in self._pending:
+            self._pending.appendleft(shard)
+            self.reassigned += 1
+            while self._idle and self._pending:
+                self._assign(self._idle.pop(0))
+
+    def _drop(self, worker: _Worker) -> None:
+        if worker.connection not in self._workers:
+            return
+
+        del self._workers[worker.connection]
+        self._selector.unregister(worker.connection)
+        worker.connection.close()
+        if worker in self._idle:
+            self._idle.remove(worker)
+        if worker.shard is not None and not any(other.shard == worker.shard for other in self._workers.values()):
+            self._deadlines.pop(worker.shard, None)
+            self._requeue(worker.shard)
+
+    def _expire(self) -> None:
+        '''Hands the shards of slow workers to idle ones, without taking them back from the slow ones'''
+        now: float = time.monotonic()
+        for shard, deadline in list(self._deadlines.items()):
+            if deadline <= now:
+                self._deadlines[shard] = now + self.timeout
+                self._requeue(shard)
+
+    def close(self) -> None:
+        for worker in list(self._workers.values()):
+            try:
+                worker.connection.setblocking(True)
+                worker.connection.sendall(encode({"type": "done"}))
+            except OSError:
+                pass
+            worker.connection.close()
+        self._workers.clear()
+        self._selector.close()
+        self._listener.close()
+
+
+def work(host: str, port: int, fail_after: int | None = None, delay: float = 0.0) -> int:
+    '''Plays shards handed out by a coordinator until it's done, returns how many were played.
+
+    fail_after and delay make the worker crash after that many shards or wait before
+    each result, to try the coordinator's reassignment on one host.'''
+    recipes: dict[str, DeckRecipe] = {}
+    played: int = 0
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile("rwb")
+        stream.write(encode({"type": "ready"}))
+        stream.flush()
+        for line in stream:
+            message: dict[str, Any] = json.loads(line)
+            if message["type"] == "done":
+                break
+
+            if fail_after is not None and played >= fail_after:
+                os._exit(1)
+
+            data: str = json.dumps(message["data"], sort_keys=True)
+            if data not in recipes:
+                recipes[data] = DeckRecipe.from_dict(message["recipe"], message["data"])
+            result: dict[str, Any] = play_shard(recipes[data], message["lineup"], message["start"], message["stop"])
+            if delay:
+                time.sleep(delay)
+
+            try:
+                stream.write(encode({"type": "result", "shard": message["shard"], "result": result}))
+                stream.flush()
+            except OSError:
+                # the coordinator finished without this shard, another worker sent it first
+                break
+            played += 1
+
+    return played
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays headless games on workers connecting over TCP, sharded by seed.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinate = commands.add_parser("coordinate", help="hand out shards and print the merged aggregates")
+    coordinate.add_argument("lineup", nargs="+", choices=sorted(STRATEGIES))
+    coordinate.add_argument("--games", type=int, default=10000)
+    coordinate.add_argument("--seed", type=int, default=0)
+    coordinate.add_argument("--shard", type=int, default=100, help="games per shard")
+    coordinate.add_argument("--recipe", default="base")
+    coordinate.add_argument("--recipes", default=DEFAULT_RECIPES)
+    coordinate.add_argument("--host", default="127.0.0.1")
+    coordinate.add_argument("--port", type=int, default=0)
+    coordinate.add_argument("--timeout", type=float, default=60.0, help="seconds before a shard is also given to another worker")
+    coordinate.add_argument("--local-workers", type=int, default=0, help="worker processes to start on this host")
+
+    worker = commands.add_parser("work", help="play shards for a coordinator")
+    worker.add_argument("--host", default="127.0.0.1")
+    worker.add_argument("--port", type=int, required=True)
+    worker.add_argument("--fail-after", type=int, help="crash after this many shards")
+    worker.add_argument("--delay", type=float, default=0.0, help="seconds to wait before sending each result")
+    arguments = parser.parse_args()
+
+    if arguments.command == "work":
+        work(arguments.host, arguments.port, arguments.fail_after, arguments.delay)
+        return
+
+    coordinator: Coordinator = Coordinator(load_recipes(arguments.recipes)[arguments.recipe], arguments.lineup,
+                                           arguments.games, arguments.seed, arguments.shard, arguments.host,
+                                           arguments.port, arguments.timeout)
+    print(f"Coordinating on {coordinator.address[0]}:{coordinator.address[1]}", file=sys.stderr)
+    workers: list[subprocess.Popen] = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "work",
+                          "--host", coordinator.address[0], "--port", str(coordinator.address[1])])
+        for _ in range(arguments.local_workers)]
+
+    start: float = time.perf_counter()
+    try:
+        report: dict[str, Any] = coordinator.run()
+    finally:
+        for process in workers:
+            process.wait()
+    elapsed: float = time.perf_counter() - start
+
+    print(f"{report['games']} games in {elapsed:.1f}s, {coordinator.reassigned} shards reassigned")
+    print(json.dumps(report, indent=1))
+
+
+if __name__ == "__main__":
+    main()
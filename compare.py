@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from player import Player
+    from recipes import DeckRecipe
+
+from bots import STRATEGIES
+from game import Game
+from multiprocessing import Pool
+from recipes import DEFAULT_RECIPES, CardPool, load_recipes
+
+import argparse
+import math
+import os
+import time
+
+# cards of finished games, reused by the next games a process plays
+_CARDS: CardPool = CardPool()
+
+# (recipe, lineup): a table setup, whose first seat is the one compared
+Arm = tuple[str, tuple[str, ...]]
+
+
+def play_focal(recipe: DeckRecipe, lineup: tuple[str, ...], seed: int, rotation: int, streams: bool = True) -> int:
+    '''Plays a game with the lineup rotated by some seats, returns 1 if the lineup's first strategy won'''
+    seats: int = len(lineup)
+    table: tuple[str, ...] = lineup[-rotation:] + lineup[:-rotation] if rotation else lineup
+    game: Game = Game(recipe, headless=True, seed=seed, pool=_CARDS, streams=streams)
+    for seat, strategy in enumerate(table):
+        game.add_player(f"{strategy}-{seat}", STRATEGIES[strategy]())
+
+    winner: Player | None = game.play()
+    return int(winner is not None and game.seat_of(winner) == rotation % seats)
+
+
+def _play_pairs(task: tuple[Arm, Arm, str, int, int, int, int | None]) -> list[tuple[int, int]]:
+    first, second, recipes, start, stop, seed, unpaired = task
+    first_recipe: DeckRecipe = load_recipes(recipes)[first[0]]
+    second_recipe: DeckRecipe = load_recipes(recipes)[second[0]]
+    seats: int = len(first[1])
+    pairs: list[tuple[int, int]] = []
+    for pair in range(start, stop):
+        game_seed: int = seed + pair // seats
+        rotation: int = pair % seats
+        # unpaired, the second arm plays seeds past all of the first arm's, sharing no randomness with it
+        pairs.append((play_focal(first_recipe, first[1], game_seed, rotation, unpaired is None),
+                      play_focal(second_recipe, second[1], game_seed + (unpaired or 0), rotation, unpaired is None)))
+
+    return pairs
+
+
+class SPRT:
+    '''Generalised sequential probability ratio tests on the difference of the arms' win rates.
+
+    Every pair gives the difference d of the first and the second arm's win, whose mean
+    is the difference of the win rates whether the arms are paired or not. Two tests
+    weigh a mean of +margin and of -margin against none, with the normal likelihood of
+    the mean under the variance of d observed so far, but never less than the least
+    variance a difference of margin can have. An arm wins more once its test is
+    alpha / beta unlikely to be wrong. Once both tests reject their margin the estimate
+    is inside the indifference zone around no difference and the verdict is undecided.
+    Pairing only lowers the variance, so both ways test the same hypotheses.'''
+    def __init__(self, margin: float = 0.02, alpha: float = 0.05, beta: float = 0.05, min_pairs: int = 100) -> None:
+        if not 0 < margin < 1:
+            raise ValueError(f"The margin must be between 0 and 1, got {margin}")
+
+        self._lower: float = math.log(beta / (1 - alpha))
+        self._margin: float = margin
+        self._min_pairs: int = min_pairs
+        self._squares: float = 0.0
+        self._sum: float = 0.0
+        self._upper: float = math.log((1 - beta) / alpha)
+
+        self.llr: tuple[float, float] = (0.0, 0.0)
+        self.pairs: int = 0
+
+    @property
+    def mean(self) -> float:
+        '''Returns the estimated difference of the first and the second arm's win rates'''
+        return self._sum / self.pairs if self.pairs else 0.0
+
+    @property
+    def variance(self) -> float:
+        '''Returns the observed variance of a pair's difference'''
+        if self.pairs < 2:
+            return 0.0
+        return (self._squares - self._sum * self._sum / self.pairs) / (self.pairs - 1)
+
+    def add(self, first: int, second: int) -> str | None:
+        '''Adds a pair's outcomes, returns "first" or "second" once that arm wins more and "undecided" once neither does by the margin'''
+        difference: int = first - second
+        self.pairs += 1
+        self._sum += difference
+        self._squares += difference * difference
+        if self.pairs < self._min_pairs:
+            return None
+
+        # a difference of margin needs at least one arm winning that share of pairs alone
+        variance: float = max(self.variance, self._margin * (1 - self._margin))
+        scale: float = self.pairs * self._margin / variance
+        self.llr = (scale * (self.mean - self._margin / 2), scale * (-self.mean - self._margin / 2))
+        if self.llr[0] >= self._upper:
+            return "first"
+        if self.llr[1] >= self._upper:
+            return "second"
+        if self.llr[0] <= self._lower and self.llr[1] <= self._lower:
+            return "undecided"
+        return None
+
+
+def _variance(values: list[float]) -> float:
+    mean: float = sum(values) / len(values)
+    return sum((value - mean) ** 2 for value in values) / max(1, len(values) - 1)
+
+
+def compare(first: Arm,
+            second: Arm,
+            recipes: str = DEFAULT_RECIPES,
+            margin: float = 0.02,
+            alpha: float = 0.05,
+            beta: float = 0.05,
+            max_pairs: int = 100000,
+            seed: int = 0,
+            paired: bool = True,
+            workers: int = 1,
+            chunk: int = 200) -> dict[str, Any]:
+    '''Plays pairs of games until the SPRT decides if either arm's first seat wins more by margin, or max_pairs.
+
+    The arms of a pair play the same seed with the same seat rotation and, with their
+    chance split into streams, the same shuffles, steals and nope order. Pair n plays
+    seed + n // seats rotated by n % seats, so the focal strategy sits in every seat in
+    turn. Chunks of pairs are played in order and the test stops at the same pair
+    whatever the number of workers.'''
+    for recipe, lineup in (first, second):
+        deck_recipe: DeckRecipe = load_recipes(recipes)[recipe]
+        if not deck_recipe.min_players <= len(lineup) <= deck_recipe.max_players:
+            raise ValueError(f"Recipe {repr(recipe)} is for {deck_recipe.min_players}-{deck_recipe.max_players} players, not {len(lineup)}")
+    if len(first[1]) != len(second[1]):
+        raise ValueError("Both arms need the same number of seats to be paired")
+
+    test: SPRT = SPRT(margin, alpha, beta)
+    outcomes: list[tuple[int, int]] = []
+    verdict: str | None = None
+    tasks: list[tuple[Arm, Arm, str, int, int, int, int | None]] = [
+        (first, second, recipes, start, min(start + chunk, max_pairs), seed, None if paired else max_pairs)
+        for start in range(0, max_pairs, chunk)]
+
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        for pairs in (pool.imap(_play_pairs, tasks) if pool else map(_play_pairs, tasks)):
+            for pair in pairs:
+                outcomes.append(pair)
+                verdict = test.add(*pair)
+                if verdict:
+                    break
+            if verdict:
+                break
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+    firsts: list[float] = [float(first_won) for first_won, _ in outcomes]
+    seconds: list[float] = [float(second_won) for _, second_won in outcomes]
+    differences: list[float] = [a - b for a, b in zip(firsts, seconds)]
+    independent: float = _variance(firsts) + _variance(seconds)
+    return {"verdict": verdict,
+            "pairs": len(outcomes),
+            "games": 2 * len(outcomes),
+            "first_wins": sum(firsts) / len(outcomes),
+            "second_wins": sum(seconds) / len(outcomes),
+            "difference": test.mean,
+            "deviation": math.sqrt(test.variance / len(outcomes)),
+            "discordant": (sum(a > b for a, b in outcomes), sum(b > a for a, b in outcomes)),
+            "llr": test.llr,
+            # how many times fewer games pairing needs than independent games for the same precision
+            "variance_reduction": independent / _variance(differences) if _variance(differences) else math.inf}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Decides which of two strategies or recipes wins more, from paired games on common seeds.")
+    parser.add_argument("first", help="strategy in the compared seat of the first arm")
+    parser.add_argument("second", help="strategy in the compared seat of the second arm")
+    parser.add_argument("--opponents", nargs="+", default=["random", "random", "random"], choices=sorted(STRATEGIES))
+    parser.add_argument("--recipe", default="base", help="recipe of the first arm")
+    parser.add_argument("--second-recipe", help="recipe of the second arm, the first one's if not given")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--margin", type=float, default=0.02, help="difference of the win rates that counts as better, in both modes")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--max-pairs", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--independent", action="store_true", help="play the arms on unrelated seeds, to see what pairing saves")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=200)
+    arguments = parser.parse_args()
+
+    for strategy in (arguments.first, arguments.second):
+        if strategy not in STRATEGIES:
+            parser.error(f"{repr(strategy)} is not a strategy, use one of {sorted(STRATEGIES)}")
+
+    opponents: tuple[str, ...] = tuple(arguments.opponents)
+    first: Arm = (arguments.recipe, (arguments.first,) + opponents)
+    second: Arm = (arguments.second_recipe or arguments.recipe, (arguments.second,) + opponents)
+
+    start: float = time.perf_counter()
+    report: dict[str, Any] = compare(first, second, arguments.recipes, arguments.margin, arguments.alpha,
+                                     arguments.beta, arguments.max_pairs, arguments.seed,
+                                     not arguments.independent, arguments.workers, arguments.chunk)
+    elapsed: float = time.perf_counter() - start
+
+    verdicts: dict[str | None, str] = {"first": f"{arguments.first} on {first[0]} wins more",
+                                       "second": f"{arguments.second} on {second[0]} wins more",
+                                       "undecided": f"undecided, the win rates differ by less than {arguments.margin}",
+                                       None: f"undecided after {report['pairs']} pairs"}
+    print(f"{report['games']} games in {elapsed:.1f}s: {verdicts[report['verdict']]}")
+    print(f"win rates {report['first_wins']:.3f} vs {report['second_wins']:.3f}, "
+          f"difference {report['difference']:+.3f} ± {report['deviation']:.3f}, "
+          f"discordant pairs {report['discordant'][0]}:{report['discordant'][1]}, "
+          f"pairing needs {report['variance_reduction']:.1f}x fewer games than independent games")
+
+
+if __name__ == "__main__":
+    main()
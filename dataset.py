@@ -0,0 +1,423 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from player import Player
+    from recipes import DeckRecipe
+
+from beliefs import BeliefTracker
+from bots import STRATEGIES, Strategy
+from game import Game
+from multiprocessing import Pool
+from recipes import DEFAULT_RECIPES, load_recipes
+
+import argparse
+import glob
+import json
+import math
+import numpy as np
+import os
+import time
+
+KINDS: list[str] = ["turn", "card", "give", "nope", "defuse", "place", "target"]
+
+DRAW: int = 0
+PLAY: int = 1
+YES: int = 2
+NO: int = 3
+CANCEL: int = 4
+# cards of the name at index i of the dataset's names, chosen to play or to give away
+CARD: int = 5
+
+# positions from the top a kitten can be put back at, the two last slots are any
+# position deeper than those and the bottom of the deck
+PLACES: int = 8
+# known cards on the top of the deck, by name index, -1 when unknown and -2 past the bottom
+TOP: int = 3
+
+
+class Encoder:
+    '''Turns what a player sees of the game and the question asked into fixed-size rows.
+
+    Seats are counted from the deciding player, who is always seat 0, so the other
+    seats read the same from every point of view. The actions are, in order: draw,
+    play, yes, no, cancel, a card per name, the seats after the player's and the
+    places a kitten can be put back at.'''
+    def __init__(self, names: list[str], seats: int) -> None:
+        self._discard: list[int] = [0] * len(names)
+        self._discarded: int = 0
+        self._game: Game | None = None
+
+        self.index: dict[str, int] = {name: number for number, name in enumerate(names)}
+        self.names: list[str] = names
+        self.seats: int = seats
+        self.seat: int = CARD + len(names)
+        self.place: int = self.seat + seats - 1
+        self.actions: list[str] = (["draw", "play", "yes", "no", "cancel"] +
+                                   [f"card:{name}" for name in names] +
+                                   [f"seat:+{offset}" for offset in range(1, seats)] +
+                                   [f"place:{position}" for position in range(1, PLACES - 1)] +
+                                   ["place:deeper", "place:bottom"])
+
+    @classmethod
+    def for_recipe(cls, recipe: DeckRecipe) -> Encoder:
+        cards: list[Any] = recipe.stamp_table(None, recipe.max_players)
+        return cls(sorted({card.name for card in cards}), recipe.max_players)
+
+    def columns(self) -> dict[str, tuple[str, int]]:
+        '''Returns the dtype and width of every column'''
+        names: int = len(self.names)
+        return {"game": ("int64", 1),
+                "seat": ("int8", 1),
+                "kind": ("int8", 1),
+                "hand": ("uint8", names),
+                "deck": ("int16", 1),
+                "discard": ("uint8", names),
+                "top": ("int8", TOP),
+                "turns_left": ("int8", 1),
+                "alive": ("uint8", self.seats),
+                "legal": ("uint8", len(self.actions)),
+                "action": ("int16", 1),
+                "outcome": ("int8", 1)}
+
+    def _option_action(self, player: Player, kind: str, option: str, label: str, deck: int) -> int:
+        if kind == "turn":
+            return PLAY if option == "p" else DRAW
+        if kind in ("nope", "defuse"):
+            return YES if option == "y" else NO
+        if kind in ("card", "give"):
+            return CANCEL if label == "Cancel" else CARD + self.index[label]
+        if kind == "target":
+            game: Game = player.owner()
+            offset: int = (game.seat_of(game.get_player(option)) - game.seat_of(player)) % len(game.players)
+            return self.seat + offset - 1
+
+        position: int = int(option)
+        if position == deck + 1:
+            return self.place + PLACES - 1
+        return self.place + min(position, PLACES - 1) - 1
+
+    def encode(self, player: Player, kind: str, options: list[str], labels: list[str]) -> tuple[list[Any], dict[str, int]]:
+        '''Returns the state columns of a decision, up to the legal mask, and the action of every option'''
+        game: Game = player.owner()
+        names: int = len(self.names)
+        deck: int = game.deck.size()
+
+        hand: list[int] = [0] * names
+        for name, count in player._counts.items():
+            hand[self.index[name]] = count
+
+        # the discard pile only grows during a game, so only the cards added since the last decision are counted
+        discarded: int = game.discard_pile.size()
+        if game is not self._game or discarded < self._discarded:
+            self._game = game
+            self._discard = [0] * names
+            self._discarded = 0
+        for card in game.discard_pile.top_cards(discarded - self._discarded):
+            self._discard[self.index[card.name]] += 1
+        self._discarded = discarded
+        discard: list[int] = self._discard.copy()
+
+        top: list[int] = [-1 if depth < deck else -2 for depth in range(TOP)]
+        if game.beliefs is not None:
+            for depth, name in game.beliefs.known_cards(player).items():
+                if depth < TOP:
+                    top[depth] = self.index[name]
+
+        seat: int = game.seat_of(player)
+        players: list[Player] = game.players
+        alive: list[int] = [0] * self.seats
+        for offset in range(len(players)):
+            alive[offset] = int(players[(seat + offset) % len(players)].is_alive)
+
+        actions: dict[str, int] = {option: self._option_action(player, kind, option, label, deck)
+                                   for option, label in zip(options, labels)}
+        legal: list[int] = [0] * len(self.actions)
+        for option, action in actions.items():
+            # play is offered on every turn, but only legal with a playable card
+            if action != PLAY or game.legal_actions(player):
+                legal[action] = 1
+
+        return [game.seed, seat, KINDS.index(kind), hand, deck, discard, top, player.turns_left, alive, legal], actions
+
+
+class RecordingStrategy(Strategy):
+    '''Answers with another strategy and records every decision with more than one legal action'''
+    def __init__(self, strategy: Strategy, recorder: DecisionRecorder) -> None:
+        self._recorder: DecisionRecorder = recorder
+        self._strategy: Strategy = strategy
+
+        self.beliefs = strategy.beliefs
+        self.name = strategy.name
+
+    def answer(self, player: Player, kind: str, options: list[str], labels: list[str]) -> str:
+        if kind == "pause" or len(options) < 2:
+            return self._strategy.answer(player, kind, options, labels)
+
+        row: list[Any]
+        actions: dict[str, int]
+        row, actions = self._recorder.encoder.encode(player, kind, options, labels)
+        if sum(row[-1]) < 2:
+            return self._strategy.answer(player, kind, options, labels)
+
+        chosen: str = self._strategy.answer(player, kind, options, labels)
+        row.append(actions[chosen])
+        self._recorder.rows.append(row)
+        return chosen
+
+
+class DecisionRecorder:
+    '''Records the decisions of a headless game, their outcome filled in once it's over'''
+    def __init__(self, encoder: Encoder) -> None:
+        self.encoder: Encoder = encoder
+        self.rows: list[list[Any]] = []
+
+    def attach(self, game: Game, lineup: list[str] | tuple[str, ...]) -> None:
+        '''Seats the lineup in the game with recording strategies and tracks what everyone knows of the deck'''
+        for seat, name in enumerate(lineup):
+            game.add_player(f"{name}-{seat}", RecordingStrategy(STRATEGIES[name](), self))
+        if game.beliefs is None:
+            BeliefTracker(game)
+
+    def finish(self, game: Game, winner: Player | None) -> dict[str, np.ndarray]:
+        '''Returns the game's rows as columns, with the outcome of each decision for its player, and forgets them'''
+        columns: dict[str, tuple[str, int]] = self.encoder.columns()
+        won: int = game.seat_of(winner) if winner else -1
+        rows: list[list[Any]] = self.rows
+        self.rows = []
+
+        arrays: dict[str, np.ndarray] = {}
+        for number, (name, (dtype, width)) in enumerate(columns.items()):
+            if name == "outcome":
+                arrays[name] = np.array([row[1] == won for row in rows], dtype=dtype)
+            else:
+                arrays[name] = np.array([row[number] for row in rows], dtype=dtype).reshape(len(rows), width)
+
+        return arrays
+
+
+class DatasetWriter:
+    '''Appends rows to one shard of a dataset directory.
+
+    Every column of the shard is a raw file of fixed-width rows, grown a chunk of rows
+    at a time and written through a memory map. The shard's index, a small JSON file,
+    holds the columns, the encoder's names and seats, how many rows are complete and
+    the seeds of the games they came from, by recipe and lineup. It's replaced
+    atomically after every chunk and on close, so readers never see partial rows and
+    the seeds always match the rows. Workers write shards of their own, so nothing is
+    shared.'''
+    def __init__(self, path: str, encoder: Encoder, shard: str, chunk: int = 1 << 16) -> None:
+        self._capacity: int = 0
+        self._chunk: int = chunk
+        self._columns: dict[str, tuple[str, int]] = encoder.columns()
+        self._maps: dict[str, np.memmap] = {}
+        self._path: str = path
+        self._shard: str = shard
+
+        self.encoder: Encoder = encoder
+        self.games: dict[str, list[list[int]]] = {}
+        self.rows: int = 0
+
+        os.makedirs(path, exist_ok=True)
+        index: str = self._file("json")
+        if os.path.exists(index):
+            with open(index) as file:
+                existing: dict[str, Any] = json.load(file)
+            if existing["names"] != encoder.names or existing["seats"] != encoder.seats:
+                raise ValueError(f"Shard {repr(shard)} was written with other card names or seats")
+            if existing["rows"] and "games" not in existing:
+                raise ValueError(f"Shard {repr(shard)} holds {existing['rows']} rows of games it didn't record, "
+                                 "appending could repeat them")
+            self.games = existing.get("games", {})
+            self.rows = existing["rows"]
+        self._grow(self.rows)
+
+    def _file(self, suffix: str) -> str:
+        return os.path.join(self._path, f"{self._shard}.{suffix}")
+
+    def _grow(self, rows: int) -> None:
+        '''Makes room for the given number of rows, rounded up to whole chunks'''
+        capacity: int = max(self._chunk, math.ceil(rows / self._chunk) * self._chunk)
+        if capacity <= self._capacity:
+            return
+
+        for name, (dtype, width) in self._columns.items():
+            path: str = self._file(f"{name}.bin")
+            with open(path, "ab") as file:
+                file.truncate(capacity * width * np.dtype(dtype).itemsize)
+            self._maps[name] = np.memmap(path, dtype=dtype, mode="r+", shape=(capacity, width))
+        self._capacity = capacity
+
+    def exported(self, source: str, seed: int) -> bool:
+        '''Returns if the game of a seed from a source, such as a recipe and lineup, is in the shard'''
+        return any(start <= seed < stop for start, stop in self.games.get(source, []))
+
+    def append(self, arrays: dict[str, np.ndarray], source: str | None = None, seed: int | None = None) -> None:
+        '''Appends rows given as one array per column, all of the same length, of the game of seed from source if given'''
+        if source is not None and seed is not None:
+            if self.exported(source, seed):
+                raise ValueError(f"Game {seed} of {source} is already in shard {repr(self._shard)}")
+
+            ranges: list[list[int]] = self.games.setdefault(source, [])
+            if ranges and ranges[-1][1] == seed:
+                ranges[-1][1] += 1
+            else:
+                ranges.append([seed, seed + 1])
+
+        rows: int = len(arrays["action"])
+        if not rows:
+            return
+
+        end: int = self.rows + rows
+        chunks: int = self.rows // self._chunk
+        self._grow(end)
+        for name, (_, width) in self._columns.items():
+            self._maps[name][self.rows:end] = arrays[name].reshape(rows, width)
+        self.rows = end
+
+        if end // self._chunk != chunks:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Writes the rows so far to disk and commits them to the index'''
+        for memmap in self._maps.values():
+            memmap.flush()
+
+        index: dict[str, Any] = {"rows": self.rows,
+                                 "games": self.games,
+                                 "columns": self._columns,
+                                 "names": self.encoder.names,
+                                 "seats": self.encoder.seats,
+                                 "actions": self.encoder.actions}
+        temporary: str = self._file("json.tmp")
+        with open(temporary, "w") as file:
+            json.dump(index, file)
+        os.replace(temporary, self._file("json"))
+
+    def close(self) -> None:
+        self.flush()
+        self._maps.clear()
+        # the preallocated rest of the last chunk is given back, appending grows it again
+        for name, (dtype, width) in self._columns.items():
+            with open(self._file(f"{name}.bin"), "r+b") as file:
+                file.truncate(self.rows * width * np.dtype(dtype).itemsize)
+
+    def __enter__(self) -> DatasetWriter:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class Dataset:
+    '''Reads a dataset directory, every column of every shard memory-mapped read-only.
+
+    shard(number)[column] is a view of the file without copying, column(name) joins
+    the shards and only copies when there's more than one. Rows still being written
+    aren't seen until their writer commits them.'''
+    def __init__(self, path: str) -> None:
+        self.actions: list[str] = []
+        self.columns: dict[str, tuple[str, int]] = {}
+        self.names: list[str] = []
+        self.seats: int = 0
+        self.shards: list[dict[str, np.ndarray]] = []
+
+        for index in sorted(glob.glob(os.path.join(path, "*.json"))):
+            with open(index) as file:
+                shard: dict[str, Any] = json.load(file)
+            if self.shards and (shard["names"] != self.names or shard["seats"] != self.seats):
+                raise ValueError(f"{index} was written with other card names or seats than the rest")
+
+            self.actions, self.names, self.seats = shard["actions"], shard["names"], shard["seats"]
+            self.columns = {name: (dtype, width) for name, (dtype, width) in shard["columns"].items()}
+            rows: int = shard["rows"]
+            prefix: str = index[:-len("json")]
+            self.shards.append({name: self._map(prefix + f"{name}.bin", dtype, rows, width)
+                                for name, (dtype, width) in self.columns.items()})
+
+    @staticmethod
+    def _map(path: str, dtype: str, rows: int, width: int) -> np.ndarray:
+        if not rows:
+            return np.empty((0, width) if width > 1 else 0, dtype=dtype)
+
+        memmap: np.memmap = np.memmap(path, dtype=dtype, mode="r", shape=(rows, width))
+        return memmap if width > 1 else memmap.reshape(rows)
+
+    def __len__(self) -> int:
+        return sum(len(shard["action"]) for shard in self.shards)
+
+    def shard(self, number: int) -> dict[str, np.ndarray]:
+        return self.shards[number]
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            raise ValueError(f"{repr(name)} is not a column, use one of {sorted(self.columns)}")
+        if len(self.shards) == 1:
+            return self.shards[0][name]
+        return np.concatenate([shard[name] for shard in self.shards])
+
+
+def export_games(path: str,
+                 seeds: range,
+                 lineup: list[str] | tuple[str, ...],
+                 recipe: str = "base",
+                 recipes: str = DEFAULT_RECIPES,
+                 chunk: int = 1 << 16) -> int:
+    '''Plays a game per seed and appends its decisions to a shard named after the seeds, returns the rows written.
+
+    Seeds whose game with this recipe and lineup the shard already holds are skipped,
+    so exporting the same seeds again adds nothing.'''
+    deck_recipe: DeckRecipe = load_recipes(recipes)[recipe]
+    encoder: Encoder = Encoder.for_recipe(deck_recipe)
+    recorder: DecisionRecorder = DecisionRecorder(encoder)
+    source: str = f"{recipe}:{','.join(lineup)}"
+    with DatasetWriter(path, encoder, f"games-{seeds.start}-{seeds.stop - 1}", chunk) as writer:
+        before: int = writer.rows
+        for seed in seeds:
+            if writer.exported(source, seed):
+                continue
+
+            game: Game = Game(deck_recipe, headless=True, seed=seed)
+            recorder.attach(game, lineup)
+            winner: Player | None = game.play()
+            writer.append(recorder.finish(game, winner), source, seed)
+
+        return writer.rows - before
+
+
+def _export_chunk(task: tuple[str, int, int, tuple[str, ...], str, str]) -> int:
+    path, start, stop, lineup, recipe, recipes = task
+    return export_games(path, range(start, stop), lineup, recipe, recipes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Writes the decisions of headless games to a memory-mapped training dataset.")
+    parser.add_argument("path", help="dataset directory, shards are added to what's there, games already in it are skipped")
+    parser.add_argument("lineup", nargs="+", choices=sorted(STRATEGIES))
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--recipe", default="base")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard", type=int, default=1000, help="games per shard")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    tasks: list[tuple[str, int, int, tuple[str, ...], str, str]] = [
+        (arguments.path, start, min(start + arguments.shard, arguments.seed + arguments.games),
+         tuple(arguments.lineup), arguments.recipe, arguments.recipes)
+        for start in range(arguments.seed, arguments.seed + arguments.games, arguments.shard)]
+
+    start: float = time.perf_counter()
+    if arguments.workers > 1:
+        with Pool(arguments.workers) as pool:
+            rows: int = sum(pool.imap_unordered(_export_chunk, tasks))
+    else:
+        rows = sum(map(_export_chunk, tasks))
+    elapsed: float = time.perf_counter() - start
+
+    print(f"{arguments.games} games, {rows} rows in {elapsed:.1f}s, {rows / elapsed:.0f} rows/s, "
+          f"{len(Dataset(arguments.path))} rows in {arguments.path}")
+
+
+if __name__ == "__main__":
+    main()
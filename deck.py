@@ -4,70 +4,179 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from card import Card
     from game import Game
+    from locations import CardLocations
     from player import Player
 
 from collections import defaultdict
-from random import shuffle
 
 class Deck:
+    '''A pile of cards, the draw deck or the discard pile.
+
+    Cards are stored bottom first so that drawing from and adding to the top are
+    O(1), and every card's slot is kept in the game's location index. A card taken
+    from the middle leaves a tombstone (None) in its slot, the top slot never holds
+    one. Tombstones are compacted away once they make up half of the pile, or when
+    positions counted from the top are needed.'''
     def __init__(self, owner: Game) -> None:
-        self._cards: list[Card] = []
+        self._cards: list[Card | None] = []
+        self._holes: int = 0
         self._owner: Game = owner
 
     def owner(self) -> Game:
         return self._owner
 
+    def _renumber(self, start: int = 0) -> None:
+        locations: CardLocations = self._owner.locations
+        for slot in range(start, len(self._cards)):
+            card: Card | None = self._cards[slot]
+            if card is not None:
+                locations[id(card)] = (card, self, slot)
+
+    def _restore_order(self, cards: list[Card | None], holes: int) -> None:
+        self._cards[:] = cards
+        self._holes = holes
+        self._renumber()
+
+    def _compact(self) -> None:
+        if not self._holes:
+            return
+
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._restore_order, self._cards.copy(), self._holes)
+        self._cards[:] = [card for card in self._cards if card is not None]
+        self._holes = 0
+        self._renumber()
+
+    def _take(self, slot: int) -> int:
+        '''Takes the card out of a slot, returns how many tombstones under the top were dropped with it'''
+        card: Card | None = self._cards[slot]
+        assert card is not None
+        self._owner.locations.pop(id(card))
+        if slot < len(self._cards) - 1:
+            self._cards[slot] = None
+            self._holes += 1
+            return 0
+
+        self._cards.pop()
+        dropped: int = 0
+        while self._cards and self._cards[-1] is None:
+            self._cards.pop()
+            dropped += 1
+        self._holes -= dropped
+        return dropped
+
+    def _put_back(self, slot: int, card: Card, dropped: int) -> None:
+        '''Undoes _take'''
+        if slot < len(self._cards):
+            self._cards[slot] = card
+            self._holes -= 1
+        else:
+            self._cards.extend([None] * dropped)
+            self._holes += dropped
+            self._cards.append(card)
+        self._owner.locations[id(card)] = (card, self, slot)
+
+    def _unshift(self, slot: int) -> None:
+        '''Undoes inserting a card into a compacted pile'''
+        self._owner.locations.pop(id(self._cards.pop(slot)))
+        self._renumber(slot)
+
     def shuffle(self) -> None:
-        shuffle(self._cards)
+        self._compact()
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._restore_order, self._cards.copy(), 0)
+        # shuffled as listed from the top, so that seeds keep dealing the same decks
+        cards: list[Card | None] = self._cards[::-1]
+        self._owner.shuffle_rng.shuffle(cards)
+        self._cards[:] = cards[::-1]
+        self._renumber()
 
     def top_cards(self, amount: int = 3) -> list[Card]:
-        return self._cards[:amount]
+        cards: list[Card] = []
+        for card in reversed(self._cards):
+            if len(cards) >= amount:
+                break
+            if card is not None:
+                cards.append(card)
+
+        return cards
 
     def insert_card(self, card: Card, position: int) -> None:
+        '''Inserts a card position cards from the top, like list.insert on the pile listed top first'''
+        self._compact()
+        size: int = len(self._cards)
+        slot: int = size - (max(0, size + position) if position < 0 else min(position, size))
         card.transfer_ownership(self)
-        self._cards.insert(position, card)
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._unshift, slot)
+        self._cards.insert(slot, card)
+        self._renumber(slot)
+
+    def fill(self, cards: list[Card]) -> None:
+        '''Replaces the pile with the given cards, bottom first, in one go and without journaling'''
+        for card in cards:
+            card._owner = self
+        self._cards[:] = cards
+        self._holes = 0
+        self._renumber()
 
     def add_card(self, card: Card) -> None:
+        if self._owner.beliefs is not None and self is self._owner.discard_pile:
+            self._owner.beliefs.discarded(card, card.owner())
         card.transfer_ownership(self)
-        self._cards.insert(0, card)
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._take, len(self._cards))
+        self._cards.append(card)
+        self._owner.locations[id(card)] = (card, self, len(self._cards) - 1)
 
     def discard_card(self, card: Card | str) -> bool:
         '''Removes a card from the deck given card name or card instance, returns if card was removed succesfully'''
-        if not isinstance(card, str): # to appease circular imports
-            try:
-                self._cards.remove(card)
-                return True
-            except ValueError as _:
-                return False
-        
-        for deck_card in self._cards:
-            if deck_card.name == card:
-                self._cards.remove(deck_card)
-                return True
-        
-        return False
-
-    def draw_card(self, player: Player, log: bool = True) -> None:
+        slot: int | None = None
+        if isinstance(card, str):
+            for index in range(len(self._cards) - 1, -1, -1):
+                deck_card: Card | None = self._cards[index]
+                if deck_card is not None and deck_card.name == card:
+                    slot = index
+                    break
+        else:
+            location: tuple[Card, Player | Deck, int] | None = self._owner.locations.get(id(card))
+            if location is not None and location[1] is self:
+                slot = location[2]
+
+        if slot is None:
+            return False
+
+        removed: Card | None = self._cards[slot]
+        dropped: int = self._take(slot)
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._put_back, slot, removed, dropped)
+        if self._holes * 2 > len(self._cards):
+            self._compact()
+        return True
+
+    async def draw_card(self, player: Player, log: bool = True) -> None:
         '''Draws a card from the deck, and places it into the player's hand, then logs in players activity if nessary'''
-        to_draw: Card = self._cards.pop(0)
+        slot: int = len(self._cards) - 1
+        to_draw: Card | None = self._cards[slot]
+        assert to_draw is not None
+        dropped: int = self._take(slot)
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._put_back, slot, to_draw, dropped)
+        if self._owner.beliefs is not None:
+            self._owner.beliefs.drew(player, to_draw)
         player.receive_card(to_draw)
+        await to_draw.on_draw()
         if log:
-            name: str = to_draw.name
-            if name[0].lower() in "aeiou":
-                name = "an " + name
-            else:
-                name = "a " + name
-            player.add_activity(f"You drew {name}.\n")
+            player.add_activity(("drew", player.name, None, to_draw.name))
 
-        return
 
-    
     def card_status(self) -> list[tuple[str, int]]:
         counts: defaultdict[str, int] = defaultdict(lambda: 0)
-        for card in self._cards:
-            counts[card.name] += 1
-        
+        for card in reversed(self._cards):
+            if card is not None:
+                counts[card.name] += 1
+
         return [(name, amount) for name, amount in counts.items()]
 
     def size(self) -> int:
-        return len(self._cards)
\ No newline at end of file
+        return len(self._cards) - self._holes
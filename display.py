@@ -1,48 +1,78 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from runtime import EventLoop
+
+from screens import Screen, TerminalScreen
 from threading import Thread
 import time
-import os
 
 
 class Display:
-    def __init__(self, width: int = 80, height: int = 24, fps: float = 10.0) -> None:
-        self._grid: list[str] = [" " * width for _ in range(height)]
-        self._cols: int = width
-        self._rows: int = height
+    '''A grid of characters the size of the screen, shown on every frame.
+
+    The screen, the terminal unless another one is given, is asked for its size once
+    and again only after it was resized, the grid then takes the new size on the next
+    call to take_resize. Screens smaller than min_size still get a grid, fits() tells
+    whether the layout fits on it. Rows are only shown again when they differ from the
+    ones last shown.'''
+    def __init__(self,
+                 min_size: tuple[int, int] = (80, 24),
+                 fps: float = 10.0,
+                 loop: EventLoop | None = None,
+                 screen: Screen | None = None) -> None:
+        self._screen: Screen = screen or TerminalScreen()
+        self._cols: int
+        self._rows: int
+        self._cols, self._rows = self._screen.size()
+        self._grid: list[str] = [" " * self._cols for _ in range(self._rows)]
         self._diplay_thread: Thread = Thread(target=self._update_display)
+        self._loop: EventLoop | None = loop
+        self._min_size: tuple[int, int] = min_size
+        self._printed: list[str] | None = None
+        self._resized: bool = False
         self._update_rate: float = 1 / fps
         self._alive: bool = True
         self._paused: bool = False
         self._rendering: bool = False
 
-        self._diplay_thread.start()
-
-        columns: int
-        lines: int
-        columns, lines = self._terminal_size()
-
-        while columns != width or lines != height:
-            self._wait_until_not_rendering()
-            self._paused = True
-            self.clear()
-            self.make_border()
-            self.write_string_horizontal(
-                f"Incorrect terminal size: {columns}x{lines}, expected: {width}x{height}",
-                (self._cols // 2, self._rows // 2),
-                "c"
-            )
-            self._paused = False
-            time.sleep(self._update_rate)
-            columns, lines = self._terminal_size()
+        self._screen.on_resize(self._on_resize)
+
+        # with an event loop, or on a screen that isn't a terminal, the owner of the display calls render instead
+        if loop is None and self._screen.realtime:
+            self._diplay_thread.start()
+
+        self._screen.clear()
+
+    def _on_resize(self) -> None:
+        self._resized = True
+        if self._loop is not None:
+            self._loop.notify()
 
-        self._clear_screen()
+    def take_resize(self) -> bool:
+        '''Resizes the grid if the terminal was resized since the last call, returns if it did'''
+        if not self._resized:
+            return False
+
+        self._resized = False
+        size: tuple[int, int] = self._screen.size()
+        if size == (self._cols, self._rows):
+            return False
+
+        self._wait_until_not_rendering()
+        self._cols, self._rows = size
         self.clear()
+        self._printed = None
+        self._screen.clear()
+        return True
 
-    @staticmethod
-    def _terminal_size() -> tuple[int, int]:
-        size: os.terminal_size = os.get_terminal_size()
-        return size.columns, size.lines
+    def size(self) -> tuple[int, int]:
+        return self._cols, self._rows
+
+    def fits(self) -> bool:
+        '''Returns if the terminal is at least the minimum size'''
+        return self._cols >= self._min_size[0] and self._rows >= self._min_size[1]
 
     def _update_display(self) -> None:
         while self._alive:
@@ -51,25 +81,37 @@ class Display:
                 continue
 
             self._rendering = True
-            self._clear_screen()
-            print("\n".join([row[:self._cols]
-                  for row in self._grid[:self._rows]]), end="")
+            self.render()
             self._rendering = False
 
     def force_display_update(self) -> None:
-        self._clear_screen()
-        print("\n".join([row[:self._cols]
-                         for row in self._grid[:self._rows]]), end="")
+        self._printed = None
+        self.render()
+
+    def render(self) -> None:
+        '''Shows the rows of the grid that changed since they were last shown'''
+        if self._paused:
+            return
+
+        rows: list[str] = self._grid[:self._rows]
+        if self._printed is None or len(self._printed) != len(rows):
+            self._printed = rows
+            self._screen.show(rows, None)
+            return
+
+        # unchanged rows are the very strings shown last time, so comparing them is cheap
+        changed: list[int] = [number for number, (row, printed) in enumerate(zip(rows, self._printed))
+                              if row != printed]
+        if changed:
+            self._printed = rows
+            self._screen.show(rows, changed)
 
     def _print_with_line_clear(self, string: str):
-        width = os.get_terminal_size().columns
+        width = self._cols
         if len(string) > width:
             string = string[:width - 3] + "..."
         print("\r" + " " * width + "\r" + string, end="")
 
-    def _clear_screen(self) -> None:
-        print("\033[H\033[3J", end="")
-
     def _wait_until_not_rendering(self) -> None:
         while self._rendering:
             pass
@@ -83,6 +125,18 @@ class Display:
         self._grid = [" " * self._cols for _ in range(self._rows)]
         return
 
+    def blit(self, string: str, location: tuple[int, int]) -> None:
+        '''Writes a string on one row, which the caller already clipped to the grid. "\\x00" leaves a cell as it was'''
+        self._wait_until_not_rendering()
+        col: int
+        row: int
+        col, row = location
+        line: str = self._grid[row]
+        end: int = col + len(string)
+        if "\x00" in string:
+            string = "".join([old if new == "\x00" else new for new, old in zip(string, line[col:end])])
+        self._grid[row] = line[:col] + string + line[end:]
+
     def write_string_horizontal(self, string: str, location: tuple[int, int], alignment: str = "l") -> None:
         self._wait_until_not_rendering()
         if alignment not in ["l", "c", "r"]:
@@ -179,14 +233,16 @@ class Display:
 
     def read_input(self, location: tuple[int, int], promopt: str = "") -> str:
         self._paused = True
-        time.sleep(self._update_rate)
-        self._wait_until_rendered()
-        escape = f"\033[{location[1] + 1};{location[0] + 1}H"
-        print(escape, end="")
-        ret: str = input(promopt)
-        self._paused = False
+        if self._diplay_thread.is_alive():
+            time.sleep(self._update_rate)
+            self._wait_until_rendered()
 
-        return ret
+        try:
+            return self._screen.read_line(location, promopt, self._loop)
+        finally:
+            # the typed line is on screen now, so the next frame has to show every row again
+            self._printed = None
+            self._paused = False
 
     def make_border(self) -> None:
         self.write_string_horizontal("-" * self._cols, (0, 0))
@@ -200,4 +256,6 @@ class Display:
 
     def close(self) -> None:
         self._alive = False
-        self._diplay_thread.join()
+        if self._diplay_thread.is_alive():
+            self._diplay_thread.join()
+        self._screen.close()
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+# (kind, actor, target, what): the names of the players involved and the card type, or
+# whatever else the kind of event needs, rendered to text only when a textbox shows it
+Event = tuple[str, "str | None", "str | None", Any]
+
+TEMPLATES: dict[str, str] = {
+    "attack": "{actor} played an Attack, forcing {target} to take {what} turns.\n",
+    "cats": "{actor} played two {what}s, and stole from {target}.\n",
+    "cats_noped": "{actor} played two {what}, but {target} noped it!\n",
+    "cats_no_target": "{actor} played two {what}s, but nobody had a card left to steal.\n",
+    "defused": "{actor} drew a kitten, but defused it.\n",
+    "drew": "You drew {a_what}.\n",
+    "exploded": "{actor} drew a kitten and exploded.\n",
+    "favor": "{actor} played a Favor, and stole from {target}.\n",
+    "favor_no_target": "{actor} played a Favor, but nobody had a card left to give.\n",
+    "future": "{actor} played a See The Future.\n",
+    "nope_noped": "{actor} tried to nope {target}'s card, but {what} noped that!\n",
+    "noped": "{actor} played {a_what}, but {target} noped it!\n",
+    "played": "{actor} played {a_what}",
+    "saw": "You saw: (top) {what} (bottom)\n",
+    "shuffle": "{actor} played a Shuffle, and shuffled the deck.\n",
+    "skip": "{actor} played a Skip, and skipped a turn.\n",
+    "stole": "You stole {a_what} from {target}.\n",
+    "stolen": "{actor} stole {a_what} from you.\n",
+    "wins": "{actor} wins!",
+}
+
+
+def article(name: str) -> str:
+    return ("an " if name and name[0].lower() in "aeiou" else "a ") + name
+
+
+def render(event: Event) -> str:
+    '''Formats an activity event as the line shown in the activity log'''
+    kind, actor, target, what = event
+    if isinstance(what, (list, tuple)):
+        what = ", ".join(f"{order}: {name}" for order, name in enumerate(what, 1))
+
+    return TEMPLATES[kind].format(actor=actor, target=target, what=what,
+                                  a_what=article(what) if isinstance(what, str) else what)
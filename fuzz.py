@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from player import Player
+    from recipes import DeckRecipe
+
+from beliefs import BeliefTracker
+from bots import Strategy
+from game import Game
+from journal import Journal
+from recipes import DEFAULT_RECIPES, load_recipes
+
+import argparse
+import random
+import re
+import sys
+import time
+
+
+class Failure:
+    '''A game that broke an invariant or raised, with everything needed to replay it'''
+    def __init__(self,
+                 seed: int,
+                 players: int,
+                 trace: list[int],
+                 error: BaseException,
+                 journal: bool = False,
+                 beliefs: bool = False) -> None:
+        self.beliefs: bool = beliefs
+        self.error: BaseException = error
+        self.journal: bool = journal
+        self.players: int = players
+        self.seed: int = seed
+        self.trace: list[int] = trace
+
+    def __repr__(self) -> str:
+        return f"Failure(seed={self.seed}, players={self.players}, trace={self.trace}, journal={self.journal}, beliefs={self.beliefs}, error={self.error!r})"
+
+    def signature(self) -> str:
+        '''The kind of error and its message without numbers, shrinking keeps failures with the same signature'''
+        return f"{type(self.error).__name__}: {re.sub(r'[0-9]+', 'N', str(self.error))}"
+
+
+class FuzzStrategy(Strategy):
+    '''Answers every seat's questions with random legal options and checks the game before each answer.
+
+    Choices are recorded as distances from the last option, which is the plain one
+    (draw, cancel, don't nope, don't defuse, bottom of the deck), so a trace shrinks
+    towards 0 and a replayed trace that runs out keeps choosing the last option.'''
+    name: str = "fuzz"
+
+    def __init__(self, game: Game, seed: int, script: list[int] | None = None, max_actions: int = 100000) -> None:
+        self._cards: int = 0
+        self._game: Game = game
+        self._max_actions: int = max_actions
+        self._random: random.Random = random.Random(f"fuzz-{seed}")
+        self._script: list[int] | None = script
+
+        self.trace: list[int] = []
+
+    def answer(self, player: Player, kind: str, options: list[str], labels: list[str]) -> str:
+        if not player.is_alive and kind != "pause":
+            raise AssertionError(f"{player.name} is dead but was asked a {kind} question")
+        if len(self.trace) >= self._max_actions:
+            raise AssertionError(f"The game didn't end after {len(self.trace)} actions")
+        if kind != "nope":
+            self.check(beliefs=kind == "turn")
+
+        choice: int
+        if self._script is None:
+            choice = self._random.randrange(len(options))
+        else:
+            choice = self._script[len(self.trace)] if len(self.trace) < len(self._script) else 0
+
+        self.trace.append(choice)
+        return options[max(0, len(options) - 1 - choice)]
+
+    def check(self, beliefs: bool = True) -> None:
+        '''Checks the game's invariants, optionally the players' beliefs, and that no card appeared or
+        disappeared since the deal'''
+        cards: int = self._game.integrity_check()
+        if beliefs and self._game.beliefs is not None:
+            self._game.beliefs.check()
+        if not self._cards:
+            recipe: DeckRecipe = self._game.recipe
+            players: int = len(self._game.players)
+            self._cards = (recipe.starting_defuses * players + len(recipe.stamp(None, players)) # type: ignore[arg-type]
+                           + recipe.extra_defuses(players) + recipe.kittens(players))
+
+        if cards != self._cards:
+            raise AssertionError(f"{cards} cards in the game, {self._cards} were dealt")
+
+
+def _fuzzed(seed: int,
+            players: int,
+            recipe: DeckRecipe,
+            script: list[int] | None,
+            max_actions: int,
+            journal: Journal | None = None,
+            beliefs: bool = False) -> tuple[Game, FuzzStrategy]:
+    game: Game = Game(recipe, headless=True, seed=seed)
+    game.journal = journal
+    if beliefs:
+        BeliefTracker(game)
+    strategy: FuzzStrategy = FuzzStrategy(game, seed, script, max_actions)
+    for seat in range(players):
+        game.add_player(f"fuzz-{seat}", strategy)
+    return game, strategy
+
+
+def run_game(seed: int,
+             players: int,
+             recipe: DeckRecipe,
+             script: list[int] | None = None,
+             max_actions: int = 100000,
+             journal: bool = False,
+             beliefs: bool = False) -> tuple[list[int], Failure | None]:
+    '''Plays one fuzzed game, random or replaying a script, and returns its trace and failure if any.
+
+    With beliefs, every player's knowledge of the deck is tracked and checked at each turn.
+    With journal, a game that passed is played again from its trace with an undo journal
+    attached, dealing card by card and journaling every move, and has to end the same way.'''
+    game, strategy = _fuzzed(seed, players, recipe, script, max_actions, None, beliefs)
+    try:
+        winner: Player | None = game.play()
+        strategy.check()
+        if game.players_alive() != 1 or winner is None or not winner.is_alive:
+            raise AssertionError(f"The game ended with {game.players_alive()} players alive")
+
+        if journal:
+            journaled, replayed = _fuzzed(seed, players, recipe, strategy.trace, max_actions, Journal(), beliefs)
+            again: Player | None = journaled.play()
+            replayed.check()
+            if replayed.trace != strategy.trace or again is None or journaled.seat_of(again) != game.seat_of(winner):
+                raise AssertionError(f"The journaled game ended after {len(replayed.trace)} actions won by "
+                                     f"{again.name if again else None}, not after {len(strategy.trace)} won by {winner.name}")
+    except Exception as error:
+        return strategy.trace, Failure(seed, players, strategy.trace, error, journal, beliefs)
+
+    return strategy.trace, None
+
+
+def shrink(failure: Failure, recipe: DeckRecipe, max_actions: int = 100000) -> Failure:
+    '''Looks for a smaller game failing the same way: fewer players, a lower seed and a shorter, plainer trace'''
+    signature: str = failure.signature()
+
+    def attempt(seed: int, players: int, trace: list[int]) -> Failure | None:
+        candidate: Failure | None = run_game(seed, players, recipe, trace, max_actions, failure.journal, failure.beliefs)[1]
+        if candidate is None or candidate.signature() != signature:
+            return None
+
+        # trailing plain choices are what an exhausted script answers anyway
+        while candidate.trace and not candidate.trace[-1]:
+            candidate.trace.pop()
+        return candidate
+
+    best: Failure = attempt(failure.seed, failure.players, failure.trace) or failure
+    for players in range(recipe.min_players, best.players):
+        best = attempt(best.seed, players, best.trace) or best
+        if best.players == players:
+            break
+
+    for seed in range(min(best.seed, 64)):
+        found: Failure | None = attempt(seed, best.players, best.trace)
+        if found is not None:
+            best = found
+            break
+
+    improved: bool = True
+    while improved:
+        improved = False
+
+        # cut ever smaller chunks out of the trace, starting with everything after the first half
+        size: int = len(best.trace) // 2
+        while size:
+            start: int = len(best.trace) - size
+            while start >= 0:
+                found = attempt(best.seed, best.players, best.trace[:start] + best.trace[start + size:])
+                if found is not None and len(found.trace) < len(best.trace):
+                    best, improved = found, True
+                start = min(start, len(best.trace)) - size
+            size //= 2
+
+        # then make single choices plainer
+        for index in range(len(best.trace)):
+            for choice in range(best.trace[index] if index < len(best.trace) else 0):
+                found = attempt(best.seed, best.players, best.trace[:index] + [choice] + best.trace[index + 1:])
+                if found is not None:
+                    best, improved = found, True
+                    break
+
+    return best
+
+
+def fuzz(games: int,
+         recipe: str = "base",
+         recipes: str = DEFAULT_RECIPES,
+         seed: int = 0,
+         players: tuple[int, int] | None = None,
+         max_actions: int = 100000,
+         budget: float | None = None,
+         journal_every: int = 10,
+         beliefs_every: int = 20) -> dict:
+    '''Plays random games until one fails, games have been played or the time budget (seconds) runs out.
+
+    Seats cycle through the player counts of the recipe, or the given (min, max) range.
+    Every beliefs_every-th game tracks and checks what the players know of the deck, and
+    every journal_every-th game is also replayed with an undo journal attached, none
+    when 0: both cost more than the game. The first failure is shrunk and returned with the counts of games and
+    actions played.'''
+    deck_recipe: DeckRecipe = load_recipes(recipes)[recipe]
+    low, high = players or (deck_recipe.min_players, deck_recipe.max_players)
+    if not deck_recipe.min_players <= low <= high <= deck_recipe.max_players:
+        raise ValueError(f"{recipe} is for {deck_recipe.min_players}-{deck_recipe.max_players} players, not {low}-{high}")
+
+    actions: int = 0
+    played: int = 0
+    start: float = time.perf_counter()
+    failure: Failure | None = None
+    while played < games and (budget is None or time.perf_counter() - start < budget):
+        trace, failure = run_game(seed + played, low + played % (high - low + 1), deck_recipe, None, max_actions,
+                                  journal_every > 0 and played % journal_every == 0,
+                                  beliefs_every > 0 and played % beliefs_every == 0)
+        actions += len(trace)
+        played += 1
+        if failure is not None:
+            break
+
+    elapsed: float = time.perf_counter() - start
+    if failure is not None:
+        failure = shrink(failure, deck_recipe, max_actions)
+
+    return {"games": played, "actions": actions, "seconds": elapsed, "failure": failure}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays random legal games and checks the game's invariants after every action.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--recipe", default="base")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--players", nargs=2, type=int, metavar=("MIN", "MAX"))
+    parser.add_argument("--max-actions", type=int, default=100000, help="actions after which a game counts as stuck")
+    parser.add_argument("--budget", type=float, help="stop after this many seconds")
+    parser.add_argument("--replay", type=int, metavar="PLAYERS", help="replay the game of --seed with --trace and this many players")
+    parser.add_argument("--trace", default="", help="comma separated choices of a game to replay")
+    parser.add_argument("--journal", action="store_true", help="also replay the game of --replay with an undo journal")
+    parser.add_argument("--beliefs", action="store_true", help="track and check beliefs in the game of --replay")
+    parser.add_argument("--journal-every", type=int, default=10,
+                        help="replay every Nth game with an undo journal attached, 0 for none")
+    parser.add_argument("--beliefs-every", type=int, default=20,
+                        help="track and check the players' beliefs in every Nth game, 0 for none")
+    arguments = parser.parse_args()
+
+    if arguments.replay:
+        script: list[int] = [int(choice) for choice in arguments.trace.split(",") if choice]
+        trace, failure = run_game(arguments.seed, arguments.replay, load_recipes(arguments.recipes)[arguments.recipe],
+                                  script, arguments.max_actions, arguments.journal, arguments.beliefs)
+        print(f"{len(trace)} actions, " + (f"failed: {failure.signature()}" if failure else "no failure"))
+        if failure:
+            raise failure.error
+        return
+
+    report: dict = fuzz(arguments.games, arguments.recipe, arguments.recipes, arguments.seed,
+                        arguments.players, arguments.max_actions, arguments.budget, arguments.journal_every,
+                        arguments.beliefs_every)
+    print(f"{report['games']} games, {report['actions']} actions in {report['seconds']:.1f}s, "
+          f"{report['actions'] / max(report['seconds'], 1e-9):.0f} actions/s")
+
+    failure = report["failure"]
+    if failure is None:
+        return
+
+    print(f"failed: {failure.signature()}")
+    print(f"replay: python fuzz.py --recipe {arguments.recipe} --seed {failure.seed} "
+          f"--replay {failure.players} --trace {','.join(map(str, failure.trace))}"
+          + (" --journal" if failure.journal else "") + (" --beliefs" if failure.beliefs else ""))
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,132 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING, Any, Coroutine
+if TYPE_CHECKING:
+    from bots import Strategy
+    from providers import InputProvider
+    from results import ResultStore
+    from runtime import EventLoop
+    from screens import Screen
+    from spectator import SpectatorHub
+
+from beliefs import BeliefTracker
 from cards import *
 from deck import Deck
+from events import Event, render
+from journal import Journal
+from locations import CardLocations
 from player import Player
+from recipes import CardPool, DeckRecipe, load_recipes
 from textdisplay import TextDisplay, Textbox
 from threading import Thread
 
+import random
 import time
 
+# the smallest terminal the layout fits
+MIN_SCREEN: tuple[int, int] = (60, 20)
+
+
+def screen_layout(width: int, height: int) -> dict[str, tuple[tuple[int, int], tuple[int, int]]]:
+    '''Returns the location and size of every textbox on a terminal of the given size.
+
+    Keys are "game_<box>" for the game's textboxes, "player_<box>" for the ones every
+    player has and "prompt" for where questions are asked. The status lines stay at the
+    top, the discard pile and the hand share a column on the right and the activity
+    logs fill the rows above the prompt. A 120x36 terminal gets the original layout.'''
+    side: int = max(20, width // 4)
+    main: int = width - side - 1
+    rows: int = height - 12
+    activity: int = min(9, (rows + 1) // 2) + max(0, rows - 23) // 2
+    player_activity: int = min(8, rows - activity) + max(0, rows - 24) // 2
+    discard: int = height // 2
+    return {
+        "game_active": ((0, 0), (main, 1)),
+        "game_player_status": ((0, 2), (main, 6)),
+        "game_deck_status": ((0, 9), (main, 1)),
+        "player_turns": ((0, 10), (main, 1)),
+        "game_activity": ((0, height - 1 - player_activity - activity), (main, activity)),
+        "player_activity": ((0, height - 1 - player_activity), (main, player_activity)),
+        "game_discard_status": ((main + 1, 0), (side, discard)),
+        "player_inventory": ((main + 1, discard), (side, height - 1 - discard)),
+        "prompt": ((0, height - 1), (width, 1)),
+    }
+
+
 class Game:
-    def __init__(self) -> None:
-        self._display_thread: Thread = Thread(target=self._update_display)
-        self._names: list[str] = []
-        self._player_order: list[int] = []
+    def __init__(self,
+                 recipe: DeckRecipe | None = None,
+                 headless: bool = False,
+                 seed: int | None = None,
+                 results: ResultStore | None = None,
+                 loop: EventLoop | None = None,
+                 pool: CardPool | None = None,
+                 screen: Screen | None = None,
+                 streams: bool = False) -> None:
+        self._alive_count: int = 0
+        self._display_thread: Thread | None = None
+        self._next_alive: dict[Player, Player] = {}
+        self._players_by_name: dict[str, Player] = {}
+        self._players_holding: int = 0
+        self._prev_alive: dict[Player, Player] = {}
+        self._prompt: tuple[int, int] = (0, 35)
+        self._screen: dict[str, tuple[tuple[int, int], tuple[int, int]]] = screen_layout(120, 36)
+        self._seats: dict[Player, int] = {}
         self._ui_textboxes: dict[str, Textbox] = {}
 
         self.active_player: Player | None = None
         self.alive: bool = True
+        self.beliefs: BeliefTracker | None = None
+        self.cards: list[Card] = []
         self.deck: Deck = Deck(self)
         self.discard_pile: Deck = Deck(self)
-        self.display_handler: TextDisplay = TextDisplay(fps=15, width=120, height=36)
+        self.display_handler: TextDisplay | None = None
+        self.headless: bool = headless
+        self.journal: Journal | None = None
+        self.locations: CardLocations = CardLocations()
+        self.loop: EventLoop | None = loop
         self.players: list[Player] = []
+        self.pool: CardPool | None = pool
+        self.recipe: DeckRecipe = recipe or load_recipes()["base"]
+        self.results: ResultStore | None = results
+        self.seed: int = seed if seed is not None else random.randrange(1 << 63)
+        self.rng: random.Random = random.Random(self.seed)
+        # with streams every source of chance draws from a generator of its own, so what one
+        # seat decides doesn't move the shuffles, steals, nope order or other seats' choices
+        self.nope_rng: random.Random = random.Random(f"{self.seed}-nope") if streams else self.rng
+        self.shuffle_rng: random.Random = random.Random(f"{self.seed}-shuffle") if streams else self.rng
+        self.steal_rng: random.Random = random.Random(f"{self.seed}-steal") if streams else self.rng
+        self.streams: bool = streams
+        self.screen: Screen | None = screen
+        self.spectators: SpectatorHub | None = None
+        self.turns: int = 0
 
         self._ui_textboxes["active"] = Textbox(location=(0, 0), size=(89, 1))
-        self._ui_textboxes["activity"] = Textbox(location=(0, 18), size=(89, 9))
+        self._ui_textboxes["activity"] = Textbox(location=(0, 18), size=(89, 9), renderer=render)
         self._ui_textboxes["deck_status"] = Textbox(location=(0, 9), size=(89, 1))
         self._ui_textboxes["discard_status"] = Textbox(location=(90, 0), size=(30, 18))
         self._ui_textboxes["player_status"] = Textbox(location=(0, 2), size=(89, 6))
 
+        if headless:
+            return
+
+        if loop is not None:
+            # refreshed before the display composes the textboxes on the same frame
+            loop.on_frame(self._refresh_all)
+            self.display_handler = TextDisplay(fps=15, min_size=MIN_SCREEN, loop=loop, screen=screen)
+            self._initialize_textboxes()
+            self.play()
+            return
+
+        if screen is not None and not screen.realtime:
+            # drawn once per question, and played by the caller like a headless game
+            self.display_handler = TextDisplay(fps=15, min_size=MIN_SCREEN, screen=screen)
+            self._initialize_textboxes()
+            return
+
+        self.display_handler = TextDisplay(fps=15, min_size=MIN_SCREEN, screen=screen)
         self._initialize_textboxes()
+        self._display_thread = Thread(target=self._update_display)
         self._display_thread.start()
 
         time.sleep(0.1)
@@ -36,20 +134,45 @@ class Game:
         self.play()
     
     def _initialize_textboxes(self) -> None:
+        assert self.display_handler
         for name, textbox in self._ui_textboxes.items():
             self.display_handler.add_textbox(
                 "game" + "_" + name, 
                 textbox)
+        self.display_handler.on_resize(self._layout)
+
+    def _layout(self, width: int, height: int) -> None:
+        '''Places the textboxes of the game and its players for the new terminal size'''
+        self._screen = screen_layout(width, height)
+        self._prompt = self._screen["prompt"][0]
+        for name, textbox in self._ui_textboxes.items():
+            textbox.update_location(self._screen["game_" + name][0])
+            textbox.resize(self._screen["game_" + name][1])
+        for player in self.players:
+            self._layout_player(player)
+
+    def _layout_player(self, player: Player) -> None:
+        for name, textbox in player._ui_textboxes.items():
+            textbox.update_location(self._screen["player_" + name][0])
+            textbox.resize(self._screen["player_" + name][1])
     
     def _update_display(self) -> None:
         while self.alive:
-            if self.active_player:
-                self._ui_textboxes["active"].update_text(f"Active player: {self.active_player.name}")
-                self._ui_textboxes["deck_status"].update_text(f"Card(s) remaining: {self.deck.size()}")
-                self._ui_textboxes["discard_status"].update_text(self._format_discard_pile())
-                self._ui_textboxes["player_status"].update_text(self._format_player_status())
-
+            self._refresh_textboxes()
             time.sleep(0.05)
+
+    def _refresh_textboxes(self) -> None:
+        if self.active_player:
+            self._ui_textboxes["active"].update_text(f"Active player: {self.active_player.name}")
+            self._ui_textboxes["deck_status"].update_text(f"Card(s) remaining: {self.deck.size()}")
+            self._ui_textboxes["discard_status"].update_text(self._format_discard_pile())
+            self._ui_textboxes["player_status"].update_text(self._format_player_status())
+
+    def _refresh_all(self) -> None:
+        '''Refreshes the textboxes of the game and its players, the event loop's stand-in for their display threads'''
+        self._refresh_textboxes()
+        for player in self.players:
+            player.refresh_textboxes()
     
     def _format_discard_pile(self) -> str:
         text: str = "Discard pile:\n"
@@ -59,23 +182,40 @@ class Game:
         return text
     
     def _format_player_status(self) -> str:
-        text: str = ""
-        for player in self.players:
-            text += player.name + ": "
+        status_box: Textbox = self._ui_textboxes["player_status"]
+        columns: int = -(-len(self.players) // status_box._height)
+
+        if columns <= 1:
+            text: str = ""
+            for player in self.players:
+                text += player.name + ": "
+                if player.is_alive:
+                    text += "alive, "
+                    text += f"has {player.hand_size()} card(s)"
+                else:
+                    text += "dead :("
+                text += "\n"
+
+            return text
+
+        column_width: int = status_box._width // columns
+        rows: list[str] = ["" for _ in range(status_box._height)]
+        for index, player in enumerate(self.players):
+            entry: str
             if player.is_alive:
-                text += "alive, "
-                text += f"has {player.hand_size()} card(s)"
+                entry = f"{player.hand_size()} card(s)"
             else:
-                text += "dead :("
-            text += "\n"
-        
-        return text
+                entry = "dead"
+            entry = f"{player.name[:column_width - len(entry) - 3]}: {entry}"
+            rows[index % status_box._height] += entry.ljust(column_width)
+
+        return "\n".join(row.rstrip() for row in rows)
     
-    def _initialize_players(self) -> None:
+    async def _initialize_players(self) -> None:
         player_count: int = 0
         while player_count == 0:
-            answer: str = self.ask_question("How many players? > ")
-            if answer not in ["2", "3", "4", "5"]:
+            answer: str = await self.ask_question(f"How many players? ({self.recipe.min_players}-{self.recipe.max_players}) > ")
+            if not answer.isnumeric() or not self.recipe.min_players <= int(answer) <= self.recipe.max_players:
                 continue
             
             player_count = int(answer)
@@ -83,131 +223,261 @@ class Game:
         for i in range(player_count):
             while True:
                 try:
-                    self.add_player(self.ask_question(f"Player {i + 1}, what's your name? > "))
+                    self.add_player(await self.ask_question(f"Player {i + 1}, what's your name? > "))
                     break
                 except ValueError as _:
                     pass
 
     
-    def _initialize_cards(self) -> None:
-        for player in self.players:
-            player.receive_card(Defuse(player))
+    async def _initialize_cards(self) -> None:
+        if self.journal is None:
+            self._deal()
+        else:
+            await self._deal_one_by_one()
+
+        if self.beliefs is not None:
+            self.beliefs.reset()
         
-        deck: list[tuple[type[Card] | str, int]] = [
-            (Attack, 4),
-            (Favor, 4),
-            (Nope, 5),
-            (Shuffle, 4),
-            (Skip, 4),
-            (SeeTheFuture, 4),
-            ("Tacocat", 4),
-            ("Watermeloncat", 4),
-            ("Potatocat", 4),
-            ("Beardcat", 4)
-        ]
-
-        for card_type, amount in deck:
-            for _ in range(amount):
-                if isinstance(card_type, str):
-                    self.deck.add_card(Cat(self.deck, card_type))
-                else:
-                    self.deck.add_card(card_type(self.deck))
+        assert self.active_player
+        await self.swap_active(self.active_player, True)
+        for player in self.players:
+            player.show_hand = True
+
+    def _deal(self) -> None:
+        '''Sets the table up in bulk, dealing exactly what _deal_one_by_one deals for the same seed.
+
+        Both shuffle the same cards listed in the same order, and shuffles only depend on
+        the number of cards, so the deck and the hands come out the same.'''
+        recipe: DeckRecipe = self.recipe
+        players: int = len(self.players)
+        cards: list[Card] = (self.pool.take(recipe, players) if self.pool is not None else None) \
+            or recipe.stamp_table(self.deck, players)
+        self.cards = cards
+
+        defuses: int = recipe.starting_defuses
+        shuffled: int = len(cards) - recipe.extra_defuses(players) - recipe.kittens(players)
+        # the shuffled-in part as listed from the top, the last card added is on top
+        top: list[Card] = cards[defuses * players:shuffled][::-1]
+        self.shuffle_rng.shuffle(top)
+
+        deal: int = recipe.deal
+        for seat, player in enumerate(self.players):
+            player.deal(cards[seat * defuses:(seat + 1) * defuses] + top[seat * deal:(seat + 1) * deal])
+
+        rest: list[Card] = cards[shuffled:][::-1] + top[players * deal:]
+        self.shuffle_rng.shuffle(rest)
+        self.deck.fill(rest[::-1])
+
+    async def _deal_one_by_one(self) -> None:
+        '''Sets the table up card by card, journaling every move'''
+        players: int = len(self.players)
+
+        for player in self.players:
+            for _ in range(self.recipe.starting_defuses):
+                player.receive_card(self.recipe.stamp_defuse(player))
+
+        for card in self.recipe.stamp(self.deck, players):
+            self.deck.add_card(card)
         
         self.deck.shuffle()
         
         for player in self.players:
-            for _ in range(7):
-                self.deck.draw_card(player, False)
-        
-        players: int = len(self.players)
-        extra_defuses: int
-        if players == 2:
-            extra_defuses = 2
-        else:
-            extra_defuses = 6 - players
+            for _ in range(self.recipe.deal):
+                await self.deck.draw_card(player, False)
         
-        for _ in range(extra_defuses):
-            self.deck.add_card(Defuse(self.deck))
+        for _ in range(self.recipe.extra_defuses(players)):
+            self.deck.add_card(self.recipe.stamp_defuse(self.deck))
         
-        for _ in range(players - 1):
-            self.deck.add_card(Kitten(self.deck))
+        for _ in range(self.recipe.kittens(players)):
+            self.deck.add_card(self.recipe.stamp_kitten(self.deck))
 
         self.deck.shuffle()
-        
-        assert self.active_player
-        self.swap_active(self.active_player, True)
-        for player in self.players:
-            player.show_hand = True
 
-    def play(self) -> None:
-        self._initialize_players()
-        self._initialize_cards()
+    def play(self) -> Player | None:
+        '''Plays the game to the end without an event loop and returns the winner.
+
+        Every question must be answered right away, by strategies or the display. Games
+        with seats waiting on input providers are played with run() on an event loop.'''
+        game: Coroutine[Any, Any, Player | None] = self.run()
+        try:
+            game.send(None)
+        except StopIteration as finished:
+            return finished.value
+
+        game.close()
+        raise RuntimeError("The game waited for input, play it on an event loop with run()")
+
+    async def run(self) -> Player | None:
+        '''Plays the game to the end and returns the winner, awaiting the input providers of the seats.
+
+        Headless games skip the setup questions, so their players must be added beforehand.
+        The result is stored in the game's result store, if it has one.'''
+        if not self.players:
+            await self._initialize_players()
+        await self._initialize_cards()
 
         while self.players_alive() > 1:
             assert self.active_player
-            self.active_player.take_turn()
-            self.swap_active(self.next_player())
+            self.turns += 1
+            await self.active_player.take_turn()
+            await self.swap_active(self.next_player())
         
+        winner: Player | None = None
         for player in self.players:
             if player.is_alive:
-                self.add_activity(f"{player.name} wins!")
+                winner = player
+                self.add_activity(("wins", player.name, None, None))
+
+        if self.results is not None:
+            self.results.record(self, winner)
+        if self.spectators is not None:
+            self.spectators.publish()
+        if self.pool is not None:
+            self.pool.put(self)
         
         self.close()
+        return winner
 
     def close(self) -> None:
-        time.sleep(0.2)
-        self.display_handler.close()
+        if self.loop is not None and self.display_handler:
+            self.loop.frame(force=True)
+            self.loop.remove_frame(self._refresh_all)
+            self.display_handler.close()
+        elif self._display_thread is None and self.display_handler:
+            self._refresh_all()
+            self.display_handler.frame()
+            self.display_handler.close()
+        elif self.display_handler:
+            time.sleep(0.2)
+            self.display_handler.close()
         self.alive = False
 
-    def add_player(self, name: str) -> Player:
-        if name in self._names:
+    def add_player(self, name: str, strategy: Strategy | None = None, provider: InputProvider | None = None) -> Player:
+        '''Seats a new player, strategies answer the player's questions in headless games and
+        input providers answer them in any game played with run()'''
+        if name in self._players_by_name:
             raise ValueError("Name already taken")
-        self._names.append(name)
-        new_player: Player = Player(name, self)
-        self._player_order.append(len(self._player_order))
+        new_player: Player = Player(name, self, strategy, provider)
+        if self.streams:
+            new_player.rng = random.Random(f"{self.seed}-seat-{len(self.players)}")
+        self._players_by_name[name] = new_player
+        self._seats[new_player] = len(self.players)
+        self._link_player(new_player)
         self.players.append(new_player)
 
         if not self.active_player:
             self.active_player = new_player
+        if self.display_handler is not None:
+            self._layout_player(new_player)
+        if strategy is not None and strategy.beliefs and self.beliefs is None:
+            BeliefTracker(self)
+        if self.spectators is not None:
+            self.spectators.touch(new_player)
 
         return new_player
     
+    def _link_player(self, player: Player) -> None:
+        '''Inserts a player into the ring of alive players, just before the first seat'''
+        if not self.players:
+            self._next_alive[player] = player
+            self._prev_alive[player] = player
+        else:
+            first: Player = self.players[0]
+            last: Player = self._prev_alive[first]
+            self._next_alive[last] = player
+            self._prev_alive[player] = last
+            self._next_alive[player] = first
+            self._prev_alive[first] = player
+
+        self._alive_count += 1
+
+    def eliminate_player(self, player: Player) -> None:
+        '''Unlinks a player from the ring of alive players.
+
+        The eliminated player keeps its forward link, so next_player still works
+        while it is the active player.'''
+        preceding: Player | None = self._prev_alive.pop(player, None)
+        if preceding is None:
+            return
+
+        following: Player = self._next_alive[player]
+        self._next_alive[preceding] = following
+        if following is not player:
+            self._prev_alive[following] = preceding
+
+        self._alive_count -= 1
+        if self.journal is not None:
+            self.journal.record(self._relink_player, player, preceding, following)
+
+    def _relink_player(self, player: Player, preceding: Player, following: Player) -> None:
+        '''Undoes eliminate_player, putting the player back between its old neighbours'''
+        self._next_alive[preceding] = player
+        self._prev_alive[player] = preceding
+        if following is not player:
+            self._prev_alive[following] = player
+
+        self._alive_count += 1
+
     def next_player(self) -> Player:
         if not self.active_player:
             return self.players[0]
-        
-        total_players: int = len(self.players)
-        index: int = self.players.index(self.active_player) + 1
-        index %= total_players
 
-        while not self.players[index].is_alive:
-            index += 1
-            index %= total_players
+        following: Player = self._next_alive[self.active_player]
+        while not following.is_alive:
+            following = self._next_alive[following]
 
-        return self.players[index]
+        return following
 
-    def is_player(self, name: str) -> bool:
-        for player in self.players:
-            if player.name == name:
-                return True
+    def alive_after(self, player: Player) -> list[Player]:
+        '''Returns the alive players in turn order, starting after the given player'''
+        ordered: list[Player] = []
+        following: Player = self._next_alive[player]
+        while not following.is_alive:
+            following = self._next_alive[following]
+
+        for _ in range(self._alive_count):
+            if following is player:
+                break
+            ordered.append(following)
+            following = self._next_alive[following]
+
+        return ordered
+
+    def track_holding(self, change: int) -> None:
+        '''Called by players when their hand becomes empty (-1) or stops being empty (+1)'''
+        self._players_holding += change
+
+    def legal_actions(self, player: Player) -> int:
+        '''Returns the card kinds the player may play right now as a bitmask, see card.kind_bit'''
+        free: int
+        targeted: int
+        free, targeted = player.action_masks()
+        if self._players_holding > (1 if player.hand_size() else 0):
+            return free | targeted
+
+        return free
+
+    def seat_of(self, player: Player) -> int:
+        '''Returns the seat index of the player'''
+        return self._seats[player]
 
-        return False
+    def is_player(self, name: str) -> bool:
+        return name in self._players_by_name
     
     def get_player(self, name: str) -> Player:
-        for player in self.players:
-            if player.name == name:
-                return player
-        
-        raise ValueError(f"{name} is not a player")
+        try:
+            return self._players_by_name[name]
+        except KeyError as _:
+            raise ValueError(f"{name} is not a player")
 
-    def swap_active(self, target: int | Player, force_question: bool = False) -> bool:
+    async def swap_active(self, target: int | Player, force_question: bool = False) -> bool:
         if isinstance(target, Player):
             if not target.is_alive:
                 raise ValueError(f"Can't swap to a dead player.")
 
-            return self.swap_active(self.players.index(target), force_question)
+            target = self._seats[target]
 
-        if target not in self._player_order:
+        if not 0 <= target < len(self.players):
             raise ValueError(f"Unexpected Player: {target}")
 
         if not self.players[target].is_alive:
@@ -216,40 +486,108 @@ class Game:
         if self.players[target] == self.active_player and not force_question:
             return True
 
+        if self.journal is not None:
+            self.journal.record(setattr, self, "active_player", self.active_player)
+
+        # there's nobody at the terminal to hand seats answered by input providers to
+        if self.headless or self.players[target].provider is not None:
+            self.active_player = self.players[target]
+            return True
+
         self.active_player = None
-        self.ask_question(f"Swap to {self.players[target].name}. > ")
+        await self.ask_question(f"Swap to {self.players[target].name}. > ")
         self.active_player = self.players[target]
 
         return True
 
-    def ask_question(self, question: str, location: tuple[int, int] = (0, 35)) -> str:
-        time.sleep(0.1)
+    async def ask_question(self,
+                           question: str,
+                           valid_options: list[str] | None = None,
+                           location: tuple[int, int] | None = None,
+                           kind: str = "text",
+                           labels: list[str] | None = None) -> str:
+        '''Asks the active player a question.
+
+        Players with an input provider are asked through it until they answer a valid option.
+        Otherwise headless games pass the question to the active player's strategy, together
+        with the valid options, the kind of decision and optional labels describing each option.
+        Spectators are sent what changed since the last question, and screens that aren't
+        terminals are drawn.'''
+        if self.spectators is not None:
+            self.spectators.publish()
+        if self.display_handler and self.screen is not None and not self.screen.realtime:
+            self._refresh_all()
+            self.display_handler.frame()
+
+        if self.active_player and self.active_player.provider:
+            answer: str = await self.active_player.provider.ask(
+                question, valid_options, self.active_player, kind, labels or valid_options)
+            while valid_options is not None and answer not in valid_options:
+                answer = await self.active_player.provider.ask(
+                    question, valid_options, self.active_player, kind, labels or valid_options)
+            return answer
+
+        if self.headless:
+            if not self.active_player or not self.active_player.strategy:
+                raise ValueError(f"Nobody can answer {repr(question)} in a headless game")
+
+            if valid_options is None:
+                raise ValueError(f"Headless questions need valid options: {repr(question)}")
+
+            return self.active_player.strategy.answer(
+                self.active_player, kind, valid_options, labels or valid_options)
+
+        assert self.display_handler
+        if self._display_thread is not None:
+            time.sleep(0.1)
+        else:
+            self._refresh_all()
         self.display_handler.force_display_update()
-        return self.display_handler.read_input(location, question)
+        return self.display_handler.read_input(location or self._prompt, question)
     
-    def add_activity(self, text: str | list[str]) -> None:
-        if isinstance(text, list):
-            for line in text:
+    def add_activity(self, event: Event | list[Event]) -> None:
+        '''Logs activity events, headless games have nobody to show them to and drop them'''
+        if self.headless:
+            return
+
+        if isinstance(event, list):
+            for line in event:
                 self.add_activity(line)
             return
         
-        self._ui_textboxes["activity"].append_text(text)
+        self._ui_textboxes["activity"].append_event(event)
+        if self.loop is not None:
+            self.loop.notify()
     
     def players_alive(self) -> int:
-        ret: int = 0
+        return self._alive_count
+    
+    def integrity_check(self) -> int:
+        '''Checks that the location index, the owners of cards and the bookkeeping of players
+        agree with the piles and hands, returns the number of cards in the game.
+
+        Raises an AssertionError on the first inconsistency. A Nope is held by nobody while
+        the players are asked about noping it, so only call this outside Nope chains.'''
+        self.locations.check([(self.deck, self.deck._cards), (self.discard_pile, self.discard_pile._cards)]
+                             + [(player, player._hand) for player in self.players])
+        cards: int = len(self.locations)
+        alive: int = 0
+        holding: int = 0
         for player in self.players:
+            if sum(player._counts.values()) != player.hand_size():
+                raise AssertionError(f"{player.name}'s card counts don't match the hand")
+            if player.turns_left < 0:
+                raise AssertionError(f"{player.name} has {player.turns_left} turns left")
             if player.is_alive:
-                ret += 1
-        
-        return ret
-    
-    # def integrity_check(self) -> None:
-    #     for player in self.players:
-    #         for card in player._hand:
-    #             assert card._owner == player
-        
-    #     for card in self.deck._cards:
-    #         assert card._owner == self.deck
-        
-    #     for card in self.discard_pile._cards:
-    #         assert card._owner == self.discard_pile
+                alive += 1
+            elif player.hand_size():
+                raise AssertionError(f"{player.name} is dead but holds {player.hand_size()} card(s)")
+
+            holding += bool(player.hand_size())
+
+        if alive != self._alive_count:
+            raise AssertionError(f"{alive} players are alive but {self._alive_count} are linked")
+        if holding != self._players_holding:
+            raise AssertionError(f"{holding} players hold cards but {self._players_holding} are tracked")
+
+        return cards
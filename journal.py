@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import inspect
+
+
+class Journal:
+    '''Undo log for game mutations, used to try a move and take it back.
+
+    Decks, players, cards and the game record the inverse of every change they
+    make while a journal is attached to the game (game.journal), so undoing
+    costs as much as the change did. The game's random number generators are not
+    journaled, save game.rng.getstate() (and those of the other streams of games
+    with streams) alongside a checkpoint if replays have to repeat the same random
+    outcomes.'''
+    def __init__(self) -> None:
+        self._entries: list[tuple[Callable[..., Any], tuple[Any, ...]]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, undo: Callable[..., Any], *args: Any) -> None:
+        '''Records how to revert a change, undo(*args) is called when it is rolled back'''
+        self._entries.append((undo, args))
+
+    def checkpoint(self) -> int:
+        '''Returns a marker that undo can roll back to'''
+        return len(self._entries)
+
+    def apply(self, action: Callable[[], Any]) -> int:
+        '''Runs an action that mutates the game and returns the checkpoint from before it.
+
+        Moves such as take_turn, on_play or draw_card are coroutines: they are run to the
+        end right away, like Game.play runs a game, so every question they ask must be
+        answered without waiting. One that waits for input is undone and raises.'''
+        checkpoint: int = len(self._entries)
+        result: Any = action()
+        if inspect.iscoroutine(result):
+            try:
+                result.send(None)
+            except StopIteration:
+                return checkpoint
+
+            result.close()
+            self.undo(checkpoint)
+            raise RuntimeError("The action waited for input, apply only runs moves answered right away")
+        return checkpoint
+
+    def undo(self, checkpoint: int = 0) -> None:
+        '''Reverts every change recorded after the checkpoint, newest first'''
+        entries: list[tuple[Callable[..., Any], tuple[Any, ...]]] = self._entries
+        while len(entries) > checkpoint:
+            undo, args = entries.pop()
+            undo(*args)
+
+    def clear(self) -> None:
+        '''Forgets the recorded changes, making the current state permanent'''
+        self._entries.clear()
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from player import Player
+
+from game import Game
+from multiprocessing import Pipe, Process
+from providers import InputProvider, SocketProvider
+from recipes import DEFAULT_RECIPES, load_recipes
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import resource
+import sys
+import time
+
+# median seconds and spread (sigma of the logarithm) of how long people take to answer each kind of question
+THINK_TIMES: dict[str, tuple[float, float]] = {
+    "turn": (1.8, 0.6),
+    "card": (2.2, 0.6),
+    "give": (2.5, 0.5),
+    "target": (1.6, 0.5),
+    "nope": (1.0, 0.7),
+    "defuse": (1.2, 0.5),
+    "place": (2.8, 0.7),
+    "pause": (0.7, 0.5),
+    "text": (2.0, 0.6)}
+# questions with a single answer are confirmed without thinking
+OBVIOUS: tuple[float, float] = (0.35, 0.4)
+# now and then somebody looks away from the game for a while
+DISTRACTED: tuple[float, float, float] = (0.01, 5.0, 30.0)
+
+
+class SimulatedClient:
+    '''Answers questions the way a person reading them would.
+
+    Clients only see what a remote player is sent, the options and their labels, and
+    pick among them at random: they draw more often than they play, cancel card
+    choices now and then, defuse whenever they can and sometimes nope. Every answer
+    takes a think time drawn from a log-normal distribution for its kind of question,
+    multiplied by the scale. The think times are kept in the order they were drawn.'''
+    def __init__(self, seed: str, scale: float = 1.0) -> None:
+        self._random: random.Random = random.Random(seed)
+        self._scale: float = scale
+
+        self.thinks: list[float] = []
+
+    def think_time(self, kind: str, options: list[str] | None) -> float:
+        median, spread = OBVIOUS if options is not None and len(options) == 1 else THINK_TIMES.get(kind, THINK_TIMES["text"])
+        think: float = self._random.lognormvariate(math.log(median), spread)
+        chance, shortest, longest = DISTRACTED
+        if self._random.random() < chance:
+            think += self._random.uniform(shortest, longest)
+        return think * self._scale
+
+    def choose(self, kind: str, options: list[str] | None, labels: list[str] | None) -> str:
+        if not options:
+            return ""
+
+        labels = labels or options
+        if kind == "turn":
+            return "p" if "p" in options and self._random.random() < 0.3 else "d"
+        if kind == "defuse":
+            return "y" if "y" in options else options[0]
+        if kind == "nope":
+            return "y" if "y" in options and self._random.random() < 0.2 else "n"
+        if kind == "card" and "Cancel" in labels and len(options) > 1 and self._random.random() < 0.9:
+            return self._random.choice([option for option, label in zip(options, labels) if label != "Cancel"])
+
+        return self._random.choice(options)
+
+    def respond(self, kind: str, options: list[str] | None, labels: list[str] | None) -> tuple[str, float]:
+        '''Returns the answer and how many seconds to take giving it'''
+        think: float = self.think_time(kind, options)
+        self.thinks.append(think)
+        return self.choose(kind, options, labels), think
+
+
+class SimulatedProvider(InputProvider):
+    '''Answers a seat's questions with a simulated client in the same process'''
+    def __init__(self, client: SimulatedClient) -> None:
+        self.client: SimulatedClient = client
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        answer, think = self.client.respond(kind, valid_options, labels)
+        await asyncio.sleep(think)
+        return answer
+
+
+class TimedProvider(InputProvider):
+    '''Passes questions on to another provider, timing each from the prompt to the answer'''
+    def __init__(self, provider: InputProvider) -> None:
+        self.latencies: list[tuple[str, float]] = []
+        self.provider: InputProvider = provider
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        start: float = time.perf_counter()
+        answer: str = await self.provider.ask(question, valid_options, player, kind, labels)
+        self.latencies.append((kind, time.perf_counter() - start))
+        return answer
+
+    def close(self) -> None:
+        self.provider.close()
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    '''Returns the nearest-rank percentile of sorted values'''
+    if not ordered:
+        return math.nan
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def _raise_file_limit(needed: int) -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or soft >= needed:
+        return
+    if hard != resource.RLIM_INFINITY and hard < needed:
+        raise ValueError(f"{needed} connections need more open files than the limit of {hard}")
+    resource.setrlimit(resource.RLIMIT_NOFILE, (needed if hard == resource.RLIM_INFINITY else hard, hard))
+
+
+def _peak_memory() -> int:
+    '''Returns the most memory the process ever used, in bytes'''
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+async def _serve_clients(scale: float, seed: int, control: Connection) -> None:
+    thinks: dict[str, list[float]] = {}
+
+    async def answer(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client: SimulatedClient | None = None
+        while line := await reader.readline():
+            question: dict[str, Any] = json.loads(line)
+            if client is None:
+                client = SimulatedClient(f"{seed}-{question['player']}", scale)
+                thinks[question["player"]] = client.thinks
+
+            answered, think = client.respond(question["kind"], question["options"], question["labels"])
+            await asyncio.sleep(think)
+            writer.write(answered.encode() + b"\n")
+            await writer.drain()
+        writer.close()
+
+    server: asyncio.Server = await asyncio.start_server(answer, "127.0.0.1", 0, backlog=1024)
+    control.send(server.sockets[0].getsockname()[1])
+    # the load test says when its games are over
+    await asyncio.get_running_loop().run_in_executor(None, control.recv)
+    server.close()
+    control.send((thinks, time.process_time()))
+
+
+def serve_clients(scale: float, seed: int, connections: int, control: Connection) -> None:
+    '''Answers every connection on localhost with a simulated client, until told to stop.
+
+    Sends the port first and, when stopped, the think times of every player and the
+    CPU time the clients took.'''
+    _raise_file_limit(connections + 64)
+    asyncio.run(_serve_clients(scale, seed, control))
+
+
+async def _monitor(lags: list[float], interval: float = 0.05) -> None:
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    while True:
+        expected: float = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - expected)
+
+
+async def _play(game: Game, delay: float, finished: list[float]) -> Player | None:
+    await asyncio.sleep(delay)
+    winner: Player | None = await game.run()
+    finished.append(time.perf_counter())
+    return winner
+
+
+async def load_test(tables: int,
+                    players: int = 4,
+                    recipe: str = "base",
+                    recipes: str = DEFAULT_RECIPES,
+                    scale: float = 1.0,
+                    ramp: float = 0.0,
+                    seed: int = 0,
+                    port: int | None = None) -> dict[str, Any]:
+    '''Plays tables of simulated players at once on the running event loop and measures them.
+
+    Without a port the clients answer from this process, with one every seat connects to
+    the simulated clients listening on it, like remote players would. Every table starts
+    at its own time within the ramp. Returns the response times by kind of question, the
+    think times they contain, the lag of the event loop and what the tables cost.'''
+    deck_recipe = load_recipes(recipes)[recipe]
+    if not deck_recipe.min_players <= players <= deck_recipe.max_players:
+        raise ValueError(f"Recipe {repr(recipe)} is for {deck_recipe.min_players}-{deck_recipe.max_players} players, not {players}")
+
+    memory: int = _peak_memory()
+    cpu: float = time.process_time()
+    games: list[Game] = []
+    providers: dict[str, TimedProvider] = {}
+    clients: dict[str, SimulatedClient] = {}
+    for table in range(tables):
+        game: Game = Game(deck_recipe, headless=True, seed=seed + table)
+        for seat in range(players):
+            name: str = f"t{table}-s{seat}"
+            provider: InputProvider
+            if port is None:
+                clients[name] = SimulatedClient(f"{seed}-{name}", scale)
+                provider = SimulatedProvider(clients[name])
+            else:
+                provider = await SocketProvider.connect("127.0.0.1", port)
+            providers[name] = TimedProvider(provider)
+            game.add_player(name, provider=providers[name])
+        games.append(game)
+
+    lags: list[float] = []
+    finished: list[float] = []
+    monitor: asyncio.Task = asyncio.create_task(_monitor(lags))
+    start: float = time.perf_counter()
+    try:
+        winners: list[Player | None] = list(await asyncio.gather(
+            *(_play(game, ramp * table / tables, finished) for table, game in enumerate(games))))
+    finally:
+        monitor.cancel()
+        for provider in providers.values():
+            provider.close()
+    elapsed: float = time.perf_counter() - start
+
+    return {"elapsed": elapsed,
+            "tables": tables,
+            "players": players,
+            "won": sum(winner is not None for winner in winners),
+            "turns": sum(game.turns for game in games),
+            "latencies": {name: provider.latencies for name, provider in providers.items()},
+            "thinks": {name: client.thinks for name, client in clients.items()},
+            "lags": lags,
+            "finished": [end - start for end in finished],
+            "cpu": time.process_time() - cpu,
+            "memory": _peak_memory() - memory}
+
+
+def summarize(report: dict[str, Any]) -> dict[str, dict[str, list[float]]]:
+    '''Returns the sorted response and overhead times of a load test by kind of question and in total.
+
+    Overheads are the response times without the client's think time, what the game
+    and the event loop added, and are only known for players whose think times are.'''
+    kinds: dict[str, dict[str, list[float]]] = {}
+    for name, latencies in report["latencies"].items():
+        thinks: list[float] | None = report["thinks"].get(name)
+        for number, (kind, latency) in enumerate(latencies):
+            for key in (kind, "all"):
+                times: dict[str, list[float]] = kinds.setdefault(key, {"response": [], "overhead": []})
+                times["response"].append(latency)
+                if thinks is not None:
+                    times["overhead"].append(latency - thinks[number])
+
+    for times in kinds.values():
+        times["response"].sort()
+        times["overhead"].sort()
+    return kinds
+
+
+def _run_tcp(arguments: argparse.Namespace) -> dict[str, Any]:
+    connections: int = arguments.tables * arguments.players
+    control, farm_end = Pipe()
+    farm: Process = Process(target=serve_clients, args=(arguments.think_scale, arguments.seed, connections, farm_end))
+    farm.start()
+    try:
+        port: int = control.recv()
+        _raise_file_limit(connections + 64)
+        report: dict[str, Any] = asyncio.run(load_test(arguments.tables, arguments.players, arguments.recipe,
+                                                       arguments.recipes, arguments.think_scale, arguments.ramp,
+                                                       arguments.seed, port))
+        control.send("stop")
+        report["thinks"], report["client_cpu"] = control.recv()
+    finally:
+        farm.join(5)
+        if farm.is_alive():
+            farm.terminate()
+    return report
+
+
+def _times(ordered: list[float]) -> str:
+    return "  ".join(f"p{round(fraction * 100)} {percentile(ordered, fraction) * 1000:8.1f}ms" for fraction in (0.5, 0.95, 0.99))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays many tables of simulated players at once and measures how fast the game answers them.")
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--transport", choices=["memory", "tcp"], default="memory",
+                        help="answer in this process, or from a client process over localhost")
+    parser.add_argument("--think-scale", type=float, default=1.0,
+                        help="multiplies the think times, 1 plays at human speed")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which the tables start")
+    parser.add_argument("--recipe", default="base")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--by-kind", action="store_true", help="also show the times of each kind of question")
+    arguments = parser.parse_args()
+
+    report: dict[str, Any]
+    if arguments.transport == "tcp":
+        report = _run_tcp(arguments)
+    else:
+        report = asyncio.run(load_test(arguments.tables, arguments.players, arguments.recipe, arguments.recipes,
+                                       arguments.think_scale, arguments.ramp, arguments.seed))
+
+    kinds: dict[str, dict[str, list[float]]] = summarize(report)
+    prompts: int = len(kinds["all"]["response"]) if kinds else 0
+    elapsed: float = report["elapsed"]
+    lags: list[float] = sorted(report["lags"])
+    print(f"{report['tables']} tables of {report['players']} ({report['tables'] * report['players']} players) "
+          f"over {arguments.transport} in {elapsed:.1f}s, {report['won']} won")
+    print(f"throughput: {prompts / elapsed:.0f} prompts/s, {report['turns'] / elapsed:.1f} turns/s, "
+          f"{report['tables'] / elapsed:.2f} tables/s")
+    for kind in ["all"] + (sorted(kind for kind in kinds if kind != "all") if arguments.by_kind else []):
+        print(f"{kind:>8} {len(kinds[kind]['response']):7} prompts  response {_times(kinds[kind]['response'])}")
+        print(f"{'':>17} overhead {_times(kinds[kind]['overhead'])}")
+    print(f"event loop lag: p99 {percentile(lags, 0.99) * 1000:.1f}ms, max {(lags[-1] if lags else math.nan) * 1000:.1f}ms")
+    print(f"per table: {report['memory'] / report['tables'] / 1024:.1f} KiB memory, "
+          f"{report['cpu'] / report['tables'] * 1000:.1f}ms CPU"
+          + (f" (the clients took another {report['client_cpu']:.1f}s CPU)" if "client_cpu" in report
+             else " with the clients"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from card import Card
+    from deck import Deck
+    from player import Player
+
+
+class CardLocations(dict[int, tuple["Card", "Player | Deck", int]]):
+    '''Game-wide index from id(card) to the card, the pile or hand holding it and its slot there.
+
+    Decks and players update it whenever a card enters, leaves or moves within one
+    of their slots, so finding a card is a dictionary lookup. A card being moved
+    from one place to another is briefly in neither, as is a Nope while it is
+    being noped. Cards are keyed by identity, Card.__eq__ compares names.'''
+    def locate(self, card: Card) -> tuple[Player | Deck, int] | None:
+        '''Returns the pile or hand holding the card and its slot there, None while it is in neither'''
+        location: tuple[Card, Player | Deck, int] | None = self.get(id(card))
+        return (location[1], location[2]) if location else None
+
+    def holds(self, zone: Player | Deck, card: Card) -> bool:
+        location: tuple[Card, Player | Deck, int] | None = self.get(id(card))
+        return location is not None and location[1] is zone
+
+    def check(self, zones: list[tuple[Player | Deck, list[Card] | list[Card | None]]]) -> None:
+        '''Raises an AssertionError unless the index holds exactly the cards of the given piles and
+        hands, each at its slot, and every card is owned by the pile or hand holding it'''
+        indexed: int = 0
+        for zone, cards in zones:
+            for slot, card in enumerate(cards):
+                if card is None:
+                    continue
+
+                location: tuple[Card, Player | Deck, int] | None = self.get(id(card))
+                if location is None or location[1] is not zone or location[2] != slot:
+                    raise AssertionError(f"{card.name} is in slot {slot} of {zone} but indexed at {self.locate(card)}")
+                if card._owner is not zone:
+                    raise AssertionError(f"{card.name} is in {zone} but owned by {card._owner}")
+                indexed += 1
+
+        if indexed != len(self):
+            raise AssertionError(f"{indexed} cards are in piles and hands but {len(self)} are indexed")
@@ -1,9 +1,30 @@
 from __future__ import annotations
 
 from game import Game
+from results import DEFAULT_DATABASE, ResultStore
+from runtime import EventLoop
+
+import argparse
 
 def main() -> None:
-    Game()
+    parser = argparse.ArgumentParser(description="Exploding Kittens in the terminal.")
+    parser.add_argument("--db", default=DEFAULT_DATABASE, help="SQLite database that finished games are stored in")
+    parser.add_argument("--no-db", action="store_true", help="don't store the result of the game")
+    parser.add_argument("--single-thread", action="store_true",
+                        help="run the game, display and input on one select-based event loop instead of threads")
+    arguments = parser.parse_args()
+
+    loop: EventLoop | None = EventLoop(fps=15) if arguments.single_thread else None
+    try:
+        if arguments.no_db:
+            Game(loop=loop)
+            return
+
+        with ResultStore(arguments.db) as results:
+            Game(results=results, loop=loop)
+    finally:
+        if loop is not None:
+            loop.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+from bots import STRATEGIES
+from card import Card
+from cards import CARD_TYPES
+from display import Display
+from game import Game
+from player import Player
+from providers import BotProvider
+from recipes import DEFAULT_RECIPES, DeckRecipe, load_recipes
+from screens import VirtualScreen
+from textdisplay import Textbox
+
+import argparse
+import gc
+import inspect
+import sys
+import time
+import tracemalloc
+
+# where allocations are attributed to, by the functions making them
+CATEGORIES: dict[str, list[Callable[..., Any]]] = {
+    "cards": [Card.__init__, DeckRecipe.stamp, DeckRecipe.stamp_table, DeckRecipe.stamp_defuse,
+              DeckRecipe.stamp_kitten] + [vars(card_type)["__init__"] for card_type in CARD_TYPES.values()
+                                          if "__init__" in vars(card_type)],
+    "textbox text": [Textbox.update_text, Textbox.append_text, Textbox.append_event, Textbox._flush,
+                     Textbox.delete_line, Textbox._wrap],
+    "grid rows": [Display.blit, Display.write_string_horizontal, Display.clear],
+    "formatted": [Player._format_hand, Game._format_discard_pile, Game._format_player_status]}
+OTHER: str = "other"
+
+# allocations made by tracemalloc itself, such as the snapshots
+_UNTRACKED: tuple[tracemalloc.Filter, ...] = (tracemalloc.Filter(False, tracemalloc.__file__),)
+
+
+class Attribution:
+    '''Sorts traced allocations into categories by the innermost frame of a categorised function'''
+    def __init__(self, categories: dict[str, list[Callable[..., Any]]] | None = None) -> None:
+        self._categories: list[str] = list(categories or CATEGORIES) + [OTHER]
+        self._frames: dict[tuple[str, int], str | None] = {}
+        self._ranges: dict[str, list[tuple[int, int, str]]] = {}
+
+        for category, functions in (categories or CATEGORIES).items():
+            for function in functions:
+                lines: list[str]
+                first: int
+                lines, first = inspect.getsourcelines(function)
+                self._ranges.setdefault(inspect.getsourcefile(function) or "", []).append(
+                    (first, first + len(lines) - 1, category))
+
+    def _category(self, filename: str, line: int) -> str | None:
+        key: tuple[str, int] = (filename, line)
+        if key not in self._frames:
+            self._frames[key] = next((category for first, last, category in self._ranges.get(filename, ())
+                                      if first <= line <= last), None)
+        return self._frames[key]
+
+    def categorise(self, snapshot: tracemalloc.Snapshot) -> dict[str, tuple[int, int]]:
+        '''Returns the bytes and blocks of a snapshot by category'''
+        totals: dict[str, list[int]] = {category: [0, 0] for category in self._categories}
+        for trace in snapshot.filter_traces(_UNTRACKED).traces:
+            category: str = OTHER
+            # frames are listed from the oldest, the innermost categorised one wins
+            for frame in reversed(trace.traceback):
+                found: str | None = self._category(frame.filename, frame.lineno)
+                if found is not None:
+                    category = found
+                    break
+            totals[category][0] += trace.size
+            totals[category][1] += 1
+
+        return {category: (size, blocks) for category, (size, blocks) in totals.items()}
+
+
+def difference(after: dict[str, tuple[int, int]], before: dict[str, tuple[int, int]]) -> dict[str, tuple[int, int]]:
+    return {category: (size - before[category][0], blocks - before[category][1])
+            for category, (size, blocks) in after.items()}
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    gc.collect()
+    return tracemalloc.take_snapshot()
+
+
+class TurnSamples:
+    '''What the turns of a game keep allocated and allocate on the way, filled in by its samplers.
+
+    Keeps the snapshot of the first turn at or after warmup and of the latest turn, so
+    their difference is what the turns in between left allocated. The peak is reset
+    at every turn, so what a turn allocated on top of what it started with, even if
+    freed before the next turn, shows up as its transient bytes.'''
+    def __init__(self, warmup: int) -> None:
+        self._start: int = 0
+        self._turn: int = -1
+        self._warmup: int = warmup
+
+        self.peak: int = 0
+        self.snapshots: dict[int, tracemalloc.Snapshot] = {}
+        self.transient: list[int] = []
+
+    def turn(self, number: int) -> None:
+        '''Samples the start of a turn, later questions of the same turn are ignored'''
+        if number == self._turn:
+            return
+
+        peak: int = tracemalloc.get_traced_memory()[1]
+        self.peak = max(self.peak, peak)
+        if self._turn >= self._warmup:
+            self.transient.append(peak - self._start)
+
+        if number >= self._warmup:
+            if len(self.snapshots) > 1:
+                del self.snapshots[max(self.snapshots)]
+            self.snapshots[number] = _snapshot()
+
+        self._turn = number
+        tracemalloc.reset_peak()
+        self._start = tracemalloc.get_traced_memory()[0]
+
+
+class TurnSampler(BotProvider):
+    '''Lets a strategy answer, sampling the allocations at the start of every turn'''
+    def __init__(self, strategy: str, samples: TurnSamples) -> None:
+        super().__init__(STRATEGIES[strategy]())
+        self._samples: TurnSamples = samples
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        if kind == "turn":
+            self._samples.turn(player.owner().turns)
+
+        return await super().ask(question, valid_options, player, kind, labels)
+
+
+def play(recipe: DeckRecipe,
+         seed: int,
+         players: int,
+         strategy: str = "random",
+         size: tuple[int, int] = (120, 36),
+         provider: Callable[[], BotProvider] | None = None) -> Game:
+    '''Plays a game of bots drawn on a virtual screen, without threads or a terminal'''
+    game: Game = Game(recipe, seed=seed, screen=VirtualScreen(*size))
+    for seat in range(players):
+        game.add_player(f"{strategy}-{seat}", provider=provider() if provider else BotProvider(STRATEGIES[strategy]()))
+    game.play()
+    return game
+
+
+def profile(recipe: DeckRecipe,
+            games: int = 20,
+            players: int = 4,
+            strategy: str = "random",
+            seed: int = 0,
+            size: tuple[int, int] = (120, 36),
+            warmup: int = 3,
+            frames: int = 8) -> dict[str, Any]:
+    '''Profiles one game and then many, returns what they keep allocated by category.
+
+    The single game is sampled from its warmup-th turn to its last, for what a table
+    retains while it runs and what its turns allocate transiently, such as the strings
+    formatted for every frame. The many games run after one more game that fills the
+    caches, for what every finished game leaves behind. Snapshots only see allocations
+    alive when taken, so only the retained memory is told apart by category.'''
+    if games < 2:
+        raise ValueError("Needs at least 2 games, the first one only warms up")
+
+    attribution: Attribution = Attribution()
+    started: bool = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start(frames)
+    try:
+        samples: TurnSamples = TurnSamples(warmup)
+        empty: tracemalloc.Snapshot = _snapshot()
+        tracemalloc.reset_peak()
+        before: int = tracemalloc.get_traced_memory()[0]
+        game: Game = play(recipe, seed, players, strategy, size, lambda: TurnSampler(strategy, samples))
+        peak: int = max(samples.peak, tracemalloc.get_traced_memory()[1]) - before
+        turns: list[int] = sorted(samples.snapshots)
+        if len(turns) < 2:
+            raise ValueError(f"Game {seed} ended before turn {warmup + 1}, sample it from an earlier turn")
+        last: dict[str, tuple[int, int]] = attribution.categorise(samples.snapshots[turns[-1]])
+        held: dict[str, tuple[int, int]] = difference(last, attribution.categorise(empty))
+        retained: dict[str, tuple[int, int]] = difference(last, attribution.categorise(samples.snapshots[turns[0]]))
+        transient: list[int] = samples.transient
+        del game, samples, empty
+
+        play(recipe, seed + 1, players, strategy, size)
+        # categorised only once both are taken, the attribution caches what it looked up
+        first: tracemalloc.Snapshot = _snapshot()
+        for number in range(1, games):
+            play(recipe, seed + 1 + number, players, strategy, size)
+        left: dict[str, tuple[int, int]] = difference(attribution.categorise(_snapshot()),
+                                                      attribution.categorise(first))
+    finally:
+        if not started:
+            tracemalloc.stop()
+
+    return {"peak": peak,
+            "held": held,
+            "turns": turns[-1] - turns[0],
+            "retained": retained,
+            "transient": transient,
+            "games": games - 1,
+            "per_game": left}
+
+
+def over_budget(report: dict[str, Any],
+                bytes_per_game: float,
+                retained_blocks_per_turn: float,
+                transient_bytes_per_turn: float) -> list[str]:
+    '''Returns the budgets a profile exceeds, empty when it keeps within them.
+
+    Transient bytes are budgeted on average over the sampled turns, a turn that
+    shuffles or wraps a long log allocates more than one that draws.'''
+    failures: list[str] = []
+    kept: int = sum(size for size, _ in report["per_game"].values())
+    if kept / report["games"] > bytes_per_game:
+        failures.append(f"{kept / report['games']:.0f} bytes kept per game, the budget is {bytes_per_game:.0f}")
+
+    blocks: int = sum(blocks for _, blocks in report["retained"].values())
+    if blocks / report["turns"] > retained_blocks_per_turn:
+        failures.append(f"{blocks / report['turns']:.1f} blocks retained per turn, the budget is {retained_blocks_per_turn:.1f}")
+
+    transient: float = sum(report["transient"]) / len(report["transient"])
+    if transient > transient_bytes_per_turn:
+        failures.append(f"{transient:.0f} transient bytes per turn, the budget is {transient_bytes_per_turn:.0f}")
+
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profiles what games drawn on a virtual screen keep allocated, failing over budget.")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--strategy", default="random", choices=sorted(STRATEGIES))
+    parser.add_argument("--recipe", default="base")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--size", default="120x36", help="columns x rows of the screen")
+    parser.add_argument("--warmup", type=int, default=3, help="turn of the single game to start sampling at")
+    parser.add_argument("--frames", type=int, default=8, help="frames of traceback kept for every allocation")
+    parser.add_argument("--bytes-per-game", type=float, default=1024.0,
+                        help="most bytes a finished game may leave allocated")
+    parser.add_argument("--retained-blocks-per-turn", type=float, default=8.0,
+                        help="most allocated blocks a turn may add to its running table")
+    parser.add_argument("--transient-bytes-per-turn", type=float, default=16384.0,
+                        help="most bytes a turn may allocate on average above what it started with, freed or not")
+    arguments = parser.parse_args()
+
+    size: tuple[int, int] = tuple(map(int, arguments.size.split("x")))
+    start: float = time.perf_counter()
+    report: dict[str, Any] = profile(load_recipes(arguments.recipes)[arguments.recipe], arguments.games,
+                                     arguments.players, arguments.strategy, arguments.seed, size,
+                                     arguments.warmup, arguments.frames)
+    elapsed: float = time.perf_counter() - start
+
+    transient: list[int] = report["transient"]
+    print(f"one game: {report['peak'] / 1024:.1f} KiB at the peak, {sum(transient) / len(transient) / 1024:.1f} KiB "
+          f"transient per turn (most {max(transient) / 1024:.1f} KiB), held at its last turn and retained over "
+          f"{report['turns']} turns:")
+    for category, (kept, blocks) in report["retained"].items():
+        print(f"  {category:>12} {report['held'][category][0] / 1024:7.1f} KiB {report['held'][category][1]:6} blocks"
+              f" {kept / report['turns']:9.1f} bytes {blocks / report['turns']:7.2f} blocks per turn")
+    print(f"{report['games']} more games, kept:")
+    for category, (kept, blocks) in report["per_game"].items():
+        print(f"  {category:>12} {kept / report['games']:9.1f} bytes {blocks / report['games']:7.2f} blocks per game")
+    print(f"profiled in {elapsed:.1f}s")
+
+    failures: list[str] = over_budget(report, arguments.bytes_per_game, arguments.retained_blocks_per_turn,
+                                      arguments.transient_bytes_per_turn)
+    for failure in failures:
+        print(f"over budget: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
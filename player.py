@@ -2,10 +2,16 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
+    from bots import Strategy
     from card import Card
+    from deck import Deck
     from game import Game
+    from locations import CardLocations
+    from providers import InputProvider
 
+from card import kind_bit
 from collections import defaultdict
+from events import Event, render
 from textdisplay import Textbox
 from threading import Thread
 
@@ -14,25 +20,45 @@ import time
 
 
 class Player:
-    def __init__(self, name: str, owner: Game) -> None:
-        self._display_thread: Thread = Thread(target=self._update_display)
+    def __init__(self,
+                 name: str,
+                 owner: Game,
+                 strategy: Strategy | None = None,
+                 provider: InputProvider | None = None) -> None:
+        self._counts: dict[str, int] = {}
+        self._display_thread: Thread | None = None
+        self._free_mask: int = 0
         self._hand: list[Card] = []
         self._owner: Game = owner
+        self._target_mask: int = 0
+        self._turns_left: int = 0
         self._ui_textboxes: dict[str, Textbox] = {}
 
+        self.exploded_on: int | None = None
         self.is_alive: bool = True
         self.name: str = name
+        self.plays: dict[str, int] = {}
+        self.provider: InputProvider | None = provider
+        # what strategies draw their choices from, the game's generator unless it has streams
+        self.rng: random.Random = owner.rng
         self.show_hand: bool = False
-        self.turns_left: int = 0
+        self.strategy: Strategy | None = strategy
 
-        self._ui_textboxes["activity"] = Textbox(location=(0, 27), hidden=True, size=(89, 8))
+        self._ui_textboxes["activity"] = Textbox(location=(0, 27), hidden=True, size=(89, 8), renderer=render)
         self._ui_textboxes["inventory"] = Textbox(location=(90, 18), hidden=True, size=(30, 17))
         self._ui_textboxes["turns"] = Textbox(location=(0, 10), hidden=True, size=(89, 1))
 
+        if owner.headless:
+            return
+
         self._initialize_textboxes()
-        self._display_thread.start()
+        # with an event loop, or on a screen that isn't a terminal, the game refreshes every player's textboxes on its frames
+        if owner.loop is None and (owner.screen is None or owner.screen.realtime):
+            self._display_thread = Thread(target=self._update_display)
+            self._display_thread.start()
     
     def _initialize_textboxes(self) -> None:
+        assert self._owner.display_handler
         for name, textbox in self._ui_textboxes.items():
             self._owner.display_handler.add_textbox(
                 self.name + "_" + name, 
@@ -41,18 +67,22 @@ class Player:
     def _update_display(self) -> None:
         '''Display handler for the player textbox'''
         while self._owner.alive:
-            if not self.is_alive:
-                self._ui_textboxes["activity"].update_text("You are dead. :(")
-            
-            if self.show_hand:
-                self._ui_textboxes["inventory"].update_text(self._format_hand())
-            
-            self._ui_textboxes["turns"].update_text(f"Card draw(s) remaining: {self.turns_left}")
-
-            self._ui_textboxes["activity"].update_visibility(self.is_active())
-            self._ui_textboxes["inventory"].update_visibility(self.is_active())
-            self._ui_textboxes["turns"].update_visibility(self.is_active())
+            self.refresh_textboxes()
             time.sleep(0.05)
+
+    def refresh_textboxes(self) -> None:
+        '''Updates the player's textboxes from its state'''
+        if not self.is_alive:
+            self._ui_textboxes["activity"].update_text("You are dead. :(")
+        
+        if self.show_hand:
+            self._ui_textboxes["inventory"].update_text(self._format_hand())
+        
+        self._ui_textboxes["turns"].update_text(f"Card draw(s) remaining: {self.turns_left}")
+
+        self._ui_textboxes["activity"].update_visibility(self.is_active())
+        self._ui_textboxes["inventory"].update_visibility(self.is_active())
+        self._ui_textboxes["turns"].update_visibility(self.is_active())
     
     def _format_hand(self) -> str:
         counts: defaultdict[str, int] = defaultdict(lambda: 0)
@@ -71,37 +101,111 @@ class Player:
         except AttributeError as _:
             return False
 
+    def _track_added(self, card: Card) -> None:
+        '''Updates the card counts and legal-action masks after a card entered the hand'''
+        count: int = self._counts.get(card.name, 0) + 1
+        self._counts[card.name] = count
+        if count == card.required:
+            if card.needs_target:
+                self._target_mask |= kind_bit(card.name)
+            else:
+                self._free_mask |= kind_bit(card.name)
+
+        if len(self._hand) == 1:
+            self._owner.track_holding(1)
+        if self._owner.spectators is not None:
+            self._owner.spectators.touch(self)
+
+    def _track_removed(self, card: Card) -> None:
+        '''Updates the card counts and legal-action masks after a card left the hand'''
+        count: int = self._counts[card.name] - 1
+        self._counts[card.name] = count
+        if count == card.required - 1:
+            self._target_mask &= ~kind_bit(card.name)
+            self._free_mask &= ~kind_bit(card.name)
+
+        if not self._hand:
+            self._owner.track_holding(-1)
+        if self._owner.spectators is not None:
+            self._owner.spectators.touch(self)
+
+    def _pop_card(self, index: int) -> Card:
+        '''Takes the card out of a slot of the hand, the last card of the hand fills the slot'''
+        card: Card = self._hand[index]
+        last: Card = self._hand.pop()
+        if last is not card:
+            self._hand[index] = last
+            self._owner.locations[id(last)] = (last, self, index)
+        self._owner.locations.pop(id(card))
+        self._track_removed(card)
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._restore_card, index, card)
+        return card
+
+    def _restore_card(self, index: int, card: Card) -> None:
+        '''Undoes _pop_card, moving the card that filled the slot back to the end'''
+        if index < len(self._hand):
+            moved: Card = self._hand[index]
+            self._hand.append(moved)
+            self._owner.locations[id(moved)] = (moved, self, len(self._hand) - 1)
+            self._hand[index] = card
+        else:
+            self._hand.append(card)
+        self._owner.locations[id(card)] = (card, self, index)
+        self._track_added(card)
+
+    def _unreceive_card(self) -> None:
+        card: Card = self._hand.pop()
+        self._owner.locations.pop(id(card))
+        self._track_removed(card)
+
+    def _uncount_play(self, name: str) -> None:
+        self.plays[name] -= 1
+
+    @property
+    def turns_left(self) -> int:
+        return self._turns_left
+
+    @turns_left.setter
+    def turns_left(self, turns: int) -> None:
+        if self._owner.journal is not None:
+            self._owner.journal.record(setattr, self, "_turns_left", self._turns_left)
+        self._turns_left = turns
+
     def owner(self) -> Game:
         '''Returns the game that this player is playing'''
         return self._owner
 
+    def action_masks(self) -> tuple[int, int]:
+        '''Returns the kinds playable on their own and the kinds that also need a target, as bitmasks'''
+        return self._free_mask, self._target_mask
+
     def card_count(self, card: Card | str) -> int:
         '''Counts the number of cards in the hand and returns the count'''
-        count: int = 0
-        for holding in self._hand:
-            if card == holding:
-                count += 1
-
-        return count
+        return self._counts.get(card if isinstance(card, str) else card.name, 0)
 
     def take_random_card(self) -> Card:
         '''Removes a random card from the hand and returns the card removed'''
-        chosen: Card = random.choice(self._hand)
+        chosen: Card = self._owner.steal_rng.choice(self._hand)
         self.remove_card(chosen)
         return chosen
 
+    def holds(self, card: Card) -> bool:
+        '''Returns if this very card is in the hand, unlike `card in hand` which compares names'''
+        return self._owner.locations.holds(self, card)
+
     def remove_card(self, card: Card | str) -> None:
         '''Removes a given card from the hand, given an instance of the card or the card name'''
         if isinstance(card, str):
             for index, card_chosen in enumerate(self._hand):
                 if card_chosen.name == card:
-                    self._hand.pop(index)
-                    return
-        else:
-            for index, card_chosen in enumerate(self._hand):
-                if card_chosen.name == card.name:
-                    self._hand.pop(index)
+                    self._pop_card(index)
                     return
+            return
+
+        location: tuple[Card, Player | Deck, int] | None = self._owner.locations.get(id(card))
+        if location is not None and location[1] is self:
+            self._pop_card(location[2])
 
     def discard_card(self, card: Card | str) -> None:
         '''Discards a given card from the hand, given an instance of the card or the card name'''
@@ -113,71 +217,113 @@ class Player:
             
             return
 
-        if card in self._hand:
+        if self.holds(card):
             card.discard()
 
-    def receive_card(self, card: Card, drawn: bool = True) -> None:
+    def receive_card(self, card: Card) -> None:
         self._hand.append(card)
+        self._owner.locations[id(card)] = (card, self, len(self._hand) - 1)
+        self._track_added(card)
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._unreceive_card)
         card.transfer_ownership(self)
-        if drawn:
-            card.on_draw()
-            
-        return
+
+    def deal(self, cards: list[Card]) -> None:
+        '''Puts dealt cards into the hand, like receive_card without drawing them and without journaling'''
+        locations: CardLocations = self._owner.locations
+        for card in cards:
+            self._hand.append(card)
+            card._owner = self
+            locations[id(card)] = (card, self, len(self._hand) - 1)
+            self._track_added(card)
+
+    def count_play(self, name: str) -> None:
+        '''Counts a card played by this player, for the results of the game'''
+        self.plays[name] = self.plays.get(name, 0) + 1
+        if self._owner.journal is not None:
+            self._owner.journal.record(self._uncount_play, name)
 
     def explode(self) -> None:
+        if self._owner.journal is not None:
+            self._owner.journal.record(setattr, self, "is_alive", True)
+            self._owner.journal.record(setattr, self, "exploded_on", self.exploded_on)
         self.is_alive = False
+        self.exploded_on = self._owner.turns
+        if self._owner.spectators is not None:
+            self._owner.spectators.touch(self)
+        self.turns_left = 0
+        self._owner.eliminate_player(self)
         for card in self._hand.copy():
             self.discard_card(card)
 
-    def take_turn(self) -> None:
-        self._owner.swap_active(self)
+    async def take_turn(self) -> None:
+        await self._owner.swap_active(self)
         if self.turns_left == 0:
             self.turns_left += 1
         
-        while self.turns_left:
-            chosen: str = self._owner.ask_question("[P]lay or [D]raw? > ").lower()
+        while self.is_alive and self.turns_left:
+            chosen: str = (await self._owner.ask_question("[P]lay or [D]raw? > ", ["p", "d"], kind="turn")).lower()
             if chosen not in ["p", "d"]:
                 continue
 
             if chosen == "d":
-                self._owner.deck.draw_card(self)
-                self._owner.ask_question("> ")
-                self.turns_left -= 1
+                await self._owner.deck.draw_card(self)
+                await self._owner.ask_question("> ", [""], kind="pause")
+                if self.is_alive:
+                    self.turns_left -= 1
                 continue
 
-            played_card: Card | None = self.choose_card(prompt="Which card? > ", playable=True)
+            played_card: Card | None = await self.choose_card(prompt="Which card? > ", playable=True)
             if not played_card:
                 continue
 
-            played_card.on_play()
+            self.count_play(played_card.name)
+            await played_card.on_play()
     
     def hand_size(self) -> int:
         return len(self._hand)
     
-    def add_activity(self, string: str) -> None:
-        self._ui_textboxes["activity"].append_text(string)
+    def add_activity(self, event: Event) -> None:
+        if self._owner.headless:
+            return
+
+        self._ui_textboxes["activity"].append_event(event)
+        if self._owner.loop is not None:
+            self._owner.loop.notify()
     
-    def choose_card(self, prompt: str, forced: bool = False, playable: bool = True) -> Card | None:
+    def card_options(self, playable: bool = True) -> list[Card]:
+        '''Returns one card of each kind in the hand, optionally only the playable ones'''
+        mask: int = self._owner.legal_actions(self) if playable else -1
+        cards: dict[str, Card] = {}
+        for card in self._hand:
+            if card.name not in cards and mask & kind_bit(card.name):
+                cards[card.name] = card
+
+        return list(cards.values())
+
+    async def choose_card(self, prompt: str, forced: bool = False, playable: bool = True, kind: str = "card") -> Card | None:
         options: list[str] = []
-        cards: list[Card] = []
+        cards: list[Card] = self.card_options(playable)
+        labels: list[str] = []
         valid_options: list[str] = []
-        for card in self._hand:
-            if (card.can_play() or not playable) and card not in cards:
-                options.append(f"[{len(options) + 1}]. {card.name}")
-                valid_options.append(f"{len(options)}")
-                cards.append(card)
+        for card in cards:
+            options.append(f"[{len(options) + 1}]. {card.name}")
+            valid_options.append(f"{len(options)}")
+            labels.append(card.name)
 
         if not forced:
             options.append(f"[{len(options) + 1}]. Cancel")
             valid_options.append(f"{len(options)}")
+            labels.append("Cancel")
 
-        question: list[str] = ["", "", "", "", "", "", "", ""]
-        for index, option in enumerate(options):
-            question[index % 8] += option.ljust(20)
-        self._ui_textboxes["activity"].append_text("\n".join(question))
+        if not self._owner.headless:
+            question: list[str] = ["", "", "", "", "", "", "", ""]
+            for index, option in enumerate(options):
+                question[index % 8] += option.ljust(20)
+            self._ui_textboxes["activity"].append_text("\n".join(question))
 
         while True:
-            option_chosen: str = self._owner.ask_question(prompt)
+            option_chosen: str = await self._owner.ask_question(prompt, valid_options, kind=kind, labels=labels)
             if option_chosen not in valid_options:
                 continue
 
@@ -187,7 +333,8 @@ class Player:
             chosen_card: Card = cards[int(option_chosen) - 1]
             break
 
-        self._ui_textboxes["activity"].delete_line(8)
+        if not self._owner.headless:
+            self._ui_textboxes["activity"].delete_line(8)
         try:
             return chosen_card
         except UnboundLocalError as _:
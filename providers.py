@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Iterator, TextIO
+if TYPE_CHECKING:
+    from bots import Strategy
+    from player import Player
+
+from bots import STRATEGIES
+from game import Game
+from recipes import DEFAULT_RECIPES, load_recipes
+
+import abc
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+
+class InputProvider(metaclass=abc.ABCMeta):
+    '''Answers a seat's questions asynchronously.
+
+    Games played with run() await the providers of their seats, so one event loop can
+    interleave any number of tables while some wait on slow humans or remote bots.
+    Answers that aren't valid options are asked for again.'''
+    @abc.abstractmethod
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class StdinProvider(InputProvider):
+    '''Asks a human on the terminal, one question at a time for every table sharing it'''
+    def __init__(self, stdin: TextIO | None = None, stdout: TextIO | None = None) -> None:
+        self._blocking: bool = False
+        self._lock: asyncio.Lock | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._stdin: TextIO = stdin or sys.stdin
+        self._stdout: TextIO = stdout or sys.stdout
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if labels and valid_options and labels != valid_options:
+                self._stdout.write("  ".join(f"[{option}]. {label}" for option, label in zip(valid_options, labels)) + "\n")
+            self._stdout.write(f"{player.name}: {question}")
+            self._stdout.flush()
+            return await self._read_line()
+
+    async def _read_line(self) -> str:
+        if self._reader is None and not self._blocking:
+            reader: asyncio.StreamReader = asyncio.StreamReader()
+            try:
+                await asyncio.get_running_loop().connect_read_pipe(
+                    lambda: asyncio.StreamReaderProtocol(reader), self._stdin)
+                self._reader = reader
+            except ValueError:
+                # regular files can't be waited on, but reading them never blocks for long
+                self._blocking = True
+
+        line: str
+        if self._reader is not None:
+            line = (await self._reader.readline()).decode(errors="replace")
+        else:
+            line = self._stdin.readline()
+
+        if not line:
+            raise EOFError("stdin was closed")
+        return line.strip()
+
+
+class ScriptProvider(InputProvider):
+    '''Answers from a script, one answer per line, such as a recorded session'''
+    def __init__(self, answers: Iterable[str]) -> None:
+        self._answers: Iterator[str] = iter(answers)
+
+    @classmethod
+    def from_file(cls, path: str) -> ScriptProvider:
+        with open(path, "r") as file:
+            return cls([line.rstrip("\n") for line in file])
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        try:
+            return next(self._answers)
+        except StopIteration:
+            raise EOFError(f"The script has no answer left for {repr(question)}")
+
+
+class BotProvider(InputProvider):
+    '''Lets a strategy answer, optionally after a delay standing in for a slow or remote player'''
+    def __init__(self, strategy: Strategy, delay: float = 0.0) -> None:
+        self.delay: float = delay
+        self.strategy: Strategy = strategy
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        if valid_options is None:
+            raise ValueError(f"Bots need valid options: {repr(question)}")
+
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.strategy.answer(player, kind, valid_options, labels or valid_options)
+
+
+class SocketProvider(InputProvider):
+    '''Asks a remote player over a stream connection.
+
+    Every question is sent as a line of JSON with the player, the question, the valid
+    options, the kind of question and the labels, and the next line received is the
+    answer. Tables sharing a connection take turns, one question at a time.'''
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._lock: asyncio.Lock = asyncio.Lock()
+        self._reader: asyncio.StreamReader = reader
+        self._writer: asyncio.StreamWriter = writer
+
+    @classmethod
+    async def connect(cls, host: str, port: int) -> SocketProvider:
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        message: bytes = json.dumps({"player": player.name,
+                                     "question": question,
+                                     "options": valid_options,
+                                     "kind": kind,
+                                     "labels": labels}).encode() + b"\n"
+        async with self._lock:
+            self._writer.write(message)
+            await self._writer.drain()
+            line: bytes = await self._reader.readline()
+
+        if not line:
+            raise EOFError(f"{player.name}'s connection was closed")
+        return line.decode(errors="replace").strip()
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+async def play_tables(games: list[Game]) -> list[Player | None]:
+    '''Plays games side by side on the running event loop, returns their winners in order'''
+    return list(await asyncio.gather(*(game.run() for game in games)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays many bot tables at once on one event loop, every answer after a delay.")
+    parser.add_argument("--tables", type=int, default=1000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--strategy", default="random", choices=sorted(STRATEGIES))
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds each answer takes")
+    parser.add_argument("--recipe", default="base")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    games: list[Game] = []
+    for table in range(arguments.tables):
+        game: Game = Game(load_recipes(arguments.recipes)[arguments.recipe], headless=True, seed=arguments.seed + table)
+        for seat in range(arguments.players):
+            game.add_player(f"{arguments.strategy}-{seat}",
+                            provider=BotProvider(STRATEGIES[arguments.strategy](), arguments.delay))
+        games.append(game)
+
+    start: float = time.perf_counter()
+    winners: list[Player | None] = asyncio.run(play_tables(games))
+    elapsed: float = time.perf_counter() - start
+    answers: int = sum(game.turns for game in games)
+    print(f"{len(winners)} tables in {elapsed:.1f}s, {sum(winner is not None for winner in winners)} won, "
+          f"{answers} turns, {answers / elapsed:.0f} turns/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from deck import Deck
+    from game import Game
+
+from card import Card
+from cards import CARD_TYPES
+from functools import lru_cache
+
+import json
+import os
+import tomllib
+
+DEFAULT_RECIPES: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recipes.toml")
+
+
+class CountRule:
+    '''A card count that depends on the number of players and the number of deck copies'''
+    def __init__(self,
+                 per_player: int = 0,
+                 per_deck: int = 0,
+                 offset: int = 0,
+                 minimum: int = 0,
+                 fixed: dict[int, int] | None = None) -> None:
+        self._fixed: dict[int, int] = fixed or {}
+        self._minimum: int = minimum
+        self._offset: int = offset
+        self._per_deck: int = per_deck
+        self._per_player: int = per_player
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], recipe: str, field: str) -> CountRule:
+        unknown: set[str] = set(data) - {"per_player", "per_deck", "offset", "minimum", "fixed"}
+        if unknown:
+            raise ValueError(f"Recipe {repr(recipe)}: unknown keys in {field}: {sorted(unknown)}")
+
+        fixed: dict[int, int] = {}
+        for players, amount in data.get("fixed", {}).items():
+            fixed[int(players)] = _non_negative(amount, recipe, f"{field}.fixed")
+
+        return cls(per_player=int(data.get("per_player", 0)),
+                   per_deck=int(data.get("per_deck", 0)),
+                   offset=int(data.get("offset", 0)),
+                   minimum=_non_negative(data.get("minimum", 0), recipe, f"{field}.minimum"),
+                   fixed=fixed)
+
+    def to_dict(self) -> dict[str, Any]:
+        '''Returns the rule as data that from_dict reads back'''
+        return {"per_player": self._per_player,
+                "per_deck": self._per_deck,
+                "offset": self._offset,
+                "minimum": self._minimum,
+                "fixed": {str(players): amount for players, amount in self._fixed.items()}}
+
+    def evaluate(self, players: int, copies: int) -> int:
+        if players in self._fixed:
+            return self._fixed[players]
+
+        return max(self._minimum, self._offset + self._per_player * players + self._per_deck * copies)
+
+
+class DeckRecipe:
+    '''A validated deck composition, compiled into a template of card constructors'''
+    def __init__(self,
+                 name: str,
+                 cards: list[tuple[str, str | None, int]],
+                 extra_defuses: CountRule,
+                 kittens: CountRule,
+                 deal: int = 7,
+                 starting_defuses: int = 1,
+                 players_per_deck: int = 5,
+                 min_players: int = 2,
+                 max_players: int = 20) -> None:
+        self.deal: int = deal
+        self.max_players: int = max_players
+        self.min_players: int = min_players
+        self.name: str = name
+        self.players_per_deck: int = players_per_deck
+        self.starting_defuses: int = starting_defuses
+
+        self._cards: list[tuple[str, str | None, int]] = cards
+        self._defuse: type[Card] = CARD_TYPES["Defuse"]
+        self._extra_defuses: CountRule = extra_defuses
+        self._kitten: type[Card] = CARD_TYPES["Kitten"]
+        self._kittens: CountRule = kittens
+        self._template: tuple[tuple[type[Card], tuple[str, ...]], ...] = self._compile()
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict[str, Any]) -> DeckRecipe:
+        '''Builds and validates a recipe from parsed TOML / JSON data'''
+        unknown: set[str] = set(data) - {
+            "cards", "deal", "extends", "extra_defuses", "kittens",
+            "max_players", "min_players", "players_per_deck", "starting_defuses"}
+        if unknown:
+            raise ValueError(f"Recipe {repr(name)}: unknown keys: {sorted(unknown)}")
+
+        if not isinstance(data.get("cards"), list):
+            raise ValueError(f"Recipe {repr(name)}: 'cards' must be a list")
+
+        cards: list[tuple[str, str | None, int]] = []
+        for entry in data["cards"]:
+            if not isinstance(entry, dict) or "type" not in entry:
+                raise ValueError(f"Recipe {repr(name)}: every card entry needs a 'type'")
+
+            cards.append((entry["type"],
+                          entry.get("name"),
+                          _non_negative(entry.get("count", 1), name, f"{entry['type']} count")))
+
+        min_players: int = _non_negative(data.get("min_players", 2), name, "min_players")
+        max_players: int = _non_negative(data.get("max_players", 20), name, "max_players")
+        if not 2 <= min_players <= max_players:
+            raise ValueError(f"Recipe {repr(name)}: needs 2 <= min_players <= max_players")
+
+        players_per_deck: int = _non_negative(data.get("players_per_deck", 5), name, "players_per_deck")
+        if players_per_deck == 0:
+            raise ValueError(f"Recipe {repr(name)}: players_per_deck must be positive")
+
+        return cls(name=name,
+                   cards=cards,
+                   extra_defuses=CountRule.from_dict(data.get("extra_defuses", {}), name, "extra_defuses"),
+                   kittens=CountRule.from_dict(data.get("kittens", {"per_player": 1, "offset": -1}), name, "kittens"),
+                   deal=_non_negative(data.get("deal", 7), name, "deal"),
+                   starting_defuses=_non_negative(data.get("starting_defuses", 1), name, "starting_defuses"),
+                   players_per_deck=players_per_deck,
+                   min_players=min_players,
+                   max_players=max_players)
+
+    def to_dict(self) -> dict[str, Any]:
+        '''Returns the recipe, with what it extends already applied, as data that from_dict reads back'''
+        return {"cards": [{"type": type_name, "count": amount, **({"name": card_name} if card_name is not None else {})}
+                          for type_name, card_name, amount in self._cards],
+                "deal": self.deal,
+                "extra_defuses": self._extra_defuses.to_dict(),
+                "kittens": self._kittens.to_dict(),
+                "max_players": self.max_players,
+                "min_players": self.min_players,
+                "players_per_deck": self.players_per_deck,
+                "starting_defuses": self.starting_defuses}
+
+    def _compile(self) -> tuple[tuple[type[Card], tuple[str, ...]], ...]:
+        template: list[tuple[type[Card], tuple[str, ...]]] = []
+        for type_name, card_name, amount in self._cards:
+            if type_name not in CARD_TYPES:
+                raise ValueError(f"Recipe {repr(self.name)}: unknown card type {repr(type_name)}")
+
+            card_type: type[Card] = CARD_TYPES[type_name]
+            args: tuple[str, ...] = () if card_name is None else (card_name,)
+            try:
+                card_type(None, *args) # type: ignore[arg-type]
+            except TypeError as error:
+                raise ValueError(f"Recipe {repr(self.name)}: bad arguments for {type_name}: {error}")
+
+            template.extend([(card_type, args)] * amount)
+
+        for players in range(self.min_players, self.max_players + 1):
+            copies: int = self.copies(players)
+            if len(template) * copies < self.deal * players:
+                raise ValueError(f"Recipe {repr(self.name)}: not enough cards to deal {players} players")
+
+            if self.kittens(players) < 1:
+                raise ValueError(f"Recipe {repr(self.name)}: {players} players need at least one kitten")
+
+        return tuple(template)
+
+    def copies(self, players: int) -> int:
+        '''Returns how many copies of the composition a table of this size uses'''
+        return -(-players // self.players_per_deck)
+
+    def extra_defuses(self, players: int) -> int:
+        return self._extra_defuses.evaluate(players, self.copies(players))
+
+    def kittens(self, players: int) -> int:
+        return self._kittens.evaluate(players, self.copies(players))
+
+    def stamp(self, deck: Deck, players: int) -> list[Card]:
+        '''Creates the shuffled-in part of the deck for a table of the given size, in recipe order'''
+        copies: int = self.copies(players)
+        cards: list[Card] = []
+        for card_type, args in self._template:
+            for _ in range(copies):
+                cards.append(card_type(deck, *args))
+
+        return cards
+
+    def stamp_table(self, owner: Any, players: int) -> list[Card]:
+        '''Creates every card of a table of the given size: the starting defuses, the shuffled-in
+        part in recipe order, the extra defuses and the kittens'''
+        defuse: type[Card] = self._defuse
+        kitten: type[Card] = self._kitten
+        return ([defuse(owner) for _ in range(self.starting_defuses * players)]
+                + self.stamp(owner, players)
+                + [defuse(owner) for _ in range(self.extra_defuses(players))]
+                + [kitten(owner) for _ in range(self.kittens(players))])
+
+    def stamp_defuse(self, owner: Any) -> Card:
+        return self._defuse(owner)
+
+    def stamp_kitten(self, owner: Any) -> Card:
+        return self._kitten(owner)
+
+
+class CardPool:
+    '''Cards of finished games, kept to deal the next games of the same recipe and table size.
+
+    A game given a pool puts its cards back once it is over, so its piles and hands
+    must not be looked at after play() returns.'''
+    def __init__(self, capacity: int = 4) -> None:
+        self._capacity: int = capacity
+        self._tables: dict[tuple[DeckRecipe, int], list[list[Card]]] = {}
+
+    def take(self, recipe: DeckRecipe, players: int) -> list[Card] | None:
+        '''Returns the cards of a table, in the order of DeckRecipe.stamp_table, if any are kept'''
+        tables: list[list[Card]] | None = self._tables.get((recipe, players))
+        return tables.pop() if tables else None
+
+    def put(self, game: Game) -> None:
+        tables: list[list[Card]] = self._tables.setdefault((game.recipe, len(game.players)), [])
+        if game.cards and len(tables) < self._capacity:
+            tables.append(game.cards)
+
+
+def _non_negative(value: Any, recipe: str, field: str) -> int:
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise ValueError(f"Recipe {repr(recipe)}: {field} must be a non-negative integer, got {repr(value)}")
+
+    return value
+
+
+@lru_cache(maxsize=None)
+def load_recipes(path: str = DEFAULT_RECIPES) -> dict[str, DeckRecipe]:
+    '''Parses and compiles every recipe in a TOML or JSON file, once per path'''
+    raw: dict[str, Any]
+    if path.endswith(".json"):
+        with open(path, "r") as file:
+            raw = json.load(file)
+    else:
+        with open(path, "rb") as file:
+            raw = tomllib.load(file)
+
+    recipes: dict[str, DeckRecipe] = {}
+    for name in raw:
+        recipes[name] = DeckRecipe.from_dict(name, _resolve(raw, name, []))
+
+    return recipes
+
+
+def _resolve(raw: dict[str, Any], name: str, seen: list[str]) -> dict[str, Any]:
+    '''Applies 'extends', letting an expansion add to or override the counts of its base recipe'''
+    if name in seen:
+        raise ValueError(f"Recipe {repr(name)}: circular extends through {seen}")
+
+    if name not in raw:
+        raise ValueError(f"Unknown recipe {repr(name)}")
+
+    data: dict[str, Any] = dict(raw[name])
+    if "extends" not in data:
+        return data
+
+    base: dict[str, Any] = _resolve(raw, data.pop("extends"), seen + [name])
+    cards: list[dict[str, Any]] = [dict(entry) for entry in base.get("cards", [])]
+    for entry in data.get("cards", []):
+        for existing in cards:
+            if existing.get("type") == entry.get("type") and existing.get("name") == entry.get("name"):
+                existing.update(entry)
+                break
+        else:
+            cards.append(dict(entry))
+
+    merged: dict[str, Any] = {**base, **data}
+    merged["cards"] = cards
+    return merged
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from player import Player
+    from recipes import DeckRecipe
+
+from bots import STRATEGIES
+from game import MIN_SCREEN, Game
+from providers import BotProvider
+from recipes import DEFAULT_RECIPES, load_recipes
+from screens import VirtualScreen
+
+import argparse
+import random
+import sys
+import time
+
+
+class CheckingProvider(BotProvider):
+    '''Lets a strategy answer after checking the frame the question was drawn on.
+
+    The game draws a frame on its virtual screen before every question, so this checks
+    that the damaged regions composed what drawing every textbox from scratch would,
+    and that the screen shows the composed grid. Sometimes it resizes the screen first.'''
+    def __init__(self, game: Game, screen: VirtualScreen, seed: int, check: bool, resizes: float) -> None:
+        super().__init__(STRATEGIES["random"]())
+        self._check: bool = check
+        self._game: Game = game
+        self._random: random.Random = random.Random(f"render-{seed}")
+        self._resizes: float = resizes
+        self._screen: VirtualScreen = screen
+
+    async def ask(self,
+                  question: str,
+                  valid_options: list[str] | None,
+                  player: Player,
+                  kind: str = "text",
+                  labels: list[str] | None = None) -> str:
+        if self._check:
+            check(self._game, self._screen)
+        if self._resizes and self._random.random() < self._resizes:
+            self._screen.resize(self._random.randrange(MIN_SCREEN[0] - 10, 200),
+                                self._random.randrange(MIN_SCREEN[1] - 5, 60))
+
+        return await super().ask(question, valid_options, player, kind, labels)
+
+
+def check(game: Game, screen: VirtualScreen) -> None:
+    '''Raises an AssertionError unless the screen shows exactly what the game's textboxes draw'''
+    assert game.display_handler
+    game.display_handler.check()
+    grid: list[str] = game.display_handler._display._grid
+    for row, (shown, drawn) in enumerate(zip(screen.lines, grid)):
+        if shown != drawn[:len(shown)].ljust(len(shown)):
+            raise AssertionError(f"Row {row} of the screen shows {repr(shown.rstrip())}, the grid has {repr(drawn.rstrip())}")
+
+
+def play(seed: int,
+         players: int,
+         size: tuple[int, int],
+         check_frames: bool = True,
+         resizes: float = 0.0,
+         record: bool = False,
+         recipe: DeckRecipe | None = None) -> tuple[Game, VirtualScreen]:
+    '''Plays a seeded game of random bots on a virtual screen'''
+    screen: VirtualScreen = VirtualScreen(*size, record=record)
+    game: Game = Game(recipe, seed=seed, screen=screen)
+    for seat in range(players):
+        game.add_player(f"bot-{seat}", provider=CheckingProvider(game, screen, seed * players + seat, check_frames, resizes))
+    game.play()
+    if check_frames:
+        check(game, screen)
+    return game, screen
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Plays random bot games on a virtual screen, checking every frame drawn.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--recipe", default="base")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--size", default="120x36", help="columns x rows of the screen")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--resizes", type=float, default=0.0, help="chance of resizing the screen before a question")
+    parser.add_argument("--no-check", action="store_true", help="only time the frames")
+    parser.add_argument("--cast", help="save the first game as an asciicast to this path")
+    parser.add_argument("--min-fps", type=float, default=0.0, help="fail when fewer frames than this are drawn per second")
+    arguments = parser.parse_args()
+
+    recipe: DeckRecipe = load_recipes(arguments.recipes)[arguments.recipe]
+    size: tuple[int, int] = tuple(map(int, arguments.size.split("x")))
+    frames: int = 0
+    start: float = time.perf_counter()
+    for number in range(arguments.games):
+        record: bool = arguments.cast is not None and number == 0
+        game: Game
+        screen: VirtualScreen
+        game, screen = play(arguments.seed + number, arguments.players, size,
+                            not arguments.no_check, arguments.resizes, record, recipe)
+        frames += screen.frames
+        if record:
+            screen.save_asciicast(arguments.cast, f"seed {game.seed}")
+
+    elapsed: float = time.perf_counter() - start
+    print(f"{arguments.games} games, {frames} frames in {elapsed:.1f}s, {frames / elapsed:.0f} frames/s")
+    if frames / elapsed < arguments.min_fps:
+        print(f"too slow: fewer than {arguments.min_fps:.0f} frames/s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from game import Game
+    from player import Player
+
+import os
+import sqlite3
+import time
+
+DEFAULT_DATABASE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.sqlite3")
+
+SCHEMA: str = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    seed INTEGER,
+    recipe TEXT NOT NULL,
+    players INTEGER NOT NULL,
+    winner INTEGER,
+    turns INTEGER NOT NULL,
+    explosions INTEGER NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seats (
+    game INTEGER NOT NULL REFERENCES games(id),
+    seat INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    strategy TEXT,
+    exploded_on INTEGER,
+    won INTEGER NOT NULL,
+    PRIMARY KEY (game, seat)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS plays (
+    game INTEGER NOT NULL REFERENCES games(id),
+    seat INTEGER NOT NULL,
+    card TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (game, seat, card)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS games_by_table ON games (recipe, players);
+CREATE INDEX IF NOT EXISTS seats_by_seat ON seats (seat, won);
+CREATE INDEX IF NOT EXISTS seats_by_strategy ON seats (strategy, won);
+'''
+
+INSERT_GAME: str = "INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_SEAT: str = "INSERT INTO seats VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_PLAY: str = "INSERT INTO plays VALUES (?, ?, ?, ?)"
+
+# (seed, recipe, players, winner, turns, explosions, finished),
+# [(seat, name, strategy, exploded_on, won)], [(seat, card, count)]
+GameRecord = tuple[tuple[Any, ...], list[tuple[Any, ...]], list[tuple[Any, ...]]]
+
+
+def game_record(game: Game, winner: Player | None) -> GameRecord:
+    '''Returns the rows describing a finished game, without game ids so they can be sent between processes'''
+    winner_seat: int | None = game.seat_of(winner) if winner else None
+    seats: list[tuple[Any, ...]] = []
+    plays: list[tuple[Any, ...]] = []
+    for seat, player in enumerate(game.players):
+        seats.append((seat, player.name, player.strategy.name if player.strategy else None,
+                      player.exploded_on, int(seat == winner_seat)))
+        for card, count in sorted(player.plays.items()):
+            if count:
+                plays.append((seat, card, count))
+
+    explosions: int = sum(1 for player in game.players if player.exploded_on is not None)
+    return ((game.seed, game.recipe.name, len(game.players), winner_seat, game.turns, explosions, time.time()),
+            seats, plays)
+
+
+class ResultStore:
+    '''SQLite database of finished games.
+
+    Games are buffered and written batch_size at a time, each batch in a single
+    transaction with executemany, so one writer can store hundreds of thousands of
+    rows a minute. The database runs in WAL mode, readers never block the writer and
+    several processes can share it, waiting on each other's batches instead of failing.'''
+    def __init__(self, path: str = DEFAULT_DATABASE, batch_size: int = 1000) -> None:
+        self._connection: sqlite3.Connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._pending: list[GameRecord] = []
+
+        self.batch_size: int = batch_size
+        self.path: str = path
+
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def __enter__(self) -> ResultStore:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM games").fetchone()[0] + len(self._pending)
+
+    def record(self, game: Game, winner: Player | None) -> None:
+        '''Stores a finished game'''
+        self.add(game_record(game, winner))
+
+    def add(self, record: GameRecord) -> None:
+        '''Stores the rows of a finished game, made by game_record'''
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Writes the buffered games in one transaction'''
+        if not self._pending:
+            return
+
+        connection: sqlite3.Connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # the write lock is held from here on, so no other process can take the same ids
+            first: int = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM games").fetchone()[0]
+            connection.executemany(INSERT_GAME, [(first + index,) + record[0]
+                                                 for index, record in enumerate(self._pending)])
+            connection.executemany(INSERT_SEAT, [(first + index,) + seat
+                                                 for index, record in enumerate(self._pending) for seat in record[1]])
+            connection.executemany(INSERT_PLAY, [(first + index,) + play
+                                                 for index, record in enumerate(self._pending) for play in record[2]])
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        connection.execute("COMMIT")
+        self._pending.clear()
+
+    def close(self) -> None:
+        self.flush()
+        self._connection.close()
+
+    def win_rate_by_seat(self, players: int | None = None, recipe: str | None = None) -> dict[int, tuple[int, float]]:
+        '''Returns (games, win rate) for every seat, optionally only at tables of a size / recipe'''
+        return self._win_rates("seat", players, recipe)
+
+    def win_rate_by_strategy(self, players: int | None = None, recipe: str | None = None) -> dict[str | None, tuple[int, float]]:
+        '''Returns (games, win rate) for every strategy, None standing for human players'''
+        return self._win_rates("strategy", players, recipe)
+
+    def _win_rates(self, column: str, players: int | None, recipe: str | None) -> dict[Any, tuple[int, float]]:
+        self.flush()
+        query: str = f"SELECT seats.{column}, COUNT(*), AVG(seats.won) FROM seats"
+        conditions: list[str] = []
+        parameters: list[Any] = []
+        if players is not None:
+            conditions.append("games.players = ?")
+            parameters.append(players)
+        if recipe is not None:
+            conditions.append("games.recipe = ?")
+            parameters.append(recipe)
+        if conditions:
+            query += " JOIN games ON games.id = seats.game WHERE " + " AND ".join(conditions)
+
+        rows = self._connection.execute(f"{query} GROUP BY seats.{column} ORDER BY seats.{column}", parameters)
+        return {key: (games, rate) for key, games, rate in rows}
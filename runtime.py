@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from typing import Callable, TextIO
+
+import os
+import selectors
+import sys
+import time
+
+
+class EventLoop:
+    '''Single-threaded runtime for the interactive game.
+
+    The game runs on the thread that owns the loop and only hands control to it while
+    it waits: then the loop waits on stdin with select, runs the frame callbacks once
+    per frame when something notified a change, and returns as soon as a whole line
+    was read. Nothing runs on other threads, so the display is never drawn while the
+    game writes to it and closing needs no sleeps.'''
+    def __init__(self, fps: float = 15.0, stdin: TextIO | None = None) -> None:
+        self._buffer: bytes = b""
+        self._changed: bool = True
+        self._closed: bool = False
+        self._frame_callbacks: list[Callable[[], None]] = []
+        self._frame_rate: float = 1 / fps
+        self._next_frame: float = time.monotonic()
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._stdin: int = (stdin or sys.stdin).fileno()
+
+        self._selector.register(self._stdin, selectors.EVENT_READ)
+
+    def on_frame(self, callback: Callable[[], None]) -> None:
+        '''Runs the callback on every frame with changes, in the order the callbacks were added'''
+        self._frame_callbacks.append(callback)
+
+    def remove_frame(self, callback: Callable[[], None]) -> None:
+        self._frame_callbacks.remove(callback)
+
+    def notify(self) -> None:
+        '''Marks that the game changed, so the next frame draws it'''
+        self._changed = True
+
+    def frame(self, force: bool = False) -> None:
+        '''Runs the frame callbacks now if something changed since the last frame'''
+        self._next_frame = time.monotonic() + self._frame_rate
+        if not self._changed and not force:
+            return
+
+        self._changed = False
+        for callback in list(self._frame_callbacks):
+            callback()
+
+    def read_line(self) -> str:
+        '''Returns the next line typed on stdin without its newline, running frames while waiting.
+
+        Raises EOFError when stdin is closed, like input().'''
+        while b"\n" not in self._buffer:
+            self._wait(None)
+
+        line: bytes
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        return line.decode(errors="replace").rstrip("\r")
+
+    def run_for(self, seconds: float) -> None:
+        '''Runs frames for a while, keeping whatever is typed meanwhile for read_line'''
+        deadline: float = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self._wait(deadline)
+
+    def _wait(self, deadline: float | None) -> None:
+        now: float = time.monotonic()
+        if now >= self._next_frame:
+            self.frame()
+
+        wake: float = self._next_frame if deadline is None else min(deadline, self._next_frame)
+        for _ in self._selector.select(max(0.0, wake - time.monotonic())):
+            data: bytes = os.read(self._stdin, 4096)
+            if not data:
+                if self._buffer:
+                    self._buffer += b"\n"
+                    return
+                raise EOFError("stdin was closed")
+
+            self._buffer += data
+
+    def close(self) -> None:
+        if self._closed:
+            return
+
+        self._closed = True
+        self._frame_callbacks.clear()
+        self._selector.close()
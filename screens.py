@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, TextIO
+if TYPE_CHECKING:
+    from runtime import EventLoop
+
+import abc
+import json
+import os
+import shutil
+import signal
+import sys
+import threading
+
+ERASE: str = "\033[H\033[2J\033[3J"
+HOME: str = "\033[H\033[3J"
+
+
+def encode(rows: list[str], changed: list[int] | None) -> str:
+    '''Returns the ANSI output showing the given rows, every row when changed is None'''
+    if changed is None:
+        return HOME + "\n".join(rows)
+
+    return "".join([f"\033[{number + 1};1H{rows[number]}" for number in changed])
+
+
+class Screen(metaclass=abc.ABCMeta):
+    '''Where a Display shows its grid of characters.
+
+    Realtime screens are terminals: displays without an event loop refresh them from
+    threads on a clock. Other screens are only drawn on when their owner composes a
+    frame, so they can render games as fast as they are played.'''
+    realtime: bool = False
+
+    @abc.abstractmethod
+    def size(self) -> tuple[int, int]:
+        pass
+
+    @abc.abstractmethod
+    def show(self, rows: list[str], changed: list[int] | None) -> None:
+        '''Shows the grid, only the changed rows or every row when changed is None'''
+        pass
+
+    @abc.abstractmethod
+    def read_line(self, location: tuple[int, int], prompt: str, loop: EventLoop | None) -> str:
+        '''Shows the prompt at the location and returns the line typed after it'''
+        pass
+
+    def on_resize(self, callback: Callable[[], None]) -> None:
+        '''Calls back whenever the screen is resized, the size is read again with size()'''
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class TerminalScreen(Screen):
+    '''The terminal on stdout, resized with SIGWINCH'''
+    realtime: bool = True
+
+    def __init__(self, stdout: TextIO | None = None) -> None:
+        self._callbacks: list[Callable[[], None]] = []
+        self._previous_handler: Any = None
+        self._stdout: TextIO = stdout or sys.stdout
+
+    def size(self) -> tuple[int, int]:
+        size: os.terminal_size = shutil.get_terminal_size()
+        return size.columns, size.lines
+
+    def show(self, rows: list[str], changed: list[int] | None) -> None:
+        self._stdout.write(encode(rows, changed))
+        self._stdout.flush()
+
+    def read_line(self, location: tuple[int, int], prompt: str, loop: EventLoop | None) -> str:
+        escape: str = f"\033[{location[1] + 1};{location[0] + 1}H"
+        if loop is not None:
+            self._stdout.write(escape + prompt)
+            self._stdout.flush()
+            return loop.read_line()
+
+        self._stdout.write(escape)
+        return input(prompt)
+
+    def on_resize(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+        # signal handlers can only be set from the main thread, other screens keep their size
+        if self._previous_handler is None and hasattr(signal, "SIGWINCH") \
+                and threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGWINCH, self._on_signal)
+
+    def _on_signal(self, signum: int, frame: Any) -> None:
+        for callback in self._callbacks:
+            callback()
+
+    def clear(self) -> None:
+        self._stdout.write(ERASE)
+        self._stdout.flush()
+
+    def close(self) -> None:
+        self._callbacks.clear()
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGWINCH, self._previous_handler)
+            self._previous_handler = None
+
+
+class VirtualScreen(Screen):
+    '''An in-memory screen, for rendering without a terminal.
+
+    Its lines hold what a terminal of the same size would show. Questions asked on it
+    are answered from a script, one answer per line. Time is counted in frames,
+    every frame shown takes frame_time seconds. When recording, every frame is kept
+    as the ANSI output a terminal would have got, to be saved as an asciicast.'''
+    def __init__(self,
+                 columns: int = 120,
+                 rows: int = 36,
+                 answers: Iterable[str] = (),
+                 record: bool = False,
+                 frame_time: float = 1 / 15) -> None:
+        self._answers: Iterator[str] = iter(answers)
+        self._callbacks: list[Callable[[], None]] = []
+        self._columns: int = columns
+        self._rows: int = rows
+        self._start: tuple[int, int] = (columns, rows)
+
+        self.frame_time: float = frame_time
+        self.frames: int = 0
+        self.lines: list[str] = [" " * columns for _ in range(rows)]
+        self.recording: list[tuple[float, str, str]] | None = [] if record else None
+        self.time: float = 0.0
+
+    def size(self) -> tuple[int, int]:
+        return self._columns, self._rows
+
+    def resize(self, columns: int, rows: int) -> None:
+        '''Resizes the screen like a terminal window, displays on it follow on their next frame'''
+        self._columns, self._rows = columns, rows
+        self.lines = [" " * columns for _ in range(rows)]
+        self._record("r", f"{columns}x{rows}")
+        for callback in self._callbacks:
+            callback()
+
+    def _record(self, kind: str, data: str) -> None:
+        if self.recording is not None:
+            self.recording.append((self.time, kind, data))
+
+    def show(self, rows: list[str], changed: list[int] | None) -> None:
+        numbers: Iterable[int] = range(len(rows)) if changed is None else changed
+        for number in numbers:
+            # a display that didn't follow a resize yet draws as much as still fits
+            if number < self._rows:
+                self.lines[number] = rows[number][:self._columns].ljust(self._columns)
+
+        if self.recording is not None:
+            self._record("o", encode(rows, changed))
+        self.frames += 1
+        self.time += self.frame_time
+
+    def read_line(self, location: tuple[int, int], prompt: str, loop: EventLoop | None) -> str:
+        try:
+            answer: str = next(self._answers)
+        except StopIteration:
+            raise EOFError(f"The script has no answer left for {repr(prompt)}")
+
+        col: int
+        row: int
+        col, row = location
+        if 0 <= row < self._rows:
+            line: str = self.lines[row]
+            typed: str = (prompt + answer)[:max(0, self._columns - col)]
+            self.lines[row] = line[:col] + typed + line[col + len(typed):]
+
+        self._record("o", f"\033[{row + 1};{col + 1}H{prompt}")
+        self._record("i", answer + "\r")
+        self._record("o", answer + "\r\n")
+        return answer
+
+    def on_resize(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def clear(self) -> None:
+        self.lines = [" " * self._columns for _ in range(self._rows)]
+        self._record("o", ERASE)
+
+    def text(self) -> str:
+        '''Returns what the screen shows, one line per row'''
+        return "\n".join(self.lines)
+
+    def asciicast(self, title: str | None = None) -> str:
+        '''Returns the recording as an asciicast (version 2), playable with asciinema'''
+        if self.recording is None:
+            raise ValueError("The screen wasn't recording")
+
+        header: dict[str, Any] = {"version": 2, "width": self._start[0], "height": self._start[1]}
+        if title is not None:
+            header["title"] = title
+
+        return "".join([json.dumps(header) + "\n"] +
+                       [json.dumps([round(time, 6), kind, data]) + "\n" for time, kind, data in self.recording])
+
+    def save_asciicast(self, path: str, title: str | None = None) -> None:
+        with open(path, "w") as file:
+            file.write(self.asciicast(title))
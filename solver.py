@@ -0,0 +1,553 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Callable, Iterator, Mapping, Sequence
+if TYPE_CHECKING:
+    from game import Game
+
+from collections import OrderedDict
+
+import random
+
+EPSILON: float = 1e-9
+# windows wider than this are first probed for a sure win or loss with NARROW ones
+WIDE: float = 0.5
+NARROW: float = 1e-7
+KITTEN: str = "Exploding Kitten"
+UNKNOWN: str = "?"
+DEAD: str = "-"
+ROLES: dict[str, str] = {
+    "?": "unknown",
+    "-": "dead",
+    "Exploding Kitten": "kitten",
+    "Defuse": "defuse",
+    "Nope": "nope",
+    "Skip": "skip",
+    "Attack": "attack",
+    "Shuffle": "shuffle",
+    "Favor": "favor",
+    "See The Future": "future"}
+PRIORITY: list[str] = ["attack", "skip", "favor", "cat", "future", "shuffle", "unknown", "dead", "kitten", "defuse", "nope"]
+
+
+class Solution:
+    '''The result of solving an endgame for the player about to act'''
+    def __init__(self, action: str, win_probability: float, values: dict[str, float]) -> None:
+        self.action: str = action
+        self.values: dict[str, float] = values
+        self.win_probability: float = win_probability
+
+    def __repr__(self) -> str:
+        return f"Solution({self.action!r}, {self.win_probability:.4f})"
+
+
+class EndgameSolver:
+    '''Exact solver for two-player endgames, where both hands are known and so is the deck up to shuffles.
+
+    The deck is a row of slots that hold either a known card or an unknown one drawn
+    from the pool of cards the last shuffle mixed together, so a shuffle leads to a
+    single position instead of one per ordering. Knowledge is shared: a defused kitten
+    is placed in plain sight and See The Future shows the top of the deck to both.
+
+    Positions are evaluated from the point of view of the player to act with a fail-soft
+    alpha-beta search over win probabilities, chance nodes included, and cached in a
+    bounded LRU transposition table of (lower, upper) bounds and the best action, searched
+    first when the position comes back, under incrementally updated Zobrist keys. Most
+    endgames are won or lost outright, so a position searched with a wide window is first
+    probed with null windows for a sure win and a sure loss, which prove either with far
+    fewer nodes, and only a position that is neither is searched for its exact value,
+    within the bounds the probes left in the table. Cards that can no longer be played to
+    any effect are folded into one dead kind. The rules follow cards.py: nopes may be
+    chained by both players, Attack and Skip follow the turns_left bookkeeping of the
+    game, Favor lets the opponent choose the card, a pair of cats steals a uniformly
+    random card and a defused kitten may go back at any depth.'''
+    def __init__(self, capacity: int = 1 << 20, seed: int = 0) -> None:
+        self._capacity: int = capacity
+        self._kinds: dict[str, int] = {}
+        self._order: list[tuple[str, int]] = []
+        self._perishable: list[int] = []
+        self._random: random.Random = random.Random(seed)
+        self._roles: list[str] = []
+        self._table: OrderedDict[int, tuple[float, float, int]] = OrderedDict()
+        self._z_deck: list[list[int]] = []
+        self._z_hand: list[tuple[list[int], list[int], list[int]]] = []
+        self._z_turns: dict[tuple[int, int], int] = {}
+
+        self.hits: int = 0
+        self.nodes: int = 0
+
+        for name in ROLES:
+            self._kind(name)
+
+        self._dead: int = self._kinds[DEAD]
+        self._kitten: int = self._kinds[KITTEN]
+        self._shuffle: int = self._kinds["Shuffle"]
+        self._unknown: int = self._kinds[UNKNOWN]
+
+    def _kind(self, name: str) -> int:
+        if name not in self._kinds:
+            self._kinds[name] = len(self._kinds)
+            self._roles.append(ROLES.get(name, "cat"))
+            self._order.append((name, self._kinds[name]))
+            self._order.sort(key=lambda entry: PRIORITY.index(self._roles[entry[1]]))
+            if self._roles[-1] in ["cat", "future", "shuffle"]:
+                self._perishable.append(self._kinds[name])
+            for keys in self._z_deck:
+                keys.append(self._random.getrandbits(64))
+            self._z_hand.append(([], [], []))
+
+        return self._kinds[name]
+
+    def _deck_key(self, position: int, kind: int) -> int:
+        while len(self._z_deck) <= position:
+            self._z_deck.append([self._random.getrandbits(64) for _ in self._kinds])
+
+        return self._z_deck[position][kind]
+
+    def _hand_key(self, kind: int, count: int, side: int) -> int:
+        '''Returns the key of holding count cards of a kind, side 0 is the player to act, 1 the opponent and 2 the pool'''
+        keys: list[int] = self._z_hand[kind][side]
+        while len(keys) <= count:
+            keys.append(self._random.getrandbits(64) if keys else 0)
+
+        return keys[count]
+
+    def _turn_key(self, mine: int, theirs: int) -> int:
+        key: int | None = self._z_turns.get((mine, theirs))
+        if key is None:
+            key = self._z_turns[(mine, theirs)] = self._random.getrandbits(64)
+
+        return key
+
+    def _hand_keys(self, hand: tuple[int, ...]) -> tuple[int, int]:
+        '''Returns the key of a hand when held by the player to act and by the opponent'''
+        as_mine: int = 0
+        as_theirs: int = 0
+        for kind, count in enumerate(hand):
+            as_mine ^= self._hand_key(kind, count, 0)
+            as_theirs ^= self._hand_key(kind, count, 1)
+
+        return as_mine, as_theirs
+
+    def _deck_keys(self, deck: tuple[int, ...], pool: tuple[int, ...]) -> int:
+        key: int = 0
+        for position, kind in enumerate(deck):
+            key ^= self._deck_key(position, kind)
+        for kind, count in enumerate(pool):
+            key ^= self._hand_key(kind, count, 2)
+
+        return key
+
+    def _change(self, hand: tuple[int, ...], keys: tuple[int, int], kind: int, amount: int) -> tuple[tuple[int, ...], tuple[int, int]]:
+        old: int = hand[kind]
+        new: int = old + amount
+        as_mine, as_theirs, _ = self._z_hand[kind]
+        if new >= len(as_mine) or new >= len(as_theirs):
+            self._hand_key(kind, new, 0)
+            self._hand_key(kind, new, 1)
+
+        return (hand[:kind] + (new,) + hand[kind + 1:],
+                (keys[0] ^ as_mine[old] ^ as_mine[new], keys[1] ^ as_theirs[old] ^ as_theirs[new]))
+
+    def _normalise(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+                   mine: tuple[int, ...], mine_keys: tuple[int, int],
+                   theirs: tuple[int, ...], their_keys: tuple[int, int]) -> tuple:
+        '''Folds cards that can never be played to any effect again into a single dead kind.
+
+        Cats of a kind with fewer than two cards left anywhere can never make a pair,
+        See The Future is dead once the deck is known and no Shuffle is left to hide it
+        again, and both are once the deck is down to its last card. Dead cards still
+        count as cards to give away or steal, but which dead card does not matter, so
+        positions that only differ by them become one. Unknown slots that can only hold
+        one kind are turned into that kind.'''
+        hidden: bool = self._unknown in deck
+        for kind in self._perishable:
+            held: int = mine[kind] + theirs[kind]
+            if not held and not pool[kind] and kind not in deck:
+                continue
+
+            role: str = self._roles[kind]
+            if role == "cat":
+                if held + pool[kind] + deck.count(kind) >= 2:
+                    continue
+            elif len(deck) > 1 and (role == "shuffle" or hidden or mine[self._shuffle] or theirs[self._shuffle]
+                                    or self._shuffle in deck):
+                continue
+
+            dead: int = self._dead
+            if mine[kind]:
+                count: int = mine[kind]
+                mine, mine_keys = self._change(*self._change(mine, mine_keys, kind, -count), dead, count)
+            if theirs[kind]:
+                count = theirs[kind]
+                theirs, their_keys = self._change(*self._change(theirs, their_keys, kind, -count), dead, count)
+            if pool[kind]:
+                count = pool[kind]
+                deck_key ^= (self._hand_key(kind, count, 2) ^ self._hand_key(dead, pool[dead], 2)
+                             ^ self._hand_key(dead, pool[dead] + count, 2))
+                pool = tuple(0 if index == kind else count + left if index == dead else left
+                             for index, left in enumerate(pool))
+            if kind in deck:
+                for position, slot in enumerate(deck):
+                    if slot == kind:
+                        deck_key ^= self._deck_key(position, kind) ^ self._deck_key(position, dead)
+                deck = tuple(dead if slot == kind else slot for slot in deck)
+
+        if hidden:
+            kinds: list[int] = [kind for kind, count in enumerate(pool) if count]
+            if len(kinds) == 1:
+                kind = kinds[0]
+                for position, slot in enumerate(deck):
+                    if slot == self._unknown:
+                        deck_key ^= self._deck_key(position, slot) ^ self._deck_key(position, kind)
+                deck_key ^= self._hand_key(kind, pool[kind], 2)
+                deck = tuple(kind if slot == self._unknown else slot for slot in deck)
+                pool = (0,) * len(pool)
+
+        return deck, pool, deck_key, mine, mine_keys, theirs, their_keys
+
+    def solve(self,
+              deck: Sequence[str],
+              hand: Mapping[str, int],
+              opponent_hand: Mapping[str, int],
+              turns_left: int = 1,
+              opponent_turns: int = 0,
+              shuffled: bool = False,
+              every: bool = False) -> Solution:
+        '''Solves the position for the player to act, the deck is given top card first.
+
+        With shuffled set only the composition of the deck is known, not its order. The
+        values of the solution are every action's win probability with every set, and
+        otherwise only the best action's: the others are only searched far enough to
+        tell they are no better. Positions stay in the table between calls, so solving
+        the positions of one game in turn with the same solver gets faster as it goes.'''
+        if KITTEN not in deck:
+            raise ValueError("An endgame needs a kitten in the deck")
+
+        for name in list(deck) + list(hand) + list(opponent_hand):
+            self._kind(name)
+
+        order: tuple[int, ...] = tuple(self._kinds[name] for name in reversed(deck))
+        pool: tuple[int, ...] = (0,) * len(self._kinds)
+        if shuffled:
+            pool = tuple(order.count(kind) for kind in range(len(self._kinds)))
+            order = (self._unknown,) * len(order)
+
+        mine: tuple[int, ...] = tuple(hand.get(name, 0) for name in self._kinds)
+        theirs: tuple[int, ...] = tuple(opponent_hand.get(name, 0) for name in self._kinds)
+        deck_key, mine_keys, their_keys = self._deck_keys(order, pool), self._hand_keys(mine), self._hand_keys(theirs)
+        order, pool, deck_key, mine, mine_keys, theirs, their_keys = self._normalise(order, pool, deck_key, mine, mine_keys,
+                                                                                     theirs, their_keys)
+        turns: int = max(1, turns_left)
+        key: int = deck_key ^ mine_keys[0] ^ their_keys[1] ^ self._turn_key(turns, opponent_turns)
+        actions: list[tuple[str, Callable[..., float], tuple]] = list(
+            self._actions(order, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, opponent_turns))
+        first: int = self._table[key][2] if key in self._table else 0
+
+        values: dict[str, float] = {}
+        action: str = actions[first][0]
+        for index in [first] + [index for index in range(len(actions)) if index != first]:
+            name, search, position = actions[index]
+            # fail-soft, anything above the best so far is exact
+            value: float = search(*position, 0.0 if every else values.get(action, 0.0), 1.0)
+            if every or value > values.get(action, 0.0) + EPSILON or name == action:
+                values[name] = value
+            if value > values[action] + EPSILON:
+                action, first = name, index
+
+        self._table[key] = (values[action], values[action], first)
+        if len(self._table) > self._capacity:
+            self._table.popitem(last=False)
+
+        return Solution(action, values[action], values)
+
+    def solve_game(self, game: Game) -> Solution:
+        '''Solves a live game with two players left, for the active player'''
+        if game.players_alive() != 2 or not game.active_player:
+            raise ValueError("Endgames need exactly two players left")
+
+        player = game.active_player
+        opponent = game.alive_after(player)[0]
+        return self.solve([card.name for card in game.deck.top_cards(game.deck.size())],
+                          _counts(player), _counts(opponent), player.turns_left, opponent.turns_left)
+
+    def _value(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+               mine: tuple[int, ...], mine_keys: tuple[int, int],
+               theirs: tuple[int, ...], their_keys: tuple[int, int],
+               turns: int, their_turns: int,
+               alpha: float = 0.0, beta: float = 1.0) -> float:
+        '''Returns the probability that the player to act wins, searched fail-soft within (alpha, beta).
+
+        A result at or below alpha is only an upper bound and one at or above beta only
+        a lower bound, the table keeps both bounds so later searches can narrow them, and
+        the action that was best or cut the search off last time, to be searched first.'''
+        deck, pool, deck_key, mine, mine_keys, theirs, their_keys = self._normalise(deck, pool, deck_key, mine, mine_keys,
+                                                                                    theirs, their_keys)
+        key: int = deck_key ^ mine_keys[0] ^ their_keys[1] ^ self._turn_key(turns, their_turns)
+        entry: tuple[float, float, int] | None = self._table.get(key)
+        lower: float = 0.0
+        upper: float = 1.0
+        first: int = 0
+        if entry is not None:
+            self.hits += 1
+            self._table.move_to_end(key)
+            lower, upper, first = entry
+            if lower >= beta - EPSILON or lower == upper:
+                return lower
+            if upper <= alpha + EPSILON:
+                return upper
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+
+        if beta - alpha > WIDE:
+            # most endgames are won or lost outright, which null windows prove with far fewer nodes
+            probe: float = self._value(deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, their_turns,
+                                       beta - NARROW, beta)
+            if probe >= beta - EPSILON:
+                return probe
+            probe = self._value(deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, their_turns,
+                                alpha, alpha + NARROW)
+            if probe <= alpha + EPSILON:
+                return probe
+            lower, upper, first = self._table.get(key, (lower, upper, first))
+            if lower == upper:
+                return lower
+            alpha = max(alpha, lower)
+            beta = min(beta, upper)
+
+        self.nodes += 1
+        actions: list[tuple[str, Callable[..., float], tuple]] = list(
+            self._actions(deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, their_turns))
+        best: float = 0.0
+        for index in [first] + [index for index in range(len(actions)) if index != first]:
+            value: float = actions[index][1](*actions[index][2], max(alpha, best), beta)
+            if value > best:
+                best = value
+                first = index
+                if best >= beta - EPSILON:
+                    break
+
+        if best <= alpha + EPSILON:
+            upper = min(upper, best)
+        elif best >= beta - EPSILON:
+            lower = max(lower, best)
+        else:
+            lower = upper = best
+
+        self._table[key] = (lower, upper, first)
+        if len(self._table) > self._capacity:
+            self._table.popitem(last=False)
+
+        return best
+
+    def _actions(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+                 mine: tuple[int, ...], mine_keys: tuple[int, int],
+                 theirs: tuple[int, ...], their_keys: tuple[int, int],
+                 turns: int, their_turns: int) -> Iterator[tuple[str, Callable[..., float], tuple]]:
+        '''Yields every legal action of the player to act as a search to call with a window.
+
+        Cards that could not change anything are left out, a card in hand is never worth
+        less than no card: See The Future when the top of the deck is already known and
+        Shuffle when nothing in the deck is known.'''
+        if deck:
+            yield "draw", self._draw, (deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, their_turns)
+
+        for name, kind in self._order:
+            if not mine[kind]:
+                continue
+
+            role: str = self._roles[kind]
+            if role in ["unknown", "dead", "kitten", "defuse", "nope"] or mine[kind] < (2 if role == "cat" else 1):
+                continue
+
+            if role in ["favor", "cat"] and not any(theirs):
+                continue
+
+            if role == "future" and self._unknown not in deck[-3:]:
+                continue
+
+            if role == "shuffle" and deck.count(self._unknown) == len(deck):
+                continue
+
+            hand, hand_keys = self._change(mine, mine_keys, kind, -2 if role == "cat" else -1)
+            yield name, self._contest, (deck, pool, deck_key, hand, hand_keys, theirs, their_keys,
+                                        turns, their_turns, role)
+
+    def _end_turn(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+                  mine: tuple[int, ...], mine_keys: tuple[int, int],
+                  theirs: tuple[int, ...], their_keys: tuple[int, int],
+                  turns: int, their_turns: int,
+                  alpha: float, beta: float) -> float:
+        '''Returns the value once one of the turns of the player to act is over'''
+        if turns > 1:
+            return self._value(deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns - 1, their_turns,
+                               alpha, beta)
+
+        return 1 - self._value(deck, pool, deck_key, theirs, their_keys, mine, mine_keys, max(1, their_turns), 0,
+                               1 - beta, 1 - alpha)
+
+    def _draw(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+              mine: tuple[int, ...], mine_keys: tuple[int, int],
+              theirs: tuple[int, ...], their_keys: tuple[int, int],
+              turns: int, their_turns: int,
+              alpha: float, beta: float) -> float:
+        top: int = deck[-1]
+        if top == self._unknown:
+            return self._chance([(probability, self._draw, (revealed, left, key, mine, mine_keys, theirs, their_keys,
+                                                            turns, their_turns))
+                                 for probability, revealed, left, key in self._reveal(deck, pool, deck_key, 1)],
+                                alpha, beta)
+
+        rest: tuple[int, ...] = deck[:-1]
+        rest_key: int = deck_key ^ self._deck_key(len(rest), top)
+        kitten: int = self._kitten
+
+        if top != kitten:
+            hand, hand_keys = self._change(mine, mine_keys, top, 1)
+            return self._end_turn(rest, pool, rest_key, hand, hand_keys, theirs, their_keys, turns, their_turns,
+                                  alpha, beta)
+
+        defuse: int = self._kinds["Defuse"]
+        if not mine[defuse]:
+            return 0.0
+
+        hand, hand_keys = self._change(mine, mine_keys, defuse, -1)
+        best: float = 0.0
+        placed_key: int = rest_key ^ self._deck_key(len(rest), kitten)
+        for index in range(len(rest), -1, -1):
+            if index < len(rest):
+                moved: int = rest[index]
+                placed_key ^= (self._deck_key(index, moved) ^ self._deck_key(index + 1, moved) ^
+                               self._deck_key(index + 1, kitten) ^ self._deck_key(index, kitten))
+                if moved == kitten:
+                    continue
+
+            best = max(best, self._end_turn(rest[:index] + (kitten,) + rest[index:], pool, placed_key, hand, hand_keys,
+                                            theirs, their_keys, turns, their_turns, max(alpha, best), beta))
+            if best >= beta - EPSILON:
+                break
+
+        return best
+
+    def _contest(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+                 mine: tuple[int, ...], mine_keys: tuple[int, int],
+                 theirs: tuple[int, ...], their_keys: tuple[int, int],
+                 turns: int, their_turns: int, role: str,
+                 alpha: float, beta: float) -> float:
+        '''Resolves a played card, with the opponent and the player taking turns to nope'''
+        allowed: float = self._effect(deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, their_turns,
+                                      role, alpha, beta)
+        nope: int = self._kinds["Nope"]
+        if not theirs[nope] or allowed <= alpha + EPSILON:
+            return allowed
+
+        noped, noped_keys = self._change(theirs, their_keys, nope, -1)
+        blocked: float = self._value(deck, pool, deck_key, mine, mine_keys, noped, noped_keys, turns, their_turns,
+                                     alpha, allowed)
+        if mine[nope] and blocked < allowed - EPSILON:
+            hand, hand_keys = self._change(mine, mine_keys, nope, -1)
+            blocked = max(blocked, self._contest(deck, pool, deck_key, hand, hand_keys, noped, noped_keys,
+                                                 turns, their_turns, role, max(alpha, blocked), allowed))
+
+        return min(allowed, blocked)
+
+    def _effect(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+                mine: tuple[int, ...], mine_keys: tuple[int, int],
+                theirs: tuple[int, ...], their_keys: tuple[int, int],
+                turns: int, their_turns: int, role: str,
+                alpha: float, beta: float) -> float:
+        '''Returns the value after a card that was not noped took effect'''
+        if role == "skip":
+            return self._end_turn(deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, their_turns,
+                                  alpha, beta)
+
+        if role == "attack":
+            return 1 - self._value(deck, pool, deck_key, theirs, their_keys, mine, mine_keys,
+                                   2 if turns == 1 else turns + 2, 0, 1 - beta, 1 - alpha)
+
+        if role == "shuffle":
+            mixed: tuple[int, ...] = tuple(count + deck.count(kind) for kind, count in enumerate(pool))
+            mixed = mixed[:self._unknown] + (0,) + mixed[self._unknown + 1:]
+            hidden: tuple[int, ...] = (self._unknown,) * len(deck)
+            return self._value(hidden, mixed, self._deck_keys(hidden, mixed), mine, mine_keys, theirs, their_keys,
+                               turns, their_turns, alpha, beta)
+
+        if role == "future":
+            return self._chance([(probability, self._value, (revealed, left, key, mine, mine_keys, theirs, their_keys,
+                                                             turns, their_turns))
+                                 for probability, revealed, left, key in self._reveal(deck, pool, deck_key, 3)],
+                                alpha, beta)
+
+        if not any(theirs):
+            return self._value(deck, pool, deck_key, mine, mine_keys, theirs, their_keys, turns, their_turns,
+                               alpha, beta)
+
+        if role == "favor":
+            worst: float = 1.0
+            for kind, count in enumerate(theirs):
+                if count:
+                    worst = min(worst, self._value(deck, pool, deck_key, *self._change(mine, mine_keys, kind, 1),
+                                                   *self._change(theirs, their_keys, kind, -1), turns, their_turns,
+                                                   alpha, min(beta, worst)))
+                    if worst <= alpha + EPSILON:
+                        break
+
+            return worst
+
+        total: int = sum(theirs)
+        return self._chance([(count / total, self._value, (deck, pool, deck_key,
+                                                           *self._change(mine, mine_keys, kind, 1),
+                                                           *self._change(theirs, their_keys, kind, -1),
+                                                           turns, their_turns))
+                             for kind, count in enumerate(theirs) if count], alpha, beta)
+
+    def _reveal(self, deck: tuple[int, ...], pool: tuple[int, ...], deck_key: int,
+                depth: int) -> list[tuple[float, tuple[int, ...], tuple[int, ...], int]]:
+        '''Returns every way the unknown slots among the top cards can turn out, with its probability'''
+        outcomes: list[tuple[float, tuple[int, ...], tuple[int, ...], int]] = [(1.0, deck, pool, deck_key)]
+        for position in range(len(deck) - 1, max(-1, len(deck) - 1 - depth), -1):
+            if deck[position] != self._unknown:
+                continue
+
+            revealed: list[tuple[float, tuple[int, ...], tuple[int, ...], int]] = []
+            for probability, cards, left, key in outcomes:
+                total: int = sum(left)
+                for kind, count in enumerate(left):
+                    if count:
+                        revealed.append((probability * count / total,
+                                         cards[:position] + (kind,) + cards[position + 1:],
+                                         left[:kind] + (count - 1,) + left[kind + 1:],
+                                         key ^ self._deck_key(position, self._unknown) ^ self._deck_key(position, kind) ^
+                                         self._hand_key(kind, count, 2) ^ self._hand_key(kind, count - 1, 2)))
+            outcomes = revealed
+
+        return outcomes
+
+    def _chance(self, outcomes: list[tuple[float, Callable[..., float], tuple]], alpha: float, beta: float) -> float:
+        '''Averages over random outcomes, stopping once the average is sure to fall outside (alpha, beta)'''
+        expected: float = 0.0
+        remaining: float = 1.0
+        for probability, search, position in outcomes:
+            remaining -= probability
+            low: float = (alpha - expected - remaining) / probability
+            high: float = (beta - expected) / probability
+            if low >= 1.0 - EPSILON:
+                return alpha
+            if high <= EPSILON:
+                return beta
+
+            value: float = search(*position, max(0.0, low), min(1.0, high))
+            expected += probability * value
+            if low > EPSILON and value <= low + EPSILON:
+                return alpha
+            if high < 1.0 - EPSILON and value >= high - EPSILON:
+                return beta
+
+        return expected
+
+
+def _counts(player) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for card in player.card_options(playable=False):
+        counts[card.name] = player.card_count(card.name)
+
+    return counts
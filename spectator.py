@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+if TYPE_CHECKING:
+    from game import Game
+    from player import Player
+
+from queue import SimpleQueue
+from threading import Lock, Thread
+
+import json
+import selectors
+import socket
+
+
+def encode(message: dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class Spectator:
+    '''An in-process spectator, receiving the encoded snapshot and deltas on a queue'''
+    def __init__(self) -> None:
+        self.messages: SimpleQueue[bytes] = SimpleQueue()
+
+    def send(self, data: bytes) -> None:
+        self.messages.put(data)
+
+
+class SpectatorView:
+    '''Rebuilds the public state of a game from a spectator's messages'''
+    def __init__(self) -> None:
+        self.active: str | None = None
+        self.deck: int = 0
+        self.discard: dict[str, int] = {}
+        self.players: list[list[Any]] = []
+        self.sequence: int = -1
+
+    def apply(self, data: bytes) -> None:
+        for line in data.splitlines():
+            message: dict[str, Any] = json.loads(line)
+            if message["type"] == "snapshot":
+                self.__init__()
+            elif message["seq"] != self.sequence + 1:
+                raise ValueError(f"Missed a delta, expected {self.sequence + 1} but got {message['seq']}")
+
+            self.sequence = message["seq"]
+            self.active = message.get("active", self.active)
+            self.deck = message.get("deck", self.deck)
+            for name, count in message.get("discard", {}).items():
+                self.discard[name] = count
+
+            for seat, player in message.get("players", {}).items():
+                seat = int(seat)
+                while len(self.players) <= seat:
+                    self.players.append([])
+                self.players[seat] = player
+
+
+class SpectatorHub:
+    '''Broadcasts the public state of a game to read-only spectators.
+
+    Spectators get a snapshot when they join and a delta after every change. The hub
+    only looks at what changed since the last broadcast (players whose hand or
+    life changed, cards added to the discard pile), encodes the delta once and hands
+    the same bytes to every spectator. Hands and the deck order are never sent,
+    only what the game shows everyone: the active player, the deck size, the
+    discard pile and each player's hand size and whether they are alive.'''
+    def __init__(self, game: Game) -> None:
+        self._active: str | None = None
+        self._deck: int = 0
+        self._dirty: set[Player] = set(game.players)
+        self._discard: dict[str, int] = {}
+        self._discarded: int = 0
+        self._game: Game = game
+        self._lock: Lock = Lock()
+        self._players: dict[int, list[Any]] = {}
+        self._sequence: int = 0
+        self._spectators: list[Any] = []
+
+        game.spectators = self
+        self.publish()
+
+    def touch(self, player: Player) -> None:
+        '''Marks a player whose public state may have changed'''
+        self._dirty.add(player)
+
+    def subscribe(self, spectator: Any | None = None) -> Any:
+        '''Adds a spectator, anything with a send(bytes) method, and sends it a snapshot'''
+        spectator = spectator or Spectator()
+        with self._lock:
+            spectator.send(encode({"type": "snapshot",
+                                   "seq": self._sequence,
+                                   "active": self._active,
+                                   "deck": self._deck,
+                                   "discard": self._discard,
+                                   "players": self._players}))
+            self._spectators.append(spectator)
+
+        return spectator
+
+    def unsubscribe(self, spectator: Any) -> None:
+        with self._lock:
+            self._spectators.remove(spectator)
+
+    def publish(self) -> None:
+        '''Sends the changes since the last broadcast to every spectator'''
+        game: Game = self._game
+        delta: dict[str, Any] = {}
+
+        active: str | None = game.active_player.name if game.active_player else None
+        if active != self._active:
+            self._active = delta["active"] = active
+
+        if game.deck.size() != self._deck:
+            self._deck = delta["deck"] = game.deck.size()
+
+        discarded: int = game.discard_pile.size()
+        if discarded != self._discarded:
+            discard: dict[str, int] = {}
+            if discarded > self._discarded:
+                # the discard pile only grows at the top
+                for card in game.discard_pile.top_cards(discarded - self._discarded):
+                    discard[card.name] = discard.get(card.name, self._discard.get(card.name, 0)) + 1
+            else:
+                # an undo took cards back, recount and clear the kinds that are gone
+                discard = {name: 0 for name in self._discard}
+                discard.update(game.discard_pile.card_status())
+
+            self._discard.update(discard)
+            self._discarded = discarded
+            delta["discard"] = discard
+
+        if self._dirty:
+            players: dict[int, list[Any]] = {}
+            for player in self._dirty:
+                seat: int = game.seat_of(player)
+                state: list[Any] = [player.name, player.is_alive, player.hand_size()]
+                if self._players.get(seat) != state:
+                    self._players[seat] = players[seat] = state
+            self._dirty.clear()
+
+            if players:
+                delta["players"] = players
+
+        if not delta:
+            return
+
+        with self._lock:
+            self._sequence += 1
+            delta["type"] = "delta"
+            delta["seq"] = self._sequence
+            data: bytes = encode(delta)
+            for spectator in self._spectators:
+                spectator.send(data)
+
+
+class SpectatorServer:
+    '''Serves a hub to spectators connecting over TCP, as newline-delimited JSON.
+
+    A single thread multiplexes every connection, messages queue up per connection
+    and spectators that stop reading are dropped once they fall max_backlog bytes behind.'''
+    def __init__(self, hub: SpectatorHub, host: str = "127.0.0.1", port: int = 0, max_backlog: int = 1 << 20) -> None:
+        self._connections: dict[socket.socket, _Connection] = {}
+        self._hub: SpectatorHub = hub
+        self._listener: socket.socket = socket.create_server((host, port))
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._thread: Thread = Thread(target=self._serve, daemon=True)
+        self._wake_reader: socket.socket
+        self._wake_writer: socket.socket
+        self._wake_reader, self._wake_writer = socket.socketpair()
+
+        self.address: tuple[str, int] = self._listener.getsockname()[:2]
+        self.max_backlog: int = max_backlog
+        self.running: bool = True
+
+        self._listener.setblocking(False)
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        self._thread.start()
+
+    def close(self) -> None:
+        self.running = False
+        self.wake()
+        self._thread.join()
+        # closed only now, the thread may see running turn false before close wakes it
+        self._wake_writer.close()
+
+    def wake(self) -> None:
+        '''Gets the server thread to look for queued messages'''
+        try:
+            self._wake_writer.send(b"\0")
+        except OSError:
+            # the thread is awake already, or the server closed while the game still published
+            pass
+
+    def _serve(self) -> None:
+        while self.running:
+            for key, events in self._selector.select():
+                if key.fileobj is self._listener:
+                    self._accept()
+                elif key.fileobj is self._wake_reader:
+                    try:
+                        while self._wake_reader.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif events & selectors.EVENT_READ:
+                    self._read(key.fileobj) # type: ignore[arg-type]
+
+            for connection in list(self._connections.values()):
+                connection.flush()
+
+        for client in list(self._connections):
+            self._drop(client)
+        self._selector.close()
+        self._listener.close()
+        self._wake_reader.close()
+
+    def _accept(self) -> None:
+        try:
+            client, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+
+        client.setblocking(False)
+        connection: _Connection = _Connection(self, client)
+        self._connections[client] = connection
+        self._selector.register(client, selectors.EVENT_READ)
+        self._hub.subscribe(connection)
+
+    def _read(self, client: socket.socket) -> None:
+        '''Discards whatever a spectator types, they only watch, and drops it once it hung up'''
+        data: bytes
+        try:
+            data = client.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+
+        if not data:
+            self._drop(client)
+
+    def _drop(self, client: socket.socket) -> None:
+        connection: _Connection | None = self._connections.pop(client, None)
+        if connection is None:
+            return
+
+        self._hub.unsubscribe(connection)
+        self._selector.unregister(client)
+        client.close()
+
+    def _watch_writes(self, client: socket.socket, watch: bool) -> None:
+        self._selector.modify(client, selectors.EVENT_READ | (selectors.EVENT_WRITE if watch else 0))
+
+
+class _Connection:
+    '''A TCP spectator, the hub adds to its buffer and the server thread writes it out'''
+    def __init__(self, server: SpectatorServer, client: socket.socket) -> None:
+        self._buffer: bytearray = bytearray()
+        self._client: socket.socket = client
+        self._lock: Lock = Lock()
+        self._server: SpectatorServer = server
+        self._writing: bool = False
+
+    def send(self, data: bytes) -> None:
+        with self._lock:
+            self._buffer += data
+        self._server.wake()
+
+    def flush(self) -> None:
+        with self._lock:
+            drop: bool = self._write()
+        # dropping unsubscribes from the hub, whose lock publish holds while it sends to this
+        # connection, so it may only happen once this connection's lock is released
+        if drop:
+            self._server._drop(self._client)
+
+    def _write(self) -> bool:
+        '''Sends what the socket takes, returns whether the spectator has to be dropped'''
+        if not self._buffer:
+            return False
+
+        if len(self._buffer) > self._server.max_backlog:
+            return True
+
+        try:
+            sent: int = self._client.send(self._buffer)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            return True
+
+        del self._buffer[:sent]
+        if bool(self._buffer) != self._writing:
+            self._writing = bool(self._buffer)
+            self._server._watch_writes(self._client, self._writing)
+        return False
@@ -1,105 +1,343 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING, Any, Callable
+if TYPE_CHECKING:
+    from runtime import EventLoop
+    from screens import Screen
+
 from display import Display
-from threading import Thread
+from threading import Lock, Thread
 
+import bisect
 import time
 
 
 class Textbox:
+    '''A block of text drawn on a TextDisplay.
+
+    Changing the text, visibility, location, size or alignment touches the textbox on
+    the display it was added to, which then redraws only the area the textbox covered
+    and the area it covers now. The text is wrapped again only after it changed.'''
     def __init__(self,
                  text: str = "",
                  location: tuple[int, int] = (0, 0),
                  hidden: bool = False,
                  size: tuple[int, int] = (1, 1),
                  alignment: str = "tl",
-                 priority: int = 0) -> None:
+                 priority: int = 0,
+                 renderer: Callable[[Any], str] | None = None) -> None:
 
         self._alignment: str = alignment
+        self._bounds: tuple[int, int, int, int] | None = None
+        self._display: TextDisplay | None = None
         self._hidden: bool = hidden
+        self._lines: list[str] = []
         self._location: tuple[int, int] = location
+        self._pending: list[Any] = []
         self._priority: int = priority
+        self._renderer: Callable[[Any], str] | None = renderer
+        self._rewrap: bool = True
         self._text: str = text
 
         self._width: int
         self._height: int
         self._width, self._height = size
 
+        if alignment[0] not in "tmb" or alignment[1] not in "lcr" or len(alignment) != 2:
+            raise ValueError(f"Alignment type not supported: {repr(alignment)}")
+
+    def _touch(self, rewrap: bool = False) -> None:
+        if rewrap:
+            self._rewrap = True
+        if self._display is not None:
+            self._display.touch(self)
+
     def update_visibility(self, visiblilty: bool) -> None:
+        if self._hidden == (not visiblilty):
+            return
+
         self._hidden = not visiblilty
+        self._touch()
 
     def update_text(self, text: str) -> None:
+        if text == self._text and not self._pending:
+            return
+
+        self._pending = []
         self._text = text
+        self._touch(True)
 
     def append_text(self, text: str) -> None:
+        self._flush()
         self._text += text
+        self._touch(True)
+
+    def append_event(self, event: Any) -> None:
+        '''Appends an event that the renderer turns into text once the textbox is shown'''
+        self._pending.append(event)
+        self._touch(True)
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+
+        assert self._renderer is not None
+        pending: list[Any]
+        pending, self._pending = self._pending, []
+        self._text += "".join(map(self._renderer, pending))
 
     def delete_line(self, lines: int = 1) -> None:
+        self._flush()
         self._text = "".join(self._text.splitlines(True)[:-lines])
+        self._touch(True)
 
     def update_location(self, location: tuple[int, int]) -> None:
+        if location == self._location:
+            return
+
         self._location = location
+        self._touch()
 
     def move(self, amount: tuple[int, int]) -> None:
-        self._location = (self._location[0] + amount[0],
-                          self._location[1] + amount[1])
+        self.update_location((self._location[0] + amount[0],
+                              self._location[1] + amount[1]))
 
     def resize(self, size: tuple[int, int]) -> None:
+        if size == (self._width, self._height):
+            return
+
         self._width, self._height = size
+        self._touch(True)
 
     def realign(self, alignment: str) -> None:
+        if alignment[0] not in "tmb" or alignment[1] not in "lcr" or len(alignment) != 2:
+            raise ValueError(f"Alignment type not supported: {repr(alignment)}")
+        if alignment == self._alignment:
+            return
+
         self._alignment = alignment
+        self._touch()
+
+    def _wrap(self) -> list[str]:
+        '''Returns the last lines of the text that fit, wrapped at the width of the textbox'''
+        self._flush()
+        width: int = max(1, self._width)
+        lines: list[str] = []
+        paragraphs: list[str] = self._text.split("\n")
+        # only the paragraphs at the end are shown, the ones ended by a newline are padded
+        for number in range(len(paragraphs) - 1, -1, -1):
+            paragraph: str = paragraphs[number]
+            wrapped: list[str] = [paragraph[start:start + width]
+                                  for start in range(0, max(1, len(paragraph)), width)]
+            if number < len(paragraphs) - 1:
+                wrapped[-1] = wrapped[-1].ljust(width)
+            lines[:0] = wrapped
+            if len(lines) >= self._height:
+                break
 
-    def display_text(self, display: Display) -> None:
+        return lines[-self._height:] if self._height > 0 else []
+
+    def place(self) -> tuple[int, int, int, int] | None:
+        '''Wraps the text if it changed, returns the area the textbox covers as (col, row, width, height), None when hidden'''
         if self._hidden:
-            return
+            return None
 
-        pattern: list[str] = [""]
-        for char in self._text:
-            if char == "\n":
-                pattern[-1] += " " * (self._width - len(pattern[-1]))
-                pattern.append("")
-                continue
+        if self._rewrap:
+            # cleared first, so that text changed while wrapping gets wrapped again
+            self._rewrap = False
+            self._lines = self._wrap()
+
+        width: int = max(map(len, self._lines), default=0)
+        height: int = len(self._lines)
+        col: int
+        row: int
+        col, row = self._location
+
+        if self._alignment[0] == "m":
+            row -= height // 2
+        elif self._alignment[0] == "b":
+            row -= height
 
-            if len(pattern[-1]) == self._width:
-                pattern.append("")
+        if self._alignment[1] == "c":
+            col -= width // 2
+        elif self._alignment[1] == "r":
+            col -= width
 
-            pattern[-1] += char
+        return col, row, width, height
 
-        pattern = pattern[-self._height:]
+    def display_text(self, display: Display) -> None:
+        '''Draws the whole textbox, over whatever is under it'''
+        bounds: tuple[int, int, int, int] | None = self.place()
+        if bounds is None:
+            return
 
-        display.draw_pattern("\n".join(pattern), self._location,
-                             self._alignment)
+        for row, line in enumerate(self._lines, bounds[1]):
+            display.write_string_horizontal(line, (bounds[0], row))
 
 
 class TextDisplay:
+    '''Composes textboxes onto a Display, redrawing only what changed.
 
+    Textboxes are kept sorted by priority, later ones drawn over earlier ones. Every
+    change to a textbox touches it, and the next frame takes the area the textbox
+    covered before and the area it covers now as damage. Each damaged area is cleared
+    and every textbox overlapping it is drawn again clipped to it, from the lowest
+    priority up, so a frame costs as much as the textboxes that changed. A resize or
+    the terminal getting big enough again damages the whole screen.
+
+    On a terminal without an event loop a thread composes the frames, the event loop
+    does otherwise. Displays on other screens only show a frame when frame() is called.'''
     def __init__(self,
-                 width: int = 80,
-                 height: int = 24,
-                 fps: float = 10.0) -> None:
-        self._display: Display = Display(width, height, fps)
+                 min_size: tuple[int, int] = (80, 24),
+                 fps: float = 10.0,
+                 loop: EventLoop | None = None,
+                 screen: Screen | None = None) -> None:
+        self._damage: set[tuple[int, int, int, int]] = set()
+        self._damage_all: bool = True
+        self._display: Display = Display(min_size, fps, loop, screen)
+        self._fits: bool = self._display.fits()
+        self._lock: Lock = Lock()
+        self._loop: EventLoop | None = loop
+        self._min_size: tuple[int, int] = min_size
+        self._order: list[Textbox] = []
+        self._resize_callbacks: list[Callable[[int, int], None]] = []
         self._textboxes: dict[str, Textbox] = {}
+        self._touched: set[Textbox] = set()
         self._update_rate: float = 1 / fps
         self._active: bool = True
         self._update_thread: Thread = Thread(target=self._update_display)
-        self._update_thread.start()
+
+        if loop is not None:
+            loop.on_frame(self.frame)
+        elif self._display._screen.realtime:
+            self._update_thread.start()
 
     def _update_display(self) -> None:
         while self._active:
-            self._display.clear()
-            textboxes: list[Textbox] = list(self._textboxes.values())
-            textboxes.sort(key=lambda box: box._priority)
-            for textbox in textboxes:
-                textbox.display_text(self._display)
+            self._compose()
             time.sleep(self._update_rate)
 
+    def on_resize(self, callback: Callable[[int, int], None]) -> None:
+        '''Calls back with the terminal size now and whenever the terminal is resized, to lay the textboxes out'''
+        self._resize_callbacks.append(callback)
+        callback(*self._display.size())
+
+    def size(self) -> tuple[int, int]:
+        return self._display.size()
+
+    def touch(self, textbox: Textbox) -> None:
+        '''Marks a textbox that changed, so the next frame redraws where it was and where it is'''
+        with self._lock:
+            self._touched.add(textbox)
+
+    def _compose(self) -> None:
+        if self._display.take_resize():
+            for callback in self._resize_callbacks:
+                callback(*self._display.size())
+            self._damage_all = True
+
+        fits: bool = self._display.fits()
+        if fits != self._fits:
+            self._fits = fits
+            self._damage_all = True
+
+        touched: set[Textbox]
+        damage: set[tuple[int, int, int, int]]
+        with self._lock:
+            touched, self._touched = self._touched, set()
+            damage, self._damage = self._damage, set()
+        damage_all: bool = self._damage_all
+        self._damage_all = False
+
+        columns, rows = self._display.size()
+        if not fits:
+            if damage_all:
+                self._display.clear()
+                self._display.write_string_horizontal(
+                    f"Terminal too small: {columns}x{rows}, needs {self._min_size[0]}x{self._min_size[1]}",
+                    (columns // 2, rows // 2), "c")
+            # everything is placed again once the terminal fits
+            return
+
+        if damage_all:
+            for textbox in self._order:
+                textbox._bounds = textbox.place()
+            self._redraw((0, 0, columns, rows))
+            return
+
+        for textbox in touched:
+            if textbox._display is not self:
+                continue
+
+            bounds: tuple[int, int, int, int] | None = textbox.place()
+            if textbox._bounds is not None:
+                damage.add(textbox._bounds)
+            if bounds is not None:
+                damage.add(bounds)
+            textbox._bounds = bounds
+
+        for area in damage:
+            self._redraw(area)
+
+    def _redraw(self, area: tuple[int, int, int, int]) -> None:
+        '''Clears an area of the screen, (col, row, width, height), and draws the textboxes over it in order'''
+        columns, rows = self._display.size()
+        left: int = max(0, area[0])
+        top: int = max(0, area[1])
+        right: int = min(columns, area[0] + area[2])
+        bottom: int = min(rows, area[1] + area[3])
+        if left >= right or top >= bottom:
+            return
+
+        blank: str = " " * (right - left)
+        for row in range(top, bottom):
+            self._display.blit(blank, (left, row))
+
+        for textbox in self._order:
+            bounds: tuple[int, int, int, int] | None = textbox._bounds
+            if bounds is None:
+                continue
+
+            start: int = max(left, bounds[0])
+            end: int = min(right, bounds[0] + bounds[2])
+            if start >= end:
+                continue
+
+            lines: list[str] = textbox._lines
+            for row in range(max(top, bounds[1]), min(bottom, bounds[1] + bounds[3])):
+                segment: str = lines[row - bounds[1]][start - bounds[0]:end - bounds[0]]
+                if segment:
+                    self._display.blit(segment, (start, row))
+
+    def frame(self) -> None:
+        '''Composes the textboxes that changed and shows the rows that changed'''
+        self._compose()
+        self._display.render()
+
+    def check(self) -> None:
+        '''Raises an AssertionError unless the grid shows the textboxes exactly as drawing them all from scratch would'''
+        if not self._fits:
+            return
+
+        columns, rows = self._display.size()
+        grid: list[list[str]] = [[" "] * columns for _ in range(rows)]
+        for textbox in self._order:
+            bounds: tuple[int, int, int, int] | None = textbox._bounds
+            if bounds is None:
+                continue
+
+            for row, line in enumerate(textbox._lines, bounds[1]):
+                for col, char in enumerate(line, bounds[0]):
+                    if 0 <= row < rows and 0 <= col < columns and char != "\x00":
+                        grid[row][col] = char
+
+        for row, (line, expected) in enumerate(zip(self._display._grid, grid)):
+            if line != "".join(expected):
+                raise AssertionError(f"Row {row} shows {repr(line.rstrip())}, "
+                                     f"the textboxes draw {repr(''.join(expected).rstrip())}")
+
     def force_display_update(self) -> None:
-        self._display.clear()
-        textboxes: list[Textbox] = list(self._textboxes.values())
-        textboxes.sort(key=lambda box: box._priority)
-        for textbox in textboxes:
-            textbox.display_text(self._display)
+        self._compose()
         self._display.force_display_update()
 
     def add_textbox(self, name: str, textbox: Textbox) -> None:
@@ -107,12 +345,25 @@ class TextDisplay:
             raise ValueError(f"{repr(name)} already taken as a textbox name.")
 
         self._textboxes[name] = textbox
+        # replaced rather than changed in place, the display thread may be going through it
+        order: list[Textbox] = self._order.copy()
+        bisect.insort_right(order, textbox, key=lambda box: box._priority)
+        self._order = order
+        textbox._bounds = None
+        textbox._display = self
+        self.touch(textbox)
 
     def delete_textbox(self, name: str) -> None:
         if name not in self._textboxes:
             raise ValueError(f"{repr(name)} is not a textbox name.")
 
-        del self._textboxes[name]
+        textbox: Textbox = self._textboxes.pop(name)
+        self._order = [box for box in self._order if box is not textbox]
+        textbox._display = None
+        if textbox._bounds is not None:
+            with self._lock:
+                self._damage.add(textbox._bounds)
+            textbox._bounds = None
 
     def get_textbox(self, name: str) -> Textbox:
         return self._textboxes[name]
@@ -137,5 +388,8 @@ class TextDisplay:
 
     def close(self) -> None:
         self._active = False
-        self._update_thread.join()
+        if self._loop is not None:
+            self._loop.remove_frame(self.frame)
+        if self._update_thread.is_alive():
+            self._update_thread.join()
         self._display.close()
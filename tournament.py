@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+from bots import STRATEGIES
+from collections import defaultdict
+from game import Game
+from itertools import combinations_with_replacement
+from multiprocessing import Pool
+from recipes import DEFAULT_RECIPES, CardPool, load_recipes
+from results import GameRecord, ResultStore, game_record
+
+import argparse
+import math
+import os
+import time
+
+ELO_SCALE: float = 400 / math.log(10)
+
+# cards of finished matches, reused by the next matches a process plays
+_CARDS: CardPool = CardPool()
+
+
+def schedule(strategies: list[str], sizes: list[int]) -> list[tuple[str, ...]]:
+    '''Returns one round of seat-rotated lineups, every mixed table of every size'''
+    lineups: list[tuple[str, ...]] = []
+    for size in sizes:
+        for table in combinations_with_replacement(strategies, size):
+            if len(set(table)) < 2:
+                continue
+
+            for shift in range(size):
+                lineups.append(table[shift:] + table[:shift])
+
+    return lineups
+
+
+def play_match(seed: int,
+               recipe: str,
+               recipes: str,
+               lineup: tuple[str, ...],
+               record: bool = False) -> tuple[int | None, GameRecord | None]:
+    '''Plays one headless game and returns the winning seat, and the game's result rows if asked for'''
+    game: Game = Game(load_recipes(recipes)[recipe], headless=True, seed=seed, pool=_CARDS)
+    for seat, strategy in enumerate(lineup):
+        game.add_player(f"{strategy}-{seat}", STRATEGIES[strategy]())
+
+    winner = game.play()
+    return game.seat_of(winner) if winner else None, game_record(game, winner) if record else None
+
+
+def _play_chunk(chunk: list[tuple[int, str, str, tuple[str, ...], bool]]) -> list[tuple[tuple[str, ...], int | None, GameRecord | None]]:
+    return [(match[3], *play_match(*match)) for match in chunk]
+
+
+def rate(pair_wins: dict[tuple[str, str], int], strategies: list[str]) -> dict[str, tuple[float, float]]:
+    '''Fits Bradley-Terry strengths to pairwise wins and returns (Elo, 95% half-width) per strategy.
+
+    Every table result counts as the winner beating each other seat, half a win
+    each way is added to every pairing so that unbeaten strategies stay finite.'''
+    games: dict[tuple[str, str], float] = defaultdict(float)
+    wins: dict[str, float] = defaultdict(float)
+    for (winner, loser), amount in pair_wins.items():
+        games[(winner, loser)] += amount
+        games[(loser, winner)] += amount
+        wins[winner] += amount
+
+    for first in strategies:
+        for second in strategies:
+            if first != second and games[(first, second)]:
+                games[(first, second)] += 1
+                wins[first] += 0.5
+
+    strength: dict[str, float] = {strategy: 1.0 for strategy in strategies}
+    for _ in range(1000):
+        updated: dict[str, float] = {}
+        for first in strategies:
+            denominator: float = sum(
+                games[(first, second)] / (strength[first] + strength[second])
+                for second in strategies if second != first)
+            updated[first] = wins[first] / denominator if denominator else strength[first]
+
+        scale: float = math.exp(sum(math.log(value) for value in updated.values()) / len(updated))
+        change: float = max(abs(math.log(updated[key] / scale / strength[key])) for key in strategies)
+        strength = {key: value / scale for key, value in updated.items()}
+        if change < 1e-10:
+            break
+
+    ratings: dict[str, tuple[float, float]] = {}
+    for first in strategies:
+        information: float = sum(
+            games[(first, second)] * strength[first] * strength[second] / (strength[first] + strength[second]) ** 2
+            for second in strategies if second != first)
+        error: float = 1 / math.sqrt(information) if information else math.inf
+        ratings[first] = (ELO_SCALE * math.log(strength[first]), 1.96 * ELO_SCALE * error)
+
+    return ratings
+
+
+def settled(ratings: dict[str, tuple[float, float]]) -> bool:
+    '''Returns if the confidence intervals of neighbouring ranks no longer overlap'''
+    ranked: list[tuple[float, float]] = sorted(ratings.values(), reverse=True)
+    return all(higher[0] - higher[1] > lower[0] + lower[1] for higher, lower in zip(ranked, ranked[1:]))
+
+
+def run(strategies: list[str],
+        sizes: list[int],
+        recipe: str = "base",
+        recipes: str = DEFAULT_RECIPES,
+        max_games: int = 100000,
+        min_games: int = 1000,
+        workers: int = 1,
+        chunk: int = 64,
+        seed: int = 0,
+        database: str | None = None) -> dict:
+    '''Plays rounds of the schedule until the rankings settle or max_games is reached.
+
+    With a database every game is stored in it, the workers send the rows back and
+    only this process writes.'''
+    lineups: list[tuple[str, ...]] = schedule(strategies, sizes)
+    if not lineups:
+        raise ValueError("The schedule is empty, at least two strategies are needed")
+
+    pair_wins: dict[tuple[str, str], int] = defaultdict(int)
+    seats: dict[str, list[int]] = {strategy: [0, 0] for strategy in strategies}
+    played: int = 0
+    ratings: dict[str, tuple[float, float]] = {}
+    pool = Pool(workers) if workers > 1 else None
+    store: ResultStore | None = ResultStore(database) if database else None
+
+    try:
+        while played < max_games:
+            matches = [(seed + played + index, recipe, recipes, lineup, store is not None)
+                       for index, lineup in enumerate(lineups[:max_games - played])]
+            chunks = [matches[start:start + chunk] for start in range(0, len(matches), chunk)]
+            results = pool.imap_unordered(_play_chunk, chunks) if pool else map(_play_chunk, chunks)
+
+            for chunk_results in results:
+                for lineup, winner, record in chunk_results:
+                    if store is not None and record is not None:
+                        store.add(record)
+
+                    for seat, strategy in enumerate(lineup):
+                        seats[strategy][0] += 1
+                        if seat != winner:
+                            continue
+
+                        seats[strategy][1] += 1
+                        for other in lineup:
+                            if other != strategy:
+                                pair_wins[(strategy, other)] += 1
+
+            played += len(matches)
+            ratings = rate(pair_wins, strategies)
+            if played >= min_games and settled(ratings):
+                break
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if store is not None:
+            store.close()
+
+    return {"games": played, "ratings": ratings, "seats": seats}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Round-robin tournament between headless bot strategies.")
+    parser.add_argument("strategies", nargs="+", choices=sorted(STRATEGIES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[2, 3, 4, 5])
+    parser.add_argument("--recipe", default="base")
+    parser.add_argument("--recipes", default=DEFAULT_RECIPES)
+    parser.add_argument("--max-games", type=int, default=100000)
+    parser.add_argument("--min-games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="SQLite database to store every game in")
+    arguments = parser.parse_args()
+
+    start: float = time.perf_counter()
+    report: dict = run(sorted(set(arguments.strategies)), arguments.sizes, arguments.recipe, arguments.recipes,
+                       arguments.max_games, arguments.min_games, arguments.workers, arguments.chunk, arguments.seed,
+                       arguments.db)
+    elapsed: float = time.perf_counter() - start
+
+    print(f"{report['games']} games in {elapsed:.1f}s")
+    print(f"{'strategy':<12}{'elo':>8}{'95% ci':>10}{'seats':>9}{'wins':>9}{'win %':>8}")
+    for strategy, (elo, interval) in sorted(report["ratings"].items(), key=lambda item: -item[1][0]):
+        seated, won = report["seats"][strategy]
+        print(f"{strategy:<12}{elo:>8.1f}{'±' + format(interval, '.1f'):>10}{seated:>9}{won:>9}{100 * won / max(1, seated):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()